@@ -4,13 +4,15 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas
-from .database import get_db
+from . import crud, crud_async, models, schemas
+from .database import get_async_db, SessionLocal
+from .passwords import PasswordPoolBusy, password_pool, pwd_context
+from .principals import Principal, load_principal, principal_cache
 
 # Загружаем переменные из .env (нужны для SECRET_KEY и ALGORITHM)
 from dotenv import load_dotenv
@@ -24,21 +26,34 @@ if not SECRET_KEY:
     raise ValueError("SECRET_KEY не установлена в .env")
 
 
-# Настройка для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Схема OAuth2 для получения токена из заголовка Authorization: Bearer <token>
 # tokenUrl указывает эндпоинт для получения токена (мы его создадим)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# То же, но без 401 при отсутствии токена (публичные эндпоинты с персональными флагами)
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 
+# bcrypt выполняется в ограниченном пуле (см. passwords.py).
+# Синхронные функции - для кода, который уже работает в threadpool
 def verify_password(plain_password, hashed_password):
     """Проверяет совпадение пароля с хешем."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.verify_sync(plain_password, hashed_password)
 
 def get_password_hash(password):
     """Генерирует хеш пароля."""
-    return pwd_context.hash(password)
+    return password_pool.hash_sync(password)
+
+async def get_password_hash_async(password):
+    """Генерирует хеш пароля, не блокируя event loop."""
+    return await password_pool.hash(password)
+
+def password_pool_busy_exception() -> HTTPException:
+    """Ответ при переполненной очереди хеширования (PasswordPoolBusy)."""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many password operations, try again later",
+        headers={"Retry-After": "1"},
+    )
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Создает JWT токен доступа."""
@@ -52,37 +67,145 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _strip_bearer(token: str) -> str:
+    if token.startswith("Bearer "):
+        token = token.split(" ")[1]
+    return token
+
+def _token_payload(token: str) -> Optional[dict]:
+    """Проверенный payload токена с непустым 'sub' или None."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload if payload.get("sub") else None
+
+def get_username_from_token(token: str) -> Optional[str]:
+    """Декодирует JWT токен и возвращает username (claim 'sub') или None."""
+    payload = _token_payload(_strip_bearer(token))
+    return payload["sub"] if payload else None
+
+def resolve_principal(token: str, db: Optional[Session] = None) -> Optional[Principal]:
+    """
+    Principal по токену: из кеша или одним легким SELECT нужных столбцов.
+    Активность не проверяется - это делают вызывающие.
+    Сессия открывается, только если principal нет в кеше и db не передана.
+    """
+    token = _strip_bearer(token)
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    payload = _token_payload(token)
+    if payload is None:
+        return None
+
+    own_session = db is None
+    if own_session:
+        db = SessionLocal()
+    try:
+        principal = load_principal(db, payload["sub"])
+    finally:
+        if own_session:
+            db.close()
+    if principal is not None:
+        principal_cache.put(token, principal, token_expires_at=payload.get("exp"))
+    return principal
+
+async def resolve_principal_async(token: str, db: AsyncSession) -> Optional[Principal]:
+    """То же, что resolve_principal, но запрос при промахе кеша идет через AsyncSession."""
+    token = _strip_bearer(token)
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    payload = _token_payload(token)
+    if payload is None:
+        return None
+    principal = await db.run_sync(load_principal, payload["sub"])
+    if principal is not None:
+        principal_cache.put(token, principal, token_expires_at=payload.get("exp"))
+    return principal
+
+def _remember_principal(request: Request, token: str, principal: Optional[Principal]) -> None:
+    request.state.principal_token = token
+    request.state.principal = principal
+
+def get_request_principal(request: Request, token: str, db: Optional[Session] = None) -> Optional[Principal]:
+    """
+    Разрешает principal один раз за запрос: результат middleware (cookie)
+    переиспользуется зависимостями API, если токен тот же.
+    """
+    token = _strip_bearer(token)
+    if getattr(request.state, "principal_token", None) == token:
+        return request.state.principal
+    principal = resolve_principal(token, db)
+    _remember_principal(request, token, principal)
+    return principal
+
+async def get_request_principal_async(request: Request, token: str, db: AsyncSession) -> Optional[Principal]:
+    """Асинхронная версия get_request_principal (для зависимостей, выполняемых в event loop)."""
+    token = _strip_bearer(token)
+    if getattr(request.state, "principal_token", None) == token:
+        return request.state.principal
+    principal = await resolve_principal_async(token, db)
+    _remember_principal(request, token, principal)
+    return principal
+
+def get_page_user(request: Request) -> Optional[Principal]:
+    """
+    Пользователь HTML-страницы по cookie access_token (None для гостя или неактивного).
+    Зависимость только страничных обработчиков: статика и API ее не вызывают.
+    Синхронная, поэтому запрос к БД при промахе кеша выполняется в threadpool.
+    """
+    token = request.cookies.get("access_token")
+    user = None
+    if token:
+        try:
+            user = get_request_principal(request, token)
+        except Exception as e:
+            print(f"Error fetching page user: {e}")
+            user = None
+        if user and not user.is_active:
+            user = None
+    request.state.current_user = user # Для совместимости с кодом, читающим request.state
+    return user
+
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
+    request: Request, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     """
     Зависимость для получения текущего пользователя из JWT токена.
-    Используется в защищенных эндпоинтах.
+    Используется в защищенных эндпоинтах. Выполняется в event loop, поэтому при
+    промахе кеша principal читается через AsyncSession (та же сессия, что у
+    async-обработчика), а не синхронной сессией.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        # Декодируем токен
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub") # Мы будем класть username в 'sub'
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
-        raise credentials_exception
-
-    # Ищем пользователя в БД
-    user = crud.get_user_by_username(db, username=token_data.username)
+    # Декодируем токен (username лежит в 'sub') и берем легкий principal (кеш или один SELECT)
+    user = await get_request_principal_async(request, token, db)
     if user is None:
         raise credentials_exception
     return user
 
+async def get_current_user_optional(
+    request: Request, token: Optional[str] = Depends(oauth2_scheme_optional), db: AsyncSession = Depends(get_async_db)
+) -> Optional[Principal]:
+    """
+    Текущий пользователь или None для анонимного запроса.
+    Невалидный токен тоже дает None - эндпоинт остается публичным.
+    """
+    if not token:
+        return None
+    user = await get_request_principal_async(request, token, db)
+    if user is None or not user.is_active:
+        return None
+    return user
+
 async def get_current_active_user(
-    current_user: models.User = Depends(get_current_user)
-) -> models.User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """
     Проверяет, что пользователь, полученный из токена, активен.
     """
@@ -91,10 +214,19 @@ async def get_current_active_user(
     return current_user
 
 # Функция для аутентификации пользователя по логину и паролю
-def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
-    user = crud.get_user_by_username(db, username=username)
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[models.User]:
+    """
+    Проверка пароля в пуле хеширования, чтение пользователя и сохранение хеша - через
+    AsyncSession: во время шторма входов event loop не блокируется ничем из этого.
+    Хеш с устаревшими параметрами перехешируется и сохраняется.
+    Может выбросить PasswordPoolBusy.
+    """
+    user = await crud_async.get_user_by_username(db, username=username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await password_pool.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        await crud_async.update_password_hash(db, db_user=user, hashed_password=new_hash)
     return user
\ No newline at end of file
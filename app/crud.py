@@ -1,9 +1,15 @@
 # app/crud.py
-from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import select, func, and_
-from . import models, schemas
+from sqlalchemy.orm import Session, joinedload, selectinload, aliased
+from sqlalchemy import select, func, and_, or_, tuple_, literal, exists
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from . import models, schemas, membership, principals, search, timeline
 from .auth import get_password_hash
-from typing import List, Optional
+from typing import List, Optional, Tuple
+
+# Изменяемые поля автора, которые попадают в ответы (schemas.UserInfo): часть версии страниц для ETag
+_AUTHOR_VERSION_COLUMNS = (models.User.nickname, models.User.avatar_url, models.User.avatar_thumb_url)
 
 # --- Пользователи ---
 def get_user(db: Session, user_id: int) -> Optional[models.User]:
@@ -13,12 +19,35 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.email == email).first()
 
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
-    # Загружаем связи для подсчета
-    return db.query(models.User).options(
-        selectinload(models.User.following),
-        selectinload(models.User.followers),
-        selectinload(models.User.posts) # Посты для профиля
-    ).filter(models.User.username == username).first()
+    """Пользователь без загрузки связей (счетчики профиля - get_user_counts)."""
+    return db.query(models.User).filter(models.User.username == username).first()
+
+def user_counts_statement(user_id: int):
+    """
+    Счетчики профиля одним SELECT без загрузки списков (общий для crud и crud_async):
+    подписчики - денормализованный столбец, подписки и посты - COUNT по индексам
+    (первичный ключ friendships, posts(author_id, ...)).
+    """
+    friendships = models.friendship_association
+    following_count = select(func.count()).select_from(friendships).where(
+        friendships.c.follower_id == user_id
+    ).scalar_subquery()
+    posts_count = select(func.count(models.Post.id)).where(models.Post.author_id == user_id).scalar_subquery()
+    return select(
+        models.User.followers_count.label("followers_count"),
+        following_count.label("following_count"),
+        posts_count.label("posts_count"),
+    ).where(models.User.id == user_id)
+
+def user_counts(row) -> dict:
+    """Словарь счетчиков из строки user_counts_statement (нули, если пользователя нет)."""
+    if row is None:
+        return {"followers_count": 0, "following_count": 0, "posts_count": 0}
+    return dict(row._mapping)
+
+def get_user_counts(db: Session, user_id: int) -> dict:
+    """Счетчики профиля (см. user_counts_statement)."""
+    return user_counts(db.execute(user_counts_statement(user_id)).one_or_none())
 
 
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]:
@@ -38,60 +67,105 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     db.refresh(db_user)
     return db_user
 
-def update_user(db: Session, db_user: models.User, user_update: schemas.UserUpdate) -> models.User:
+def update_user(
+    db: Session, db_user: models.User, user_update: schemas.UserUpdate, hashed_password: Optional[str] = None
+) -> models.User:
+    """hashed_password - заранее посчитанный хеш нового пароля (из async-обработчика)."""
     update_data = user_update.dict(exclude_unset=True) # Берем только переданные поля
     if "password" in update_data:
-        hashed_password = get_password_hash(update_data["password"])
-        db_user.hashed_password = hashed_password
+        db_user.hashed_password = hashed_password or get_password_hash(update_data["password"])
     if "email" in update_data:
         db_user.email = update_data["email"]
     if "nickname" in update_data:
         db_user.nickname = update_data["nickname"]
     # Аватар обновляется отдельно
     db.commit()
+    principals.invalidate_user(db_user.id) # Закешированные principal устарели
     db.refresh(db_user)
     return db_user
 
+def update_password_hash(db: Session, db_user: models.User, hashed_password: str) -> None:
+    """Сохраняет перехешированный пароль (после смены параметров bcrypt)."""
+    db_user.hashed_password = hashed_password
+    db.commit()
+
 def update_avatar(db: Session, db_user: models.User, avatar_url: str) -> models.User:
      db_user.avatar_url = avatar_url
+     db_user.avatar_thumb_url = None # Миниатюра прежнего аватара; новая строится фоново
      db.commit()
+     principals.invalidate_user(db_user.id)
      db.refresh(db_user)
      return db_user
 
 # --- Друзья (Подписки) ---
 
+def _change_followers_count(db: Session, user_id: int, delta: int) -> None:
+    # Атомарный UPDATE, без чтения-изменения-записи в Python
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.followers_count: models.User.followers_count + delta}, synchronize_session=False
+    )
+
 def add_follow(db: Session, follower: models.User, followed: models.User) -> bool:
-    """Подписывает follower на followed."""
-    if followed not in follower.following:
-        follower.following.append(followed)
-        db.commit()
-        return True
-    return False # Уже подписан
+    """Подписывает follower на followed (без загрузки списков подписок)."""
+    friendships = models.friendship_association
+    if is_following(db, follower, followed):
+        return False # Уже подписан
+    try:
+        db.execute(friendships.insert().values(follower_id=follower.id, followed_id=followed.id))
+    except IntegrityError: # Параллельный запрос успел подписать раньше
+        db.rollback()
+        return False
+    _change_followers_count(db, followed.id, 1)
+    timeline.add_author(db, follower.id, followed.id)
+    db.commit()
+    return True
 
 def remove_follow(db: Session, follower: models.User, followed: models.User) -> bool:
     """Отписывает follower от followed."""
-    if followed in follower.following:
-        follower.following.remove(followed)
-        db.commit()
-        return True
-    return False # Не был подписан
-
-def get_following(db: Session, user: models.User) -> List[models.User]:
-    """Возвращает список тех, на кого подписан user."""
-    # Убедимся, что данные загружены (если не были загружены ранее)
-    db.refresh(user, attribute_names=['following'])
-    return user.following
+    friendships = models.friendship_association
+    result = db.execute(friendships.delete().where(
+        friendships.c.follower_id == follower.id,
+        friendships.c.followed_id == followed.id
+    ))
+    if result.rowcount == 0:
+        return False # Не был подписан
+    _change_followers_count(db, followed.id, -1)
+    timeline.remove_author(db, follower.id, followed.id)
+    timeline.resume_fanout(db, followed.id)
+    db.commit()
+    return True
+
+def _follow_page(db: Session, owner_column, other_column, user_id: int,
+                 before_id: Optional[int], limit: int) -> List[models.User]:
+    # Диапазон индекса (owner, other): страница читается без сортировки всего списка
+    friendships = models.friendship_association
+    query = db.query(models.User).join(
+        friendships, other_column == models.User.id
+    ).filter(owner_column == user_id)
+    if before_id is not None:
+        query = query.filter(other_column < before_id)
+    return query.order_by(other_column.desc()).limit(limit).all()
+
+def get_following(db: Session, user_id: int, before_id: Optional[int] = None, limit: int = 50) -> List[models.User]:
+    """
+    Страница тех, на кого подписан пользователь, от больших ID к меньшим.
+    before_id - ID последнего пользователя предыдущей страницы.
+    """
+    friendships = models.friendship_association
+    return _follow_page(db, friendships.c.follower_id, friendships.c.followed_id, user_id, before_id, limit)
 
-def get_followers(db: Session, user: models.User) -> List[models.User]:
-    """Возвращает список подписчиков user."""
-    db.refresh(user, attribute_names=['followers'])
-    return user.followers
+def get_followers(db: Session, user_id: int, before_id: Optional[int] = None, limit: int = 50) -> List[models.User]:
+    """Страница подписчиков пользователя (курсор как в get_following)."""
+    friendships = models.friendship_association
+    return _follow_page(db, friendships.c.followed_id, friendships.c.follower_id, user_id, before_id, limit)
 
 def is_following(db: Session, follower: models.User, followed: models.User) -> bool:
-    """Проверяет, подписан ли follower на followed."""
-    # Это можно сделать и без загрузки всего списка, через exists, но для простоты:
-    db.refresh(follower, attribute_names=['following'])
-    return followed in follower.following
+    """Проверяет, подписан ли follower на followed (EXISTS по первичному ключу)."""
+    friendships = models.friendship_association
+    return db.query(exists().where(
+        friendships.c.follower_id == follower.id,
+        friendships.c.followed_id == followed.id
+    )).scalar()
 
 
 # --- Чаты ---
@@ -106,48 +180,145 @@ def get_chat(db: Session, chat_id: int) -> Optional[models.Chat]:
         selectinload(models.Chat.participants) # Загружаем участников жадно
     ).filter(models.Chat.id == chat_id).first()
 
-def get_private_chat_between_users(db: Session, user1_id: int, user2_id: int) -> Optional[models.Chat]:
-    """Находит приватный чат между двумя пользователями."""
-    # Ищем чат, где is_private=True и участников ровно 2, и это наши user1 и user2
-    return db.query(models.Chat).join(models.user_chat_association).filter(
-        models.Chat.is_private == True,
-        models.user_chat_association.c.user_id.in_([user1_id, user2_id])
-    ).group_by(models.Chat.id).having(func.count(models.user_chat_association.c.user_id) == 2).first()
+def _direct_pair(user1_id: int, user2_id: int) -> tuple:
+    """Канонический ключ личного чата - пара ID по возрастанию."""
+    return (min(user1_id, user2_id), max(user1_id, user2_id))
 
+def get_private_chat_between_users(db: Session, user1_id: int, user2_id: int) -> Optional[models.Chat]:
+    """Находит приватный чат между двумя пользователями (поиск по уникальному ключу пары)."""
+    low_id, high_id = _direct_pair(user1_id, user2_id)
+    return db.query(models.Chat).filter(
+        models.Chat.direct_user_low_id == low_id,
+        models.Chat.direct_user_high_id == high_id
+    ).first()
 
-def get_user_chats(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.Chat]:
-    user = get_user(db, user_id)
-    if not user:
-        return []
 
-    # Загружаем чаты с участниками и последним сообщением
-    query = db.query(models.Chat).join(
-        models.user_chat_association
+def user_chats_page(query, user_id: int, skip: int, limit: int):
+    """
+    Чаты пользователя с его курсором прочтения (outer join chat_read_states), порядок и границы
+    страницы - общие для get_user_chats и lean.py. query должен выбирать столбцы Chat/ChatReadState.
+    """
+    return query.join(
+        models.user_chat_association, models.user_chat_association.c.chat_id == models.Chat.id
+    ).outerjoin(
+        models.ChatReadState,
+        and_(
+            models.ChatReadState.chat_id == models.Chat.id,
+            models.ChatReadState.user_id == user_id
+        )
     ).filter(
         models.user_chat_association.c.user_id == user_id
-    ).options(
-        selectinload(models.Chat.participants), # Загружаем всех участников
-        # Загружаем последнее сообщение в каждом чате (сложнее, может требовать подзапрос)
-        # Простой вариант: загрузить позже или оставить как есть (будет N+1 запрос для last_message)
-        # Оптимизированный (примерный) вариант с подзапросом:
-        # subq = select(models.Message.id).where(models.Message.chat_id == models.Chat.id).order_by(models.Message.timestamp.desc()).limit(1).correlate(models.Chat).scalar_subquery()
-        # options(selectinload(models.Chat.messages).filter(models.Message.id == subq)) # Не совсем так, нужен join
-        # Пока оставим простой вариант, ORM загрузит последнее сообщение при доступе к chat.messages[0] если order_by задан в модели
-         selectinload(models.Chat.messages).load_only(models.Message.id) # Загрузим только ID, чтобы уменьшить данные
     ).order_by(
-        models.Chat.created_at.desc() # Или по последнему сообщению?
+        # Чаты без сообщений сортируем по времени создания
+        func.coalesce(models.Chat.last_activity_at, models.Chat.created_at).desc(),
+        models.Chat.id.desc()
     ).offset(skip).limit(limit)
 
-    chats = query.all()
-
-    # Загрузка последнего сообщения (если не сделано оптимизированно выше)
-    for chat in chats:
-         last_msg = db.query(models.Message).filter(models.Message.chat_id == chat.id).order_by(models.Message.timestamp.desc()).first()
-         chat.last_message = last_msg # Добавляем атрибут для схемы ChatInfo
+def get_user_chats(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.Chat]:
+    """
+    Список чатов пользователя, от недавно активных к старым.
+    Последнее сообщение берется по денормализованному Chat.last_message_id,
+    счетчик непрочитанных - из chat_read_states; все в одном запросе (JOIN),
+    без отдельного запроса на каждый чат.
+    """
+    query = db.query(
+        models.Chat, func.coalesce(models.ChatReadState.unread_count, 0)
+    ).options(
+        selectinload(models.Chat.participants), # Загружаем всех участников
+        joinedload(models.Chat.last_message).joinedload(models.Message.author)
+    )
+    rows = user_chats_page(query, user_id, skip, limit).all()
 
+    chats = []
+    for chat, unread_count in rows:
+        chat.unread_count = unread_count # Добавляем атрибут для схемы ChatInfo
+        chats.append(chat)
     return chats
 
 
+def backfill_chat_activity(db: Session) -> int:
+    """
+    Заполняет last_message_id / last_activity_at для чатов, созданных до появления
+    денормализации. Возвращает число обновленных чатов.
+    """
+    latest_message = aliased(models.Message)
+    latest_id = select(func.max(models.Message.id)).where(
+        models.Message.chat_id == models.Chat.id
+    ).scalar_subquery()
+    result = db.query(models.Chat).filter(
+        models.Chat.last_message_id.is_(None),
+        latest_id.isnot(None)
+    ).update({
+        models.Chat.last_message_id: latest_id,
+        models.Chat.last_activity_at: select(latest_message.timestamp).where(
+            latest_message.id == latest_id
+        ).scalar_subquery(),
+    }, synchronize_session=False)
+    db.commit()
+    return result
+
+
+def backfill_direct_chat_keys(db: Session) -> int:
+    """
+    Проставляет ключ пары личным чатам, созданным до его появления.
+    Если у пары уже есть чат с ключом (или несколько старых дублей), ключ получает
+    только первый из них, остальные остаются без ключа. Возвращает число обновленных чатов.
+    """
+    association = models.user_chat_association
+    taken_pairs = set(db.query(models.Chat.direct_user_low_id, models.Chat.direct_user_high_id).filter(
+        models.Chat.direct_user_low_id.isnot(None)
+    ).all())
+    rows = db.query(
+        association.c.chat_id,
+        func.min(association.c.user_id).label("low_id"),
+        func.max(association.c.user_id).label("high_id")
+    ).join(
+        models.Chat, models.Chat.id == association.c.chat_id
+    ).filter(
+        models.Chat.is_private == True,
+        models.Chat.direct_user_low_id.is_(None)
+    ).group_by(association.c.chat_id).having(
+        func.count(association.c.user_id) == 2
+    ).order_by(association.c.chat_id).all()
+
+    updated = 0
+    for row in rows:
+        pair = (row.low_id, row.high_id)
+        if pair in taken_pairs:
+            continue
+        taken_pairs.add(pair)
+        db.query(models.Chat).filter(models.Chat.id == row.chat_id).update({
+            models.Chat.direct_user_low_id: row.low_id,
+            models.Chat.direct_user_high_id: row.high_id,
+        }, synchronize_session=False)
+        updated += 1
+    db.commit()
+    return updated
+
+
+def get_user_chat_ids(db: Session, user_id: int) -> List[int]:
+    """Возвращает ID всех чатов пользователя (без загрузки самих чатов)."""
+    rows = db.query(models.user_chat_association.c.chat_id).filter(
+        models.user_chat_association.c.user_id == user_id
+    ).all()
+    return [row.chat_id for row in rows]
+
+
+def _add_read_states(db: Session, chat_id: int, user_ids) -> None:
+    """Создает курсоры прочтения для новых участников (непрочитанное - с момента вступления)."""
+    last_message_id = db.query(models.Chat.last_message_id).filter(models.Chat.id == chat_id).scalar()
+    existing = {
+        row.user_id for row in db.query(models.ChatReadState.user_id).filter(
+            models.ChatReadState.chat_id == chat_id,
+            models.ChatReadState.user_id.in_(list(user_ids))
+        )
+    }
+    for user_id in set(user_ids) - existing:
+        db.add(models.ChatReadState(
+            user_id=user_id, chat_id=chat_id, last_read_message_id=last_message_id, unread_count=0
+        ))
+
+
 def create_group_chat(db: Session, chat_data: schemas.ChatCreate, creator_id: int) -> models.Chat:
     """Создает групповой чат."""
     creator = get_user(db, creator_id)
@@ -168,26 +339,41 @@ def create_group_chat(db: Session, chat_data: schemas.ChatCreate, creator_id: in
             if user not in db_chat.participants:
                 db_chat.participants.append(user)
 
+    _add_read_states(db, db_chat.id, [p.id for p in db_chat.participants])
     db.commit()
+    membership.invalidate(db_chat.id)
     db.refresh(db_chat)
     return db_chat
 
-def create_private_chat(db: Session, user1: models.User, user2: models.User) -> models.Chat:
-    """Создает приватный чат между двумя пользователями."""
+def create_private_chat(db: Session, user1, user2) -> models.Chat:
+    """
+    Возвращает приватный чат между двумя пользователями, создавая его при необходимости.
+    Идемпотентно и при параллельных запросах: дубликат отсекает уникальный индекс пары.
+    """
     existing_chat = get_private_chat_between_users(db, user1.id, user2.id)
     if existing_chat:
         return existing_chat # Возвращаем существующий
 
     # Создаем новый приватный чат без имени
-    db_chat = models.Chat(is_private=True)
+    low_id, high_id = _direct_pair(user1.id, user2.id)
+    db_chat = models.Chat(is_private=True, direct_user_low_id=low_id, direct_user_high_id=high_id)
     db.add(db_chat)
-    db.flush()
-
-    # Добавляем обоих участников
-    db_chat.participants.append(user1)
-    db_chat.participants.append(user2)
-
+    try:
+        db.flush()
+    except IntegrityError:
+        # Параллельный запрос успел создать чат для этой пары - возвращаем его
+        db.rollback()
+        return get_private_chat_between_users(db, user1.id, user2.id)
+
+    # Добавляем обоих участников (нужны только ID - подойдет и легкий principal)
+    db.execute(models.user_chat_association.insert(), [
+        {"user_id": user1.id, "chat_id": db_chat.id},
+        {"user_id": user2.id, "chat_id": db_chat.id},
+    ])
+
+    _add_read_states(db, db_chat.id, [user1.id, user2.id])
     db.commit()
+    membership.invalidate(db_chat.id)
     db.refresh(db_chat)
     return db_chat
 
@@ -199,39 +385,205 @@ def add_user_to_chat(db: Session, chat_id: int, user_id: int) -> Optional[models
         return None
     if user not in chat.participants:
         chat.participants.append(user)
+        _add_read_states(db, chat.id, [user.id])
         db.commit()
+        membership.invalidate(chat.id)
         db.refresh(chat)
     return chat
 
 
 # --- Сообщения ---
-def get_messages_for_chat(db: Session, chat_id: int, skip: int = 0, limit: int = 50) -> List[models.Message]:
-    return db.query(models.Message).options(
+def _message_cursor(message_id: int):
+    """
+    (timestamp, id) сообщения-курсора для keyset-сравнения.
+    timestamp берем подзапросом прямо из БД: так сравнение идет с хранимым значением
+    без потери точности при передаче datetime параметром.
+    """
+    cursor_message = aliased(models.Message)
+    cursor_timestamp = select(cursor_message.timestamp).where(cursor_message.id == message_id).scalar_subquery()
+    return tuple_(cursor_timestamp, literal(message_id))
+
+def messages_page(query, chat_id: int, skip: int, limit: int, before_id: Optional[int], after_id: Optional[int]):
+    """Фильтры, порядок и границы страницы сообщений (общие для ORM-страницы, ее версии и lean.py)."""
+    sort_key = tuple_(models.Message.timestamp, models.Message.id)
+    query = query.filter(models.Message.chat_id == chat_id)
+
+    # Если курсора нет, подзапрос вернет NULL и страница будет пустой
+    if before_id is not None:
+        query = query.filter(sort_key < _message_cursor(before_id))
+    if after_id is not None:
+        # Берем самые ранние сообщения после курсора, чтобы клиент мог догружать дальше
+        query = query.filter(sort_key > _message_cursor(after_id))\
+            .order_by(models.Message.timestamp.asc(), models.Message.id.asc())
+    else:
+        query = query.order_by(models.Message.timestamp.desc(), models.Message.id.desc())
+    return query.offset(skip).limit(limit)
+
+def get_messages_for_chat(
+    db: Session,
+    chat_id: int,
+    skip: int = 0,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> List[models.Message]:
+    """
+    Возвращает сообщения чата от новых к старым.
+    before_id / after_id - курсоры (keyset-пагинация по индексу (chat_id, timestamp, id)):
+    before_id - страница истории старше указанного сообщения,
+    after_id - только сообщения новее указанного (инкрементальная синхронизация).
+    Стоимость страницы не зависит от глубины, в отличие от skip.
+    """
+    query = db.query(models.Message).options(
         joinedload(models.Message.author) # Загружаем автора сразу
-        ).filter(models.Message.chat_id == chat_id)\
-         .order_by(models.Message.timestamp.desc())\
-         .offset(skip)\
-         .limit(limit)\
-         .all()
+        )
+    messages = messages_page(query, chat_id, skip, limit, before_id, after_id).all()
+    if after_id is not None:
+        messages.reverse() # В ответе сохраняем общий порядок "от новых к старым"
+    return messages
+
+def get_messages_version(
+    db: Session,
+    chat_id: int,
+    skip: int = 0,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> list:
+    """Версия страницы get_messages_for_chat для ETag (сообщения не редактируются - хватает ID и автора)."""
+    query = db.query(models.Message.id, *_AUTHOR_VERSION_COLUMNS).join(models.Message.author)
+    return messages_page(query, chat_id, skip, limit, before_id, after_id).all()
+
+def create_messages(db: Session, items: List[Tuple[schemas.MessageCreate, int]]) -> List[models.Message]:
+    """
+    Вставляет пачку сообщений [(сообщение, author_id), ...] одной транзакцией (один commit).
+    Порядок ID совпадает с порядком items, поэтому порядок внутри каждого чата сохраняется.
+    Денормализованные данные (последнее сообщение, счетчики непрочитанных, поисковый индекс)
+    обновляются в той же транзакции - по одному UPDATE на чат/автора, а не на сообщение.
+    """
+    db_messages = [
+        models.Message(
+            content=message.content,
+            file_url=message.file_url,
+            chat_id=message.chat_id,
+            author_id=author_id
+        )
+        for message, author_id in items
+    ]
+    db.add_all(db_messages)
+    db.flush() # Получаем ID сообщений
+    for db_message in db_messages:
+        search.index_message(db, db_message) # Поисковый индекс обновляется в той же транзакции
+
+    messages_by_chat = {}
+    for db_message in db_messages:
+        messages_by_chat.setdefault(db_message.chat_id, []).append(db_message)
+
+    for chat_id, chat_messages in messages_by_chat.items():
+        last_message_id = chat_messages[-1].id
+        # Двигаем указатель на последнее сообщение чата.
+        # Условие по ID защищает от перезаписи более новым сообщением при конкурентной вставке
+        db.query(models.Chat).filter(
+            models.Chat.id == chat_id,
+            or_(models.Chat.last_message_id.is_(None), models.Chat.last_message_id < last_message_id)
+        ).update({
+            models.Chat.last_message_id: last_message_id,
+            models.Chat.last_activity_at: select(models.Message.timestamp).where(
+                models.Message.id == last_message_id
+            ).scalar_subquery(),
+        }, synchronize_session=False)
+
+        # Счетчики непрочитанных поддерживаем инкрементально: +N всем участникам, кроме авторов,
+        # а автор, отправив сообщение, считается прочитавшим чат до него
+        last_index_by_author = {m.author_id: index for index, m in enumerate(chat_messages)}
+        db.query(models.ChatReadState).filter(
+            models.ChatReadState.chat_id == chat_id,
+            models.ChatReadState.user_id.notin_(list(last_index_by_author))
+        ).update({
+            models.ChatReadState.unread_count: models.ChatReadState.unread_count + len(chat_messages)
+        }, synchronize_session=False)
+        for author_id, last_index in last_index_by_author.items():
+            unread_after = sum(1 for m in chat_messages[last_index + 1:] if m.author_id != author_id)
+            db.query(models.ChatReadState).filter(
+                models.ChatReadState.chat_id == chat_id,
+                models.ChatReadState.user_id == author_id
+            ).update({
+                models.ChatReadState.last_read_message_id: chat_messages[last_index].id,
+                models.ChatReadState.unread_count: unread_after,
+            }, synchronize_session=False)
+
+    db.commit()
+    # Одним запросом дочитываем timestamp (server_default) и авторов для ответа
+    db.query(models.Message).options(
+        joinedload(models.Message.author)
+    ).filter(models.Message.id.in_([m.id for m in db_messages])).all()
+    return db_messages
 
 def create_message(db: Session, message: schemas.MessageCreate, author_id: int) -> models.Message:
-    db_message = models.Message(
-        content=message.content,
-        file_url=message.file_url,
-        chat_id=message.chat_id,
-        author_id=author_id
-    )
-    db.add(db_message)
+    return create_messages(db, [(message, author_id)])[0]
+
+def mark_chat_read(db: Session, chat_id: int, user_id: int, message_id: Optional[int] = None) -> models.ChatReadState:
+    """
+    Сдвигает курсор прочтения пользователя до message_id (по умолчанию - до последнего
+    сообщения чата) и пересчитывает счетчик. Курсор двигается только вперед.
+    """
+    last_message_id = db.query(models.Chat.last_message_id).filter(models.Chat.id == chat_id).scalar()
+    if message_id is None or (last_message_id is not None and message_id > last_message_id):
+        message_id = last_message_id
+
+    read_state = db.query(models.ChatReadState).filter(
+        models.ChatReadState.chat_id == chat_id,
+        models.ChatReadState.user_id == user_id
+    ).first()
+    if read_state is None:
+        # Участники, добавленные до появления курсоров
+        read_state = models.ChatReadState(user_id=user_id, chat_id=chat_id, unread_count=0)
+        db.add(read_state)
+    elif message_id is None or (read_state.last_read_message_id or 0) >= message_id:
+        return read_state # Уже прочитано
+
+    read_state.last_read_message_id = message_id
+    if message_id is None or message_id == last_message_id:
+        read_state.unread_count = 0 # Прочитано все
+    else:
+        # Частичное прочтение: считаем только хвост после курсора
+        read_state.unread_count = db.query(func.count(models.Message.id)).filter(
+            models.Message.chat_id == chat_id,
+            models.Message.id > message_id,
+            models.Message.author_id != user_id
+        ).scalar()
+    db.commit()
+    db.refresh(read_state)
+    return read_state
+
+def backfill_read_states(db: Session) -> int:
+    """Создает курсоры прочтения (все прочитано) для участников, у которых их еще нет."""
+    memberships = db.query(
+        models.user_chat_association.c.user_id,
+        models.user_chat_association.c.chat_id,
+        models.Chat.last_message_id
+    ).join(
+        models.Chat, models.Chat.id == models.user_chat_association.c.chat_id
+    ).outerjoin(
+        models.ChatReadState,
+        and_(
+            models.ChatReadState.chat_id == models.user_chat_association.c.chat_id,
+            models.ChatReadState.user_id == models.user_chat_association.c.user_id
+        )
+    ).filter(models.ChatReadState.user_id.is_(None)).all()
+    for row in memberships:
+        db.add(models.ChatReadState(
+            user_id=row.user_id, chat_id=row.chat_id, last_read_message_id=row.last_message_id, unread_count=0
+        ))
     db.commit()
-    db.refresh(db_message)
-     # Загрузим автора для ответа
-    db.refresh(db_message, attribute_names=['author'])
-    return db_message
+    return len(memberships)
 
 # --- Посты ---
 def create_post(db: Session, post: schemas.PostCreate, author_id: int) -> models.Post:
     db_post = models.Post(**post.dict(), author_id=author_id)
     db.add(db_post)
+    db.flush() # Нужен ID для рассылки по лентам
+    timeline.fan_out_post(db, db_post)
     db.commit()
     db.refresh(db_post)
     db.refresh(db_post, attribute_names=['author']) # Загрузим автора
@@ -246,63 +598,147 @@ def get_post(db: Session, post_id: int, current_user_id: Optional[int] = None) -
     ).filter(models.Post.id == post_id)
 
     db_post = query.first()
-    if db_post:
-         # Добавим количество лайков для схемы
-         db_post.likes_count = len(db_post.liked_by_users)
+    if db_post and current_user_id is not None:
+        set_liked_by_me(db, [db_post], current_user_id)
     return db_post
 
+def posts_page(query, skip: int, limit: int, author_id: Optional[int] = None):
+    """Порядок и границы страницы постов (общие для ORM-страницы, ее версии и lean.py)."""
+    if author_id is not None:
+        query = query.filter(models.Post.author_id == author_id)
+    # id - для однозначного порядка постов с одинаковым timestamp
+    return query.order_by(models.Post.timestamp.desc(), models.Post.id.desc()).offset(skip).limit(limit)
+
+def liked_by_me_column(user_id: Optional[int]):
+    """Столбец "пост лайкнут user_id" для выборки постов (EXISTS по первичному ключу post_likes)."""
+    if user_id is None:
+        return literal(False)
+    likes = models.post_likes_association
+    return exists().where(likes.c.post_id == models.Post.id, likes.c.user_id == user_id)
+
+def _posts_version(db: Session, skip: int, limit: int, user_id: Optional[int], author_id: Optional[int] = None) -> list:
+    query = db.query(
+        models.Post.id, models.Post.likes_count, models.Post.comments_count,
+        models.Post.image_thumb_url, models.Post.image_preview_url,
+        *_AUTHOR_VERSION_COLUMNS, liked_by_me_column(user_id),
+    ).join(models.Post.author)
+    return posts_page(query, skip, limit, author_id).all()
+
 def get_posts(db: Session, skip: int = 0, limit: int = 20) -> List[models.Post]:
-    """Получает список постов для общей ленты."""
-    posts = db.query(models.Post).options(
-        joinedload(models.Post.author),
-        selectinload(models.Post.liked_by_users), # Загрузка лайков
-        # Комментарии грузить не будем в общем списке, только их количество
-        # selectinload(models.Post.comments) # - Опционально
-    ).order_by(models.Post.timestamp.desc()).offset(skip).limit(limit).all()
-    # Добавим количество лайков
-    for post in posts:
-        post.likes_count = len(post.liked_by_users)
-    return posts
+    """Получает список постов для общей ленты (счетчики уже в строке поста)."""
+    return posts_page(db.query(models.Post).options(joinedload(models.Post.author)), skip, limit).all()
+
+def get_posts_version(db: Session, skip: int = 0, limit: int = 20, user_id: Optional[int] = None) -> list:
+    """Версия страницы get_posts для ETag: ID, счетчики, копии картинки, автор, флаг лайка user_id."""
+    return _posts_version(db, skip, limit, user_id)
 
 def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 20) -> List[models.Post]:
     """Получает посты конкретного пользователя."""
-    posts = db.query(models.Post).options(
-        joinedload(models.Post.author),
-        selectinload(models.Post.liked_by_users),
-    ).filter(models.Post.author_id == user_id)\
-     .order_by(models.Post.timestamp.desc())\
-     .offset(skip)\
-     .limit(limit)\
-     .all()
+    return posts_page(
+        db.query(models.Post).options(joinedload(models.Post.author)), skip, limit, author_id=user_id
+    ).all()
+
+def get_user_posts_version(
+    db: Session, user_id: int, skip: int = 0, limit: int = 20, current_user_id: Optional[int] = None
+) -> list:
+    """Версия страницы get_user_posts для ETag (см. get_posts_version)."""
+    return _posts_version(db, skip, limit, current_user_id, author_id=user_id)
+
+def set_liked_by_me(db: Session, posts: List[models.Post], user_id: Optional[int]) -> List[models.Post]:
+    """Проставляет post.liked_by_me для страницы постов одним запросом к post_likes."""
+    liked_ids = set()
+    if user_id is not None and posts:
+        likes = models.post_likes_association
+        liked_ids = set(db.execute(
+            select(likes.c.post_id).where(
+                likes.c.user_id == user_id,
+                likes.c.post_id.in_([post.id for post in posts])
+            )
+        ).scalars().all())
     for post in posts:
-         post.likes_count = len(post.liked_by_users)
+        post.liked_by_me = post.id in liked_ids
     return posts
 
-def delete_post(db: Session, post: models.Post) -> None:
-    db.delete(post)
+def _change_post_counter(db: Session, post_id: int, column, delta: int) -> None:
+    # Атомарный UPDATE счетчика в той же транзакции, что и изменение лайков/комментариев
+    db.query(models.Post).filter(models.Post.id == post_id).update(
+        {column: column + delta}, synchronize_session=False
+    )
+
+def backfill_post_counters(db: Session) -> int:
+    """Пересчитывает likes_count / comments_count по фактическим данным. Возвращает число постов."""
+    likes = models.post_likes_association
+    db.execute(models.Post.__table__.update().values(
+        likes_count=select(func.count()).select_from(likes).where(
+            likes.c.post_id == models.Post.id
+        ).scalar_subquery(),
+        comments_count=select(func.count(models.Comment.id)).where(
+            models.Comment.post_id == models.Post.id
+        ).scalar_subquery(),
+    ))
+    db.commit()
+    return db.query(models.Post).count()
+
+def delete_post(db: Session, post_id: int) -> None:
+    """Удаляет пост с лайками и комментариями, не загружая их в сессию."""
+    timeline.remove_post(db, post_id)
+    db.execute(models.post_likes_association.delete().where(models.post_likes_association.c.post_id == post_id))
+    db.query(models.Comment).filter(models.Comment.post_id == post_id).delete(synchronize_session=False)
+    db.query(models.Post).filter(models.Post.id == post_id).delete(synchronize_session=False)
     db.commit()
 
 
-# --- Лайки ---
-def like_post(db: Session, user: models.User, post: models.Post) -> bool:
-    if user not in post.liked_by_users:
-        post.liked_by_users.append(user)
-        db.commit()
-        return True
-    return False # Уже лайкнул
+def post_exists(db: Session, post_id: int) -> bool:
+    """Дешевая проверка существования поста (без автора, лайков и комментариев)."""
+    return db.query(exists().where(models.Post.id == post_id)).scalar()
 
-def unlike_post(db: Session, user: models.User, post: models.Post) -> bool:
-    if user in post.liked_by_users:
-        post.liked_by_users.remove(user)
-        db.commit()
-        return True
-    return False # Лайка не было
+def get_post_author_id(db: Session, post_id: int) -> Optional[int]:
+    """ID автора поста (для проверки прав) или None, если поста нет."""
+    return db.execute(select(models.Post.author_id).where(models.Post.id == post_id)).scalar_one_or_none()
+
+
+# --- Лайки ---
+# Один INSERT/DELETE по первичному ключу post_likes и UPDATE счетчика в одной транзакции:
+# стоимость лайка не зависит от того, сколько лайков у поста уже есть
+def like_post(db: Session, user_id: int, post_id: int) -> bool:
+    likes = models.post_likes_association
+    values = {"user_id": user_id, "post_id": post_id}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        inserted = db.execute(dialect_insert(likes).values(**values).on_conflict_do_nothing()).rowcount
+    else:
+        try:
+            with db.begin_nested():
+                inserted = db.execute(likes.insert().values(**values)).rowcount
+        except IntegrityError:
+            inserted = 0
+    if not inserted:
+        db.rollback()
+        return False # Уже лайкнул
+    _change_post_counter(db, post_id, models.Post.likes_count, 1)
+    db.commit()
+    return True
+
+def unlike_post(db: Session, user_id: int, post_id: int) -> bool:
+    likes = models.post_likes_association
+    deleted = db.execute(likes.delete().where(
+        likes.c.user_id == user_id,
+        likes.c.post_id == post_id
+    )).rowcount
+    if not deleted:
+        db.rollback()
+        return False # Лайка не было
+    _change_post_counter(db, post_id, models.Post.likes_count, -1)
+    db.commit()
+    return True
 
 
 # --- Комментарии ---
 def create_comment(db: Session, comment: schemas.CommentCreate, post_id: int, author_id: int) -> models.Comment:
     db_comment = models.Comment(**comment.dict(), post_id=post_id, author_id=author_id)
     db.add(db_comment)
+    _change_post_counter(db, post_id, models.Post.comments_count, 1)
     db.commit()
     db.refresh(db_comment)
     db.refresh(db_comment, attribute_names=['author']) # Загрузим автора
@@ -311,15 +747,22 @@ def create_comment(db: Session, comment: schemas.CommentCreate, post_id: int, au
 def get_comment(db: Session, comment_id: int) -> Optional[models.Comment]:
     return db.query(models.Comment).filter(models.Comment.id == comment_id).first()
 
-def get_post_comments(db: Session, post_id: int, skip: int = 0, limit: int = 50) -> List[models.Comment]:
-    return db.query(models.Comment).options(
-        joinedload(models.Comment.author)
-        ).filter(models.Comment.post_id == post_id)\
-         .order_by(models.Comment.timestamp.asc())\
+def _comments_page(query, post_id: int, skip: int, limit: int):
+    return query.filter(models.Comment.post_id == post_id)\
+         .order_by(models.Comment.timestamp.asc(), models.Comment.id.asc())\
          .offset(skip)\
-         .limit(limit)\
-         .all()
+         .limit(limit)
+
+def get_post_comments(db: Session, post_id: int, skip: int = 0, limit: int = 50) -> List[models.Comment]:
+    query = db.query(models.Comment).options(joinedload(models.Comment.author))
+    return _comments_page(query, post_id, skip, limit).all()
+
+def get_post_comments_version(db: Session, post_id: int, skip: int = 0, limit: int = 50) -> list:
+    """Версия страницы get_post_comments для ETag (комментарии не редактируются - хватает ID и автора)."""
+    query = db.query(models.Comment.id, *_AUTHOR_VERSION_COLUMNS).join(models.Comment.author)
+    return _comments_page(query, post_id, skip, limit).all()
 
 def delete_comment(db: Session, comment: models.Comment) -> None:
+    _change_post_counter(db, comment.post_id, models.Post.comments_count, -1)
     db.delete(comment)
     db.commit()
\ No newline at end of file
@@ -0,0 +1,81 @@
+# app/crud_async.py
+"""
+Асинхронные версии CRUD-функций для async def обработчиков (AsyncSession).
+
+Запросы не блокируют event loop. Логика, которая уже есть в синхронном
+виде (рассылка по лентам, кеш участников чата), переиспользуется через
+AsyncSession.run_sync, чтобы не дублировать ее.
+"""
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, membership, models, principals, schemas, timeline
+from .passwords import password_pool
+
+
+# --- Пользователи ---
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.get(models.User, user_id)
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[models.User]:
+    """Пользователь без загрузки связей."""
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def get_user_counts(db: AsyncSession, user_id: int) -> dict:
+    """Счетчики профиля (тот же запрос, что у crud.get_user_counts)."""
+    return crud.user_counts((await db.execute(crud.user_counts_statement(user_id))).one_or_none())
+
+async def update_user(
+    db: AsyncSession, db_user: models.User, user_update: schemas.UserUpdate, hashed_password: Optional[str] = None
+) -> models.User:
+    update_data = user_update.dict(exclude_unset=True) # Берем только переданные поля
+    if "password" in update_data:
+        db_user.hashed_password = hashed_password or await password_pool.hash(update_data["password"])
+    if "email" in update_data:
+        db_user.email = update_data["email"]
+    if "nickname" in update_data:
+        db_user.nickname = update_data["nickname"]
+    await db.commit()
+    principals.invalidate_user(db_user.id) # Закешированные principal устарели
+    return db_user
+
+async def update_password_hash(db: AsyncSession, db_user: models.User, hashed_password: str) -> None:
+    """Сохраняет перехешированный пароль (после смены параметров bcrypt)."""
+    db_user.hashed_password = hashed_password
+    await db.commit()
+
+async def update_avatar(db: AsyncSession, db_user: models.User, avatar_url: str) -> models.User:
+    db_user.avatar_url = avatar_url
+    db_user.avatar_thumb_url = None # Миниатюра прежнего аватара; новая строится фоново
+    await db.commit()
+    principals.invalidate_user(db_user.id)
+    return db_user
+
+
+# --- Чаты ---
+async def is_chat_member(db: AsyncSession, chat_id: int, user_id: int) -> bool:
+    return await db.run_sync(membership.is_chat_member, chat_id, user_id)
+
+async def chat_exists(db: AsyncSession, chat_id: int) -> bool:
+    return await db.run_sync(membership.chat_exists, chat_id)
+
+
+# --- Посты ---
+async def create_post(db: AsyncSession, post: schemas.PostCreate, author_id: int) -> models.Post:
+    db_post = models.Post(**post.dict(), author_id=author_id)
+    db.add(db_post)
+    await db.flush() # Нужен ID для рассылки по лентам
+    await db.run_sync(lambda session: timeline.fan_out_post(session, db_post))
+    await db.commit()
+    # Все, что читает схема Post: ленивой загрузки в async нет
+    await db.refresh(db_post, attribute_names=[
+        "timestamp", "likes_count", "comments_count", "author", "liked_by_users", "comments"
+    ])
+    return db_post
@@ -1,6 +1,8 @@
 # app/database.py
 import os
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
@@ -12,26 +14,109 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if SQLALCHEMY_DATABASE_URL is None:
     raise ValueError("DATABASE_URL не установлена в .env")
 
-# create_engine - точка входа в SQLAlchemy
-# connect_args нужен только для SQLite для поддержки многопоточности
-engine_args = {}
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine_args["connect_args"] = {"check_same_thread": False}
+# Необязательная реплика только для чтения: на нее уходят сессии GET-запросов (см. get_db)
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL")
+
+# --- Настройки пула соединений ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30)) # Секунды ожидания свободного соединения
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800)) # Пересоздавать соединения старше N секунд (-1 - никогда)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+
+# --- Настройки SQLite (применяются к каждому новому соединению) ---
+# WAL: читатели не блокируют писателя и наоборот; busy_timeout: писатель ждет блокировку,
+# а не падает сразу с "database is locked"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _engine_args(url: str) -> dict:
+    """Аргументы create_engine / create_async_engine для адреса БД."""
+    # connect_args нужен только для SQLite для поддержки многопоточности
+    if _is_sqlite(url):
+        engine_args = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" in url or url.rstrip("/").endswith(":"):
+            return engine_args # БД в памяти живет в одном соединении - пул не настраиваем
+    else:
+        engine_args = {}
+    engine_args.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    return engine_args
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+def _create_engine(url: str):
+    """create_engine с настройками пула и, для SQLite, PRAGMA на подключении."""
+    db_engine = create_engine(url, **_engine_args(url))
+    if _is_sqlite(url):
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+    return db_engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, **engine_args
-)
+
+# create_engine - точка входа в SQLAlchemy
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+# Без реплики чтение идет в основную БД
+read_engine = _create_engine(SQLALCHEMY_READ_DATABASE_URL) if SQLALCHEMY_READ_DATABASE_URL else engine
 
 # SessionLocal будет использоваться для создания сессий БД для каждого запроса
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Сессии только для чтения (GET-запросы)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# --- Асинхронный движок (для async-обработчиков, чтобы не блокировать event loop) ---
+def _async_database_url(url: str) -> str:
+    """Тот же адрес БД с асинхронным драйвером: aiosqlite для SQLite, asyncpg для PostgreSQL."""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url # Диалект уже асинхронный или задан явно
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_args(ASYNC_DATABASE_URL))
+if _is_sqlite(ASYNC_DATABASE_URL):
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+# expire_on_commit=False: после commit атрибуты не перечитываются неявно (в async это ошибка)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 # Base - базовый класс для наших моделей ORM
 Base = declarative_base()
 
+# Методы, которые не меняют данные: их сессии можно отдавать реплике
+READ_ONLY_METHODS = ("GET", "HEAD")
+
 # Зависимость для получения сессии БД в эндпоинтах
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    # GET-запросы читают с реплики (если она задана), остальные - из основной БД
+    session_factory = ReadSessionLocal if request.method in READ_ONLY_METHODS else SessionLocal
+    db = session_factory()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Асинхронная сессия для async def обработчиков
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,53 @@
+# app/etags.py
+"""
+Условные GET-запросы (ETag / If-None-Match -> 304) для часто опрашиваемых списков.
+
+ETag считается по "версии" ответа - легкой выборке тех же строк, что и сам
+ответ, но только изменяемых столбцов: ID, счетчики, поля автора, флаг лайка
+(crud.get_*_version). Текст, ORM-объекты и сериализация для этого не нужны.
+Если ETag совпал с If-None-Match, обработчик сразу отвечает 304 и не
+выполняет ни полный запрос, ни кодирование JSON.
+
+В хеш входит и JSON-схема ответа: после изменения схемы старые ETag не совпадут.
+"""
+import hashlib
+import json
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Request, Response, status
+from pydantic import TypeAdapter
+
+# Ответы зависят от пользователя: кешировать только в браузере и всегда перепроверять
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+@lru_cache(maxsize=None)
+def _schema_fingerprint(schema) -> str:
+    return json.dumps(TypeAdapter(schema).json_schema(), sort_keys=True)
+
+
+def compute_etag(schema, *version) -> str:
+    """Слабый ETag для ответа со схемой schema по его версии (строки crud.get_*_version и т.п.)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(_schema_fingerprint(schema).encode())
+    digest.update(repr(version).encode())
+    return f'W/"{digest.hexdigest()}"'
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Сравнение слабое (RFC 9110): префикс W/ не учитывается
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Ставит ETag в ответ обработчика; если клиент прислал такой же - возвращает готовый 304."""
+    headers = {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return None
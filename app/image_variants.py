@@ -0,0 +1,239 @@
+# app/image_variants.py
+"""
+Уменьшенные копии загруженных изображений: миниатюры фиксированного размера
+и сжатые WebP-версии для лент и списков.
+
+После загрузки роутер вызывает image_variant_pool.schedule(url) и сразу
+отвечает: декодирование и масштабирование идут в пуле процессов
+(IMAGE_VARIANT_WORKERS, CPU-работа не делит GIL с обработчиками), а URL
+готовых копий записываются отдельным потоком в столбцы строк, которые
+ссылаются на оригинал (VARIANT_SETS). Пока копии нет, столбец пуст и клиент
+показывает оригинал.
+
+Копии лежат рядом с оригиналом: <sha>_<вариант>.webp. Имя зависит только от
+содержимого оригинала, поэтому повторная загрузка той же картинки берет
+готовые файлы. Недостающие копии (например, для файлов, загруженных до
+появления пайплайна) строит python -m app.manage build-image-variants.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from . import models, principals, uploads
+from .database import SessionLocal
+
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", min(2, os.cpu_count() or 1))) # 0 - не строить
+IMAGE_VARIANT_MAX_PENDING = int(os.getenv("IMAGE_VARIANT_MAX_PENDING", 256))
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", 80)) # Качество WebP
+
+# Процессы пула не форкаются от процесса сервера: fork копировал бы его потоки, блокировки,
+# пулы соединений БД и открытые сокеты. forkserver (где его нет - spawn) запускает чистый процесс.
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+@dataclass(frozen=True)
+class Variant:
+    name: str # Суффикс имени файла
+    column: str # Столбец модели с URL копии
+    size: Tuple[int, int]
+    crop: bool # True - обрезать до точного размера, False - вписать с сохранением пропорций
+
+
+@dataclass(frozen=True)
+class VariantSet:
+    model: type
+    source_column: str # Столбец с URL оригинала
+    variants: Tuple[Variant, ...]
+
+
+# Подпапка загрузок (uploads.UploadKind.directory) -> какие копии строить
+VARIANT_SETS: Dict[str, VariantSet] = {
+    uploads.AVATARS.directory: VariantSet(models.User, "avatar_url", (
+        Variant("thumb", "avatar_thumb_url", (128, 128), crop=True),
+    )),
+    uploads.POST_IMAGES.directory: VariantSet(models.Post, "image_url", (
+        Variant("thumb", "image_thumb_url", (320, 320), crop=True),
+        Variant("preview", "image_preview_url", (1280, 1280), crop=False),
+    )),
+}
+
+
+def _variant_set_for(path: Path) -> Optional[VariantSet]:
+    return VARIANT_SETS.get(path.relative_to(uploads.UPLOAD_ROOT).parts[0])
+
+def _variant_path(source: Path, variant: Variant) -> Path:
+    return source.with_name(f"{source.stem}_{variant.name}.webp")
+
+
+# --- Выполняется в процессе пула ---
+def render_variants(source: Path, variants: Tuple[Variant, ...], quality: int = IMAGE_VARIANT_QUALITY) -> Dict[str, Path]:
+    """Строит недостающие копии изображения. Возвращает {имя варианта: путь к файлу}."""
+    targets = {variant.name: _variant_path(source, variant) for variant in variants}
+    missing = [variant for variant in variants if not targets[variant.name].exists()]
+    if not missing:
+        return targets
+    with Image.open(source) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе (не меньше нужного размера)
+        image.draft("RGB", max((variant.size for variant in missing), key=lambda size: size[0] * size[1]))
+        image = ImageOps.exif_transpose(image) # Поворот по EXIF: в копиях метаданных не будет
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.mode or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        for variant in missing:
+            if variant.crop:
+                resized = ImageOps.fit(image, variant.size, Image.LANCZOS)
+            else:
+                resized = image.copy()
+                resized.thumbnail(variant.size, Image.LANCZOS)
+            target = targets[variant.name]
+            # Запись через временный файл: читатели не увидят недописанную копию
+            fd, temp_path = tempfile.mkstemp(prefix=".variant-", dir=target.parent)
+            try:
+                with os.fdopen(fd, "wb") as temp_file:
+                    resized.save(temp_file, "WEBP", quality=quality, method=4)
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, target)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+    return targets
+
+
+# --- Запись результата в БД ---
+def record_variants(db: Session, variant_set: VariantSet, source_url: str, rendered: Dict[str, Path]) -> int:
+    """Проставляет URL копий всем строкам, ссылающимся на оригинал. Возвращает число строк."""
+    model = variant_set.model
+    values = {
+        variant.column: uploads.url_for_path(rendered[variant.name])
+        for variant in variant_set.variants if variant.name in rendered
+    }
+    ids = db.scalars(
+        update(model).where(getattr(model, variant_set.source_column) == source_url)
+        .values(**values).returning(model.id)
+    ).all()
+    db.commit()
+    if model is models.User:
+        for user_id in ids:
+            principals.invalidate_user(user_id) # Principal несет avatar_thumb_url
+    return len(ids)
+
+
+class ImageVariantPool:
+    """Фоновое построение копий: процессы для изображений, один поток для записи в БД."""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        workers: int = IMAGE_VARIANT_WORKERS,
+        max_pending: int = IMAGE_VARIANT_MAX_PENDING,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0 # Строятся + ждут в очереди
+        self._lock = threading.Lock()
+        # Создаются при первой загрузке: процессы не нужны, пока никто ничего не загрузил
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._recorder: Optional[ThreadPoolExecutor] = None
+
+    def schedule(self, url: Optional[str]) -> Optional[Future]:
+        """Ставит построение копий в очередь и сразу возвращается. None - копии не нужны или очередь полна."""
+        source = uploads.path_for_url(url) if url else None
+        variant_set = _variant_set_for(source) if source else None
+        if variant_set is None or self.workers <= 0:
+            return None
+        with self._lock:
+            if self.pending >= self.max_pending:
+                # Не блокируем загрузку: недостающее достроит build-image-variants
+                print(f"Warning: image variant queue is full, skipping {url}")
+                return None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_MP_CONTEXT)
+                self._recorder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-variants")
+            self.pending += 1
+            future = self._executor.submit(render_variants, source, variant_set.variants)
+            recorder = self._recorder
+        future.add_done_callback(lambda done: self._rendered(done, recorder, variant_set, url))
+        return future
+
+    def _rendered(self, future: Future, recorder: ThreadPoolExecutor, variant_set: VariantSet, url: str) -> None:
+        # Вызывается потоком ProcessPoolExecutor: запись в БД отдаем своему потоку.
+        # recorder - тот, что был при постановке задачи: shutdown мог уже убрать его из self
+        try:
+            rendered = future.result()
+        except Exception as e:
+            print(f"Warning: could not build image variants for {url}: {e!r}")
+            self._release()
+            return
+        recorder.submit(self._record, variant_set, url, rendered)
+
+    def _record(self, variant_set: VariantSet, url: str, rendered: Dict[str, Path]) -> None:
+        db = self.session_factory()
+        try:
+            record_variants(db, variant_set, url, rendered)
+        except Exception as e:
+            print(f"Warning: could not record image variants for {url}: {e!r}")
+        finally:
+            db.close()
+            self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        """Дожидается построения и записи уже поставленных копий."""
+        with self._lock:
+            executor, recorder = self._executor, self._recorder
+        if executor is None:
+            return
+        # Сначала процессы: их колбэки ставят запись в recorder, поэтому он закрывается последним
+        executor.shutdown(wait=True)
+        recorder.shutdown(wait=True)
+        with self._lock:
+            if self._executor is executor:
+                self._executor = self._recorder = None
+
+
+image_variant_pool = ImageVariantPool()
+
+
+def build_missing(db: Session, workers: int = IMAGE_VARIANT_WORKERS) -> int:
+    """Строит копии для всех оригиналов, у которых их нет (синхронно). Возвращает число оригиналов."""
+    jobs = []
+    for variant_set in VARIANT_SETS.values():
+        model = variant_set.model
+        source_column = getattr(model, variant_set.source_column)
+        missing = or_(*(getattr(model, variant.column).is_(None) for variant in variant_set.variants))
+        for url in db.scalars(select(source_column).where(source_column.isnot(None), missing).distinct()):
+            source = uploads.path_for_url(url)
+            if source is not None and source.is_file():
+                jobs.append((variant_set, url, source))
+    built = 0
+    with ProcessPoolExecutor(max_workers=max(workers, 1), mp_context=_MP_CONTEXT) as executor:
+        futures = {
+            executor.submit(render_variants, source, variant_set.variants): (variant_set, url)
+            for variant_set, url, source in jobs
+        }
+        for future in as_completed(futures):
+            variant_set, url = futures[future]
+            try:
+                rendered = future.result()
+            except Exception as e:
+                print(f"Warning: could not build image variants for {url}: {e!r}")
+                continue
+            record_variants(db, variant_set, url, rendered)
+            built += 1
+    return built
@@ -0,0 +1,211 @@
+# app/instrumentation.py
+"""
+Учет SQL-запросов каждого HTTP-запроса: число, суммарное время в БД и
+повторяющиеся запросы (отпечаток - текст SQL без значений параметров).
+
+События движка before/after_cursor_execute пишут в RequestStats текущего запроса
+(ContextVar: контекст копируется в threadpool синхронных обработчиков и в greenlet
+AsyncSession). Запросы вне HTTP-запроса (вебсокеты, фоновая запись сообщений,
+manage) не учитываются.
+
+- SQL_DEBUG_HEADERS=1 - заголовки X-DB-Query-Count / X-DB-Time-Ms / X-DB-Max-Repeats;
+- METRICS_ENABLED=1 - /metrics с гистограммами по маршрутам в текстовом формате
+  Prometheus (по умолчанию выключен: маршруты и задержки БД не для посторонних;
+  с METRICS_TOKEN доступен только с заголовком Authorization: Bearer <токен>);
+- превышение SQL_QUERY_BUDGET или SQL_REPEAT_THRESHOLD повторов одного запроса
+  (вероятный N+1) печатает предупреждение.
+"""
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "0").lower() in ("1", "true", "yes")
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", 25)) # Запросов к БД на один HTTP-запрос
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", 5)) # Повторов одного запроса до предупреждения о N+1
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") # Пусто - /metrics без авторизации (только для внутренней сети)
+
+# Границы корзин гистограмм
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 25, 50, 100)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_WHITESPACE = re.compile(r"\s+")
+# Список параметров IN (...) любой длины: ?, :name, %(name)s, $1
+_PARAM = r"(?:\?|:\w+|%\(\w+\)s|\$\d+)"
+_IN_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})+\s*\)")
+
+
+def fingerprint(statement: str) -> str:
+    """Нормализованный текст запроса: одинаков для вызовов с разными параметрами."""
+    return _IN_LIST.sub("(...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclass
+class RequestStats:
+    query_count: int = 0
+    db_time: float = 0.0 # Секунды
+    fingerprints: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.query_count += 1
+        self.db_time += elapsed
+        self.fingerprints[fingerprint(statement)] += 1
+
+    @property
+    def max_repeats(self) -> int:
+        return max(self.fingerprints.values(), default=0)
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        """Запросы, выполненные не меньше SQL_REPEAT_THRESHOLD раз (самые частые первыми)."""
+        return [(sql, count) for sql, count in self.fingerprints.most_common() if count >= SQL_REPEAT_THRESHOLD]
+
+
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_sql_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current_stats.get()
+
+
+# --- События движка ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current_stats.get()
+    started = conn.info.get("query_started_at")
+    if stats is None or not started:
+        return
+    stats.record(statement, time.perf_counter() - started.pop())
+
+def instrument_engines(*engines: Engine) -> None:
+    """Подключает учет запросов к движкам (повторный вызов для того же движка ничего не меняет)."""
+    for db_engine in engines:
+        if not event.contains(db_engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(db_engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(db_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# --- Метрики по маршрутам ---
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1) # Последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), self.bucket_counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class RouteMetrics:
+    """Потокобезопасные гистограммы по маршрутам (шаблон пути, а не конкретный URL)."""
+
+    HISTOGRAMS = (
+        ("http_request_duration_seconds", "Время обработки запроса", SECONDS_BUCKETS),
+        ("http_request_db_queries", "Число SQL-запросов за запрос", QUERY_COUNT_BUCKETS),
+        ("http_request_db_seconds", "Суммарное время SQL-запросов за запрос", SECONDS_BUCKETS),
+    )
+
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], Dict[str, Histogram]] = {}
+        self._over_budget: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, stats: RequestStats, duration: float) -> None:
+        with self._lock:
+            histograms = self._routes.get((method, route))
+            if histograms is None:
+                histograms = {name: Histogram(buckets) for name, _, buckets in self.HISTOGRAMS}
+                self._routes[(method, route)] = histograms
+            histograms["http_request_duration_seconds"].observe(duration)
+            histograms["http_request_db_queries"].observe(stats.query_count)
+            histograms["http_request_db_seconds"].observe(stats.db_time)
+            if stats.query_count > SQL_QUERY_BUDGET:
+                self._over_budget[(method, route)] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, help_text, _ in self.HISTOGRAMS:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (method, route), histograms in sorted(self._routes.items()):
+                    lines.extend(histograms[name].render(name, f'method="{method}",route="{route}"'))
+            lines.append("# HELP http_request_db_budget_exceeded_total Запросы сверх SQL_QUERY_BUDGET")
+            lines.append("# TYPE http_request_db_budget_exceeded_total counter")
+            for (method, route), count in sorted(self._over_budget.items()):
+                lines.append(f'http_request_db_budget_exceeded_total{{method="{method}",route="{route}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+route_metrics = RouteMetrics()
+
+
+def _warn_if_suspicious(method: str, route: str, stats: RequestStats) -> None:
+    repeated = stats.repeated()
+    if stats.query_count <= SQL_QUERY_BUDGET and not repeated:
+        return
+    print(
+        f"Warning: {method} {route} ran {stats.query_count} SQL queries "
+        f"({stats.db_time * 1000:.1f} ms, budget {SQL_QUERY_BUDGET})"
+    )
+    for sql, count in repeated[:3]:
+        print(f"  possible N+1, {count}x: {sql[:200]}")
+
+
+class SQLInstrumentationMiddleware:
+    """ASGI-middleware: заводит RequestStats на время HTTP-запроса и сводит итоги."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start" and SQL_DEBUG_HEADERS:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.query_count)
+                headers["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.2f}"
+                headers["X-DB-Max-Repeats"] = str(stats.max_repeats)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_stats.reset(token)
+            route = scope.get("route") # Ставит маршрутизатор FastAPI; статика и 404 не учитываются
+            if route is not None:
+                route_metrics.observe(scope["method"], route.path, stats, time.perf_counter() - started)
+                _warn_if_suspicious(scope["method"], route.path, stats)
@@ -0,0 +1,244 @@
+# app/lean.py
+"""
+Облегченный путь чтения для горячих списков: страницы сообщений, ленты,
+список чатов, профиль с постами.
+
+Вместо ORM-графа и проверки Pydantic (from_attributes) выбираются только
+нужные столбцы в dataclass со __slots__, повторяющие поля схем ответа, и
+кодируются orjson. Фильтры, порядок и границы страниц берутся из тех же
+функций crud, что и у ORM-версий, поэтому содержимое и форма ответа не
+меняются. В OpenAPI ответ по-прежнему описывает response_model; совпадение
+полей DTO и схем проверяется при импорте.
+"""
+import dataclasses
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import orjson
+from fastapi import Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas, timeline
+
+
+@dataclass(slots=True)
+class UserInfo:
+    id: int
+    username: str
+    nickname: Optional[str]
+    avatar_url: Optional[str]
+    avatar_thumb_url: Optional[str]
+
+
+@dataclass(slots=True)
+class Message:
+    content: str
+    file_url: Optional[str]
+    id: int
+    author: UserInfo
+    chat_id: int
+    timestamp: datetime
+
+
+@dataclass(slots=True)
+class PostSummary:
+    content: str
+    image_url: Optional[str]
+    id: int
+    author: UserInfo
+    timestamp: datetime
+    likes_count: int
+    comments_count: int
+    image_thumb_url: Optional[str]
+    image_preview_url: Optional[str]
+    liked_by_me: bool
+
+
+@dataclass(slots=True)
+class ChatInfo:
+    id: int
+    name: Optional[str]
+    is_private: bool
+    last_message: Optional[Message]
+    last_activity_at: Optional[datetime]
+    unread_count: int
+    participants: List[UserInfo]
+
+
+@dataclass(slots=True)
+class UserPublicProfile:
+    id: int
+    username: str
+    nickname: Optional[str]
+    avatar_url: Optional[str]
+    created_at: datetime
+    posts: List[PostSummary]
+    posts_count: int
+    followers_count: int
+    following_count: int
+    is_following: bool
+
+
+def _check_shape(dto, schema) -> None:
+    # DTO отдается клиенту в обход Pydantic: поле, добавленное только в схему, иначе молча пропадет
+    if [field.name for field in dataclasses.fields(dto)] != list(schema.model_fields):
+        raise RuntimeError(f"lean.{dto.__name__} does not match schemas.{schema.__name__}")
+
+for _dto, _schema in (
+    (UserInfo, schemas.UserInfo),
+    (Message, schemas.Message),
+    (PostSummary, schemas.PostSummary),
+    (ChatInfo, schemas.ChatInfo),
+    (UserPublicProfile, schemas.UserPublicProfile),
+):
+    _check_shape(_dto, _schema)
+
+
+# --- Столбцы и сборка DTO из строк ---
+_USER_COLUMNS = (
+    models.User.id, models.User.username, models.User.nickname,
+    models.User.avatar_url, models.User.avatar_thumb_url,
+)
+_MESSAGE_COLUMNS = (
+    models.Message.content, models.Message.file_url, models.Message.id,
+    models.Message.chat_id, models.Message.timestamp, *_USER_COLUMNS,
+)
+
+def _post_columns(user_id: Optional[int]) -> tuple:
+    return (
+        models.Post.content, models.Post.image_url, models.Post.id, models.Post.timestamp,
+        models.Post.likes_count, models.Post.comments_count,
+        models.Post.image_thumb_url, models.Post.image_preview_url,
+        crud.liked_by_me_column(user_id), *_USER_COLUMNS,
+    )
+
+def _message(row, start: int = 0) -> Message:
+    content, file_url, message_id, chat_id, timestamp = row[start:start + 5]
+    return Message(content, file_url, message_id, UserInfo(*row[start + 5:start + 10]), chat_id, timestamp)
+
+def _post(row) -> PostSummary:
+    return PostSummary(
+        row[0], row[1], row[2], UserInfo(*row[9:14]), row[3], row[4], row[5], row[6], row[7], bool(row[8])
+    )
+
+
+# --- Сообщения ---
+def get_messages(
+    db: Session,
+    chat_id: int,
+    skip: int = 0,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> List[Message]:
+    """То же, что crud.get_messages_for_chat, но DTO вместо ORM-объектов."""
+    statement = select(*_MESSAGE_COLUMNS).join(models.Message.author)
+    rows = db.execute(crud.messages_page(statement, chat_id, skip, limit, before_id, after_id)).all()
+    messages = [_message(row) for row in rows]
+    if after_id is not None:
+        messages.reverse() # В ответе сохраняем общий порядок "от новых к старым"
+    return messages
+
+
+# --- Посты ---
+def get_posts(db: Session, skip: int = 0, limit: int = 20, user_id: Optional[int] = None) -> List[PostSummary]:
+    """Общая лента (crud.get_posts + crud.set_liked_by_me) одним запросом."""
+    statement = select(*_post_columns(user_id)).join(models.Post.author)
+    return [_post(row) for row in db.execute(crud.posts_page(statement, skip, limit)).all()]
+
+def get_user_posts(
+    db: Session, author_id: int, skip: int = 0, limit: int = 20, user_id: Optional[int] = None
+) -> List[PostSummary]:
+    """Посты автора (crud.get_user_posts + crud.set_liked_by_me) одним запросом."""
+    statement = select(*_post_columns(user_id)).join(models.Post.author)
+    return [_post(row) for row in db.execute(crud.posts_page(statement, skip, limit, author_id=author_id)).all()]
+
+def get_timeline(db: Session, user_id: int, before_id: Optional[int] = None, limit: int = 20) -> List[PostSummary]:
+    """Домашняя лента (timeline.get_timeline + crud.set_liked_by_me)."""
+    post_ids = timeline.get_timeline_ids(db, user_id, before_id=before_id, limit=limit)
+    if not post_ids:
+        return []
+    statement = select(*_post_columns(user_id)).join(models.Post.author)\
+        .where(models.Post.id.in_(post_ids)).order_by(models.Post.id.desc())
+    return [_post(row) for row in db.execute(statement).all()]
+
+
+# --- Чаты ---
+def _participants(db: Session, chat_ids: List[int]) -> Dict[int, List[UserInfo]]:
+    # Тот же запрос, что selectinload(Chat.participants), и без ORDER BY: участники
+    # идут в том же порядке, что и в ORM-версии
+    members = models.user_chat_association
+    rows = db.execute(
+        select(members.c.chat_id, *_USER_COLUMNS)
+        .join(models.User, models.User.id == members.c.user_id)
+        .where(members.c.chat_id.in_(chat_ids))
+    ).all()
+    participants: Dict[int, List[UserInfo]] = {chat_id: [] for chat_id in chat_ids}
+    for row in rows:
+        participants[row[0]].append(UserInfo(*row[1:]))
+    return participants
+
+def get_user_chats(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[ChatInfo]:
+    """То же, что crud.get_user_chats: страница чатов с последним сообщением - один запрос, участники - второй."""
+    statement = select(
+        models.Chat.id, models.Chat.name, models.Chat.is_private, models.Chat.last_activity_at,
+        func.coalesce(models.ChatReadState.unread_count, 0), *_MESSAGE_COLUMNS,
+    ).outerjoin(
+        models.Message, models.Message.id == models.Chat.last_message_id
+    ).outerjoin(
+        models.User, models.User.id == models.Message.author_id
+    )
+    rows = db.execute(crud.user_chats_page(statement, user_id, skip, limit)).all()
+    if not rows:
+        return []
+    participants = _participants(db, [row[0] for row in rows])
+    return [
+        ChatInfo(
+            id=row[0],
+            name=row[1],
+            is_private=row[2],
+            last_message=_message(row, start=5) if row[7] is not None else None, # row[7] - ID сообщения
+            last_activity_at=row[3],
+            unread_count=row[4],
+            participants=participants[row[0]],
+        )
+        for row in rows
+    ]
+
+
+# --- Профиль ---
+def get_user_profile(
+    db: Session,
+    user: models.User,
+    counts: dict,
+    is_following: bool,
+    current_user_id: Optional[int] = None,
+    posts_limit: int = 20,
+) -> UserPublicProfile:
+    """Публичный профиль с последними постами; пользователь и счетчики уже загружены роутером."""
+    return UserPublicProfile(
+        id=user.id,
+        username=user.username,
+        nickname=user.nickname,
+        avatar_url=user.avatar_url,
+        created_at=user.created_at,
+        posts=get_user_posts(db, author_id=user.id, limit=posts_limit, user_id=current_user_id),
+        posts_count=counts["posts_count"],
+        followers_count=counts["followers_count"],
+        following_count=counts["following_count"],
+        is_following=is_following,
+    )
+
+
+def json_response(content, response: Optional[Response] = None) -> Response:
+    """
+    JSON-ответ из DTO этого модуля. Заголовки, выставленные обработчиком в response
+    (например, ETag - см. etags.py), переносятся: FastAPI не объединяет их с готовым Response.
+    """
+    # OPT_UTC_Z: время в UTC - с "Z", как у Pydantic
+    lean_response = Response(orjson.dumps(content, option=orjson.OPT_UTC_Z), media_type="application/json")
+    if response is not None:
+        lean_response.headers.update(response.headers)
+    return lean_response
@@ -6,32 +6,58 @@ from fastapi import ( # Импорты из fastapi/starlette в первую о
     HTTPException,
     status # <-- ДОБАВЛЕНО ЗДЕСЬ
 )
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 import os
-from jose import JWTError, jwt # Добавили импорт для middleware
+import secrets
+from contextlib import asynccontextmanager
+from typing import Optional
 
 # Импорты твоего приложения
-from . import models, schemas, crud, auth
-from .database import engine, SessionLocal, get_db, Base
+from . import models, schemas, crud, crud_async, auth, membership, instrumentation, static_assets
+from .database import async_engine, engine, get_db, get_async_db, read_engine
+from .image_variants import image_variant_pool
+from .message_writer import MESSAGE_BATCHING, message_writer
 from .routers import users, chats, posts, friends
 
-# Создаем таблицы в БД
-try:
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created/updated successfully.")
-except Exception as e:
-    print(f"Error creating/updating database tables: {e}")
+# Схема БД создается и обновляется миграциями (alembic upgrade head), а не при запуске
+
+# --- Запуск и остановка фоновых задач ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MESSAGE_BATCHING:
+        await message_writer.start() # Пакетная запись сообщений
+    yield
+    await message_writer.stop() # Дописываем то, что осталось в очереди
+    await run_in_threadpool(image_variant_pool.shutdown) # Достраиваем поставленные копии изображений
 
 # --- Настройка FastAPI ---
 app = FastAPI(
     title="Messenger & Social API",
     description="API для мессенджера с элементами соцсети",
     version="0.2.0",
+    lifespan=lifespan,
 )
 
+# --- Учет SQL-запросов по HTTP-запросам (см. instrumentation.py) ---
+instrumentation.instrument_engines(engine, read_engine, async_engine.sync_engine)
+app.add_middleware(instrumentation.SQLInstrumentationMiddleware)
+
+if instrumentation.METRICS_ENABLED:
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def read_metrics(request: Request):
+        """Гистограммы времени и числа SQL-запросов по маршрутам (формат Prometheus)."""
+        if instrumentation.METRICS_TOKEN and not secrets.compare_digest(
+            request.headers.get("authorization", "").encode(), f"Bearer {instrumentation.METRICS_TOKEN}".encode()
+        ):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+        return PlainTextResponse(
+            instrumentation.route_metrics.render(), media_type="text/plain; version=0.0.4"
+        )
+
 # --- Монтирование статических файлов ---
 static_dir = os.path.join(os.path.dirname(__file__), "../static")
 if not os.path.isdir(static_dir):
@@ -45,7 +71,9 @@ if not os.path.isdir(static_dir):
      os.makedirs(os.path.join(static_dir, "img"), exist_ok=True)
 
 
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# Скрипты и стили - по адресам с хешем содержимого, с долгим кешированием (см. static_assets.py)
+static_assets.init_assets()
+app.mount("/static", static_assets.CachedStaticFiles(directory=static_dir), name="static")
 
 # --- Настройка шаблонов Jinja2 ---
 templates_dir = os.path.join(os.path.dirname(__file__), "../templates")
@@ -55,62 +83,34 @@ if not os.path.isdir(templates_dir):
      os.makedirs(os.path.join(templates_dir, "partials"), exist_ok=True)
 
 templates = Jinja2Templates(directory=templates_dir)
+templates.env.globals["asset_url"] = static_assets.asset_url # {{ asset_url(request, 'js/feed.js') }}
 
 
 # --- Подключение API роутеров ---
 app.include_router(users.router, prefix="/api")
 app.include_router(chats.router, prefix="/api")
+app.include_router(chats.ws_router, prefix="/api")
 app.include_router(posts.router, prefix="/api")
 app.include_router(friends.router, prefix="/api")
 
-# --- Middleware для добавления current_user в Request (для шаблонов) ---
-@app.middleware("http")
-async def add_user_to_request_state(request: Request, call_next):
-    token = request.cookies.get("access_token")
-    user = None
-    db_session = None # Инициализируем переменную для сессии
-    try:
-        if token:
-            if token.startswith("Bearer "):
-                token = token.split(" ")[1]
-            try:
-                payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
-                username: str = payload.get("sub")
-                if username:
-                    db_session = SessionLocal() # Создаем сессию здесь
-                    user = crud.get_user_by_username(db_session, username=username)
-                    if user and not user.is_active:
-                        user = None
-            except JWTError:
-                user = None
-            except Exception as e:
-                 print(f"Error fetching user in middleware: {e}")
-                 user = None
-
-        request.state.current_user = user
-        response = await call_next(request)
-        return response
-    finally:
-        if db_session: # Закрываем сессию, если она была создана
-            db_session.close()
-
-
 # --- Эндпоинты для рендеринга HTML страниц ---
+# Пользователь страницы берется из cookie зависимостью auth.get_page_user:
+# общего middleware нет, поэтому статика и API не платят за его разрешение
 
 @app.get("/", response_class=HTMLResponse, name="root")
-async def read_root(request: Request):
+async def read_root(request: Request, current_user: Optional[auth.Principal] = Depends(auth.get_page_user)):
     """Рендерит главную страницу (перенаправляет на ленту или авторизацию)."""
-    if request.state.current_user:
+    if current_user:
         return RedirectResponse(url=request.url_for('render_feed'), status_code=status.HTTP_303_SEE_OTHER) # status теперь определен
     else:
         return RedirectResponse(url=request.url_for('render_auth'), status_code=status.HTTP_303_SEE_OTHER) # status теперь определен
 
 @app.get("/auth", response_class=HTMLResponse, name="render_auth")
-async def render_auth(request: Request):
+async def render_auth(request: Request, current_user: Optional[auth.Principal] = Depends(auth.get_page_user)):
     """Рендерит страницу авторизации/регистрации."""
-    if request.state.current_user:
+    if current_user:
         return RedirectResponse(url=request.url_for('render_feed'), status_code=status.HTTP_303_SEE_OTHER) # status теперь определен
-    return templates.TemplateResponse("auth.html", {"request": request, "current_user": request.state.current_user}) # Передаем current_user (будет None)
+    return templates.TemplateResponse("auth.html", {"request": request, "current_user": current_user}) # Передаем current_user (будет None)
 
 @app.get("/logout", name="logout")
 async def logout_and_redirect(request: Request):
@@ -121,58 +121,57 @@ async def logout_and_redirect(request: Request):
 
 
 @app.get("/im", response_class=HTMLResponse, name="render_im_list")
-async def render_im_list(request: Request):
+async def render_im_list(request: Request, current_user: Optional[auth.Principal] = Depends(auth.get_page_user)):
     """Рендерит страницу со списком чатов."""
-    current_user = request.state.current_user
     if not current_user:
         return RedirectResponse(url=request.url_for('render_auth'), status_code=status.HTTP_303_SEE_OTHER) # status теперь определен
     return templates.TemplateResponse("im.html", {"request": request, "current_user": current_user})
 
 @app.get("/im/{chat_id}", response_class=HTMLResponse, name="render_chat")
-async def render_chat(request: Request, chat_id: int, db: Session = Depends(get_db)):
+async def render_chat(
+    request: Request, chat_id: int, db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[auth.Principal] = Depends(auth.get_page_user)
+):
     """Рендерит страницу конкретного чата."""
-    current_user = request.state.current_user
     if not current_user:
         return RedirectResponse(url=request.url_for('render_auth'), status_code=status.HTTP_303_SEE_OTHER) # status теперь определен
 
-    db_chat = crud.get_chat(db, chat_id=chat_id)
-    if not db_chat:
-         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found") # Используем импортированный status
-
-    participant_ids = {p.id for p in db_chat.participants}
-    if current_user.id not in participant_ids:
-         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access forbidden") # Используем импортированный status
+    if not await crud_async.is_chat_member(db, chat_id=chat_id, user_id=current_user.id):
+        if not await crud_async.chat_exists(db, chat_id=chat_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found") # Используем импортированный status
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access forbidden") # Используем импортированный status
 
     return templates.TemplateResponse("chat.html", {"request": request, "chat_id": chat_id, "current_user": current_user})
 
 
 @app.get("/feed", response_class=HTMLResponse, name="render_feed")
-async def render_feed(request: Request):
+async def render_feed(request: Request, current_user: Optional[auth.Principal] = Depends(auth.get_page_user)):
     """Рендерит страницу с лентой постов."""
-    current_user = request.state.current_user
     if not current_user:
         return RedirectResponse(url=request.url_for('render_auth'), status_code=status.HTTP_303_SEE_OTHER) # status теперь определен
     return templates.TemplateResponse("feed.html", {"request": request, "current_user": current_user})
 
 
 @app.get("/friends", response_class=HTMLResponse, name="render_friends")
-async def render_friends(request: Request):
+async def render_friends(request: Request, current_user: Optional[auth.Principal] = Depends(auth.get_page_user)):
     """Рендерит страницу со списком друзей (подписок/подписчиков)."""
-    current_user = request.state.current_user
     if not current_user:
         return RedirectResponse(url=request.url_for('render_auth'), status_code=status.HTTP_303_SEE_OTHER) # status теперь определен
     return templates.TemplateResponse("friends.html", {"request": request, "current_user": current_user})
 
 
 @app.get("/profile/{username}", response_class=HTMLResponse, name="render_profile")
-async def render_profile(request: Request, username: str, db: Session = Depends(get_db)):
+async def render_profile(
+    request: Request, username: str, db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[auth.Principal] = Depends(auth.get_page_user)
+):
     """Рендерит страницу профиля пользователя."""
-    profile_user = crud.get_user_by_username(db, username=username)
+    profile_user = await crud_async.get_user_by_username(db, username=username) # Без загрузки связей
     if not profile_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found") # Используем импортированный status
 
     return templates.TemplateResponse("profile.html", {
         "request": request,
         "profile_username": profile_user.username,
-        "current_user": request.state.current_user
+        "current_user": current_user
     })
\ No newline at end of file
@@ -0,0 +1,133 @@
+# app/manage.py
+"""
+Служебные команды обслуживания БД.
+
+Запуск: python -m app.manage <команда>
+"""
+import argparse
+
+from . import crud, image_variants, query_plans, search, timeline, uploads
+from .database import SessionLocal
+
+
+def backfill_chat_activity(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        updated = crud.backfill_chat_activity(db)
+    finally:
+        db.close()
+    print(f"Chats updated: {updated}")
+
+
+def backfill_read_states(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        created = crud.backfill_read_states(db)
+    finally:
+        db.close()
+    print(f"Read states created: {created}")
+
+
+def backfill_direct_keys(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        updated = crud.backfill_direct_chat_keys(db)
+    finally:
+        db.close()
+    print(f"Private chats keyed: {updated}")
+
+
+def rebuild_search_index(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        indexed = search.rebuild_index(db)
+    finally:
+        db.close()
+    print(f"Messages indexed: {indexed}")
+
+
+def backfill_post_counters(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        updated = crud.backfill_post_counters(db)
+    finally:
+        db.close()
+    print(f"Posts recounted: {updated}")
+
+
+def rebuild_timelines(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        entries = timeline.rebuild(db)
+    finally:
+        db.close()
+    print(f"Timeline entries: {entries}")
+
+
+def trim_timelines(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        removed = timeline.trim_all(db)
+    finally:
+        db.close()
+    print(f"Timeline entries removed: {removed}")
+
+
+def gc_uploads(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        removed = uploads.collect_garbage(db)
+    finally:
+        db.close()
+    print(f"Unreferenced uploads removed: {removed}")
+
+
+def build_image_variants(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        built = image_variants.build_missing(db)
+    finally:
+        db.close()
+    print(f"Images with new variants: {built}")
+
+
+def check_query_plans(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        checks = query_plans.check_query_plans(db)
+    finally:
+        db.close()
+    for check in checks:
+        print(f"{'OK  ' if check.ok else 'FAIL'} {check.name}: {check.expected_index}")
+        if not check.ok:
+            print("     " + check.plan.replace("\n", "\n     "))
+    if not all(check.ok for check in checks):
+        raise SystemExit(1)
+
+
+COMMANDS = {
+    "backfill-chat-activity": (backfill_chat_activity, "Заполнить last_message_id / last_activity_at у старых чатов"),
+    "backfill-read-states": (backfill_read_states, "Создать курсоры прочтения для существующих участников чатов"),
+    "backfill-direct-keys": (backfill_direct_keys, "Проставить ключ пары пользователей старым личным чатам"),
+    "rebuild-search-index": (rebuild_search_index, "Перестроить полнотекстовый индекс по всей истории сообщений"),
+    "backfill-post-counters": (backfill_post_counters, "Пересчитать счетчики лайков и комментариев постов"),
+    "rebuild-timelines": (rebuild_timelines, "Пересчитать счетчики подписчиков и заново заполнить домашние ленты"),
+    "trim-timelines": (trim_timelines, "Обрезать домашние ленты до TIMELINE_MAX_ENTRIES последних записей"),
+    "gc-uploads": (gc_uploads, "Удалить загруженные файлы, на которые больше нет ссылок"),
+    "build-image-variants": (build_image_variants, "Построить недостающие уменьшенные копии загруженных изображений"),
+    "check-query-plans": (check_query_plans, "Проверить, что основные запросы используют свои индексы"),
+}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Служебные команды мессенджера")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (handler, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.set_defaults(handler=handler)
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# app/membership.py
+"""
+Проверка участия пользователя в чате без загрузки списка участников.
+
+Для каждого чата кешируется множество ID участников (ограниченный LRU с TTL).
+Чаты крупнее MAX_CACHED_MEMBERS не кешируются - для них выполняется EXISTS
+по первичному ключу user_chat_association.
+Кеш локален для процесса: crud сбрасывает запись чата при изменении состава,
+а TTL ограничивает устаревание между воркерами.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import FrozenSet, Optional
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", 1024)) # Сколько чатов держим в кеше
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", 60)) # Секунды
+MAX_CACHED_MEMBERS = int(os.getenv("MEMBERSHIP_MAX_CACHED_MEMBERS", 10000))
+
+# Метка "чат слишком большой для кеша, используем EXISTS"
+_LARGE_CHAT = object()
+
+
+class ChatMembershipCache:
+    """Потокобезопасный LRU: chat_id -> frozenset ID участников."""
+
+    def __init__(self, max_chats: int = MEMBERSHIP_CACHE_SIZE, ttl_seconds: float = MEMBERSHIP_CACHE_TTL):
+        self.max_chats = max_chats
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int) -> Optional[FrozenSet[int]]:
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                return None
+            expires_at, member_ids = entry
+            if expires_at < time.monotonic():
+                del self._entries[chat_id]
+                return None
+            self._entries.move_to_end(chat_id)
+            return member_ids
+
+    def put(self, chat_id: int, member_ids: FrozenSet[int]) -> None:
+        with self._lock:
+            self._entries[chat_id] = (time.monotonic() + self.ttl_seconds, member_ids)
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_chats:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id: int) -> None:
+        with self._lock:
+            self._entries.pop(chat_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+membership_cache = ChatMembershipCache()
+
+
+def _member_exists(db: Session, chat_id: int, user_id: int) -> bool:
+    """Индексный EXISTS по первичному ключу (user_id, chat_id)."""
+    association = models.user_chat_association
+    return db.query(exists().where(
+        association.c.user_id == user_id,
+        association.c.chat_id == chat_id
+    )).scalar()
+
+def _load_member_ids(db: Session, chat_id: int):
+    """ID участников чата (только один столбец) или _LARGE_CHAT для очень больших чатов."""
+    association = models.user_chat_association
+    rows = db.execute(
+        select(association.c.user_id).where(association.c.chat_id == chat_id).limit(MAX_CACHED_MEMBERS + 1)
+    ).scalars().all()
+    if len(rows) > MAX_CACHED_MEMBERS:
+        return _LARGE_CHAT
+    return frozenset(rows)
+
+
+def is_chat_member(db: Session, chat_id: int, user_id: int) -> bool:
+    """Состоит ли пользователь в чате."""
+    member_ids = membership_cache.get(chat_id)
+    if member_ids is None:
+        member_ids = _load_member_ids(db, chat_id)
+        membership_cache.put(chat_id, member_ids)
+    if member_ids is _LARGE_CHAT:
+        return _member_exists(db, chat_id, user_id)
+    return user_id in member_ids
+
+def chat_exists(db: Session, chat_id: int) -> bool:
+    """Дешевая проверка существования чата (для выбора между 404 и 403)."""
+    return db.query(exists().where(models.Chat.id == chat_id)).scalar()
+
+def invalidate(chat_id: int) -> None:
+    """Сбрасывает кеш состава чата. Вызывается из crud при изменении участников."""
+    membership_cache.invalidate(chat_id)
@@ -0,0 +1,157 @@
+# app/message_writer.py
+"""
+Необязательная отложенная (write-behind) запись сообщений пачками.
+
+Входящие сообщения складываются во внутрипроцессную очередь, а один фоновый
+flusher фиксирует их группами - раз в MESSAGE_BATCH_MAX_DELAY_MS или по
+набору MESSAGE_BATCH_MAX_SIZE штук - одним commit через crud.create_messages.
+Каждый отправитель ждет свой future и получает присвоенные ID и timestamp.
+Очередь одна и разбирается по порядку, поэтому порядок сообщений в чате сохраняется.
+
+Включается переменной окружения MESSAGE_BATCHING=1.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import event
+
+from . import crud, schemas
+from .database import SessionLocal
+
+MESSAGE_BATCHING = os.getenv("MESSAGE_BATCHING", "0").lower() in ("1", "true", "yes")
+MESSAGE_BATCH_MAX_SIZE = int(os.getenv("MESSAGE_BATCH_MAX_SIZE", 100))
+MESSAGE_BATCH_MAX_DELAY_MS = float(os.getenv("MESSAGE_BATCH_MAX_DELAY_MS", 10))
+MESSAGE_BATCH_QUEUE_SIZE = int(os.getenv("MESSAGE_BATCH_QUEUE_SIZE", 10000))
+
+
+class BatchNotCommitted(Exception):
+    """Пачка откатилась до commit (причина - в __cause__): ее сообщения можно записать заново."""
+
+
+class MessageBatchWriter:
+    """Очередь сообщений с фоновой записью пачками."""
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_batch_size: int = MESSAGE_BATCH_MAX_SIZE,
+        max_delay_ms: float = MESSAGE_BATCH_MAX_DELAY_MS,
+        queue_size: int = MESSAGE_BATCH_QUEUE_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.queue_size = queue_size
+        self.commits = 0 # Статистика: сколько пачек записано
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Отдельный поток записи: общий threadpool может быть занят обработчиками,
+        # а один поток к тому же сохраняет порядок пачек
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="message-writer")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Дописывает все, что уже в очереди, и останавливает flusher."""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def submit(self, message: schemas.MessageCreate, author_id: int) -> Tuple[int, datetime]:
+        """Ставит сообщение в очередь и ждет записи. Возвращает (id, timestamp)."""
+        if not self.running:
+            raise RuntimeError("MessageBatchWriter is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, author_id, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            # Добираем пачку, пока не истекло окно ожидания или не набран размер
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        items = [(message, author_id) for message, author_id, _ in batch]
+        try:
+            results = await loop.run_in_executor(self._executor, self._write_batch, items)
+        except BatchNotCommitted:
+            # Одно плохое сообщение не должно ронять всю пачку - пишем по одному
+            results = []
+            for item in items:
+                try:
+                    results.append((await loop.run_in_executor(self._executor, self._write_batch, [item]))[0])
+                except BatchNotCommitted as e:
+                    results.append(e.__cause__)
+                except Exception as e:
+                    results.append(e)
+        except Exception as e:
+            # Ошибка после commit: сообщения уже записаны, повтор создал бы дубликаты
+            results = [e] * len(items)
+        for (_, _, future), result in zip(batch, results):
+            if future.done(): # Отправитель мог отменить ожидание
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _write_batch(self, items: List[Tuple[schemas.MessageCreate, int]]) -> List[Tuple[int, datetime]]:
+        db = self.session_factory()
+        committed = False
+
+        def mark_committed(session) -> None:
+            nonlocal committed
+            committed = True
+
+        event.listen(db, "after_commit", mark_committed)
+        try:
+            try:
+                messages = crud.create_messages(db, items)
+            except Exception as e:
+                if not committed:
+                    raise BatchNotCommitted() from e
+                raise
+            self.commits += 1
+            return [(message.id, message.timestamp) for message in messages]
+        finally:
+            db.close()
+
+
+# Единственный экземпляр на процесс (запускается в lifespan приложения, если включен)
+message_writer = MessageBatchWriter()
@@ -1,7 +1,7 @@
 # app/models.py
 import datetime
 from sqlalchemy import (Boolean, Column, ForeignKey, Integer, String, Text,
-                        DateTime, Table, MetaData)
+                        DateTime, Table, MetaData, Index, UniqueConstraint)
 from sqlalchemy.orm import relationship, Mapped, mapped_column # Используем новый синтаксис Mapped
 from sqlalchemy.sql import func
 from .database import Base
@@ -12,7 +12,9 @@ from .database import Base
 user_chat_association = Table(
     'user_chat_association', Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True),
-    Column('chat_id', Integer, ForeignKey('chats.id', ondelete="CASCADE"), primary_key=True)
+    Column('chat_id', Integer, ForeignKey('chats.id', ondelete="CASCADE"), primary_key=True),
+    # Выборка участников чата (первичный ключ начинается с user_id)
+    Index('ix_user_chat_association_chat_id', 'chat_id')
 )
 
 # Связь Пользователь-Пользователь (Дружба)
@@ -23,7 +25,10 @@ friendship_association = Table(
     # Тот, кто подписывается (фолловер)
     Column('follower_id', Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True),
     # Тот, на кого подписываются
-    Column('followed_id', Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    Column('followed_id', Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True),
+    # Выборка подписчиков: fan-out ленты (см. timeline.py) и страницы подписчиков по курсору
+    # (первичный ключ (follower_id, followed_id) обслуживает подписки)
+    Index('ix_friendships_followed_id_follower_id', 'followed_id', 'follower_id')
 )
 
 
@@ -46,9 +51,13 @@ class User(Base):
     hashed_password: Mapped[str] = mapped_column(String, nullable=False)
     nickname: Mapped[str | None] = mapped_column(String, index=True)
     avatar_url: Mapped[str | None] = mapped_column(String)
+    # Миниатюра аватара (заполняется фоново, см. image_variants.py); None - еще не готова
+    avatar_thumb_url: Mapped[str | None] = mapped_column(String)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Денормализованный счетчик подписчиков (crud.add_follow / crud.remove_follow)
+    followers_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # Связи
     messages: Mapped[list["Message"]] = relationship("Message", back_populates="author")
@@ -80,19 +89,52 @@ class User(Base):
 
 class Chat(Base):
     __tablename__ = "chats"
+    __table_args__ = (
+        # Не больше одного личного чата на пару пользователей (у групп пара пустая - NULL)
+        UniqueConstraint("direct_user_low_id", "direct_user_high_id", name="uq_chats_direct_pair"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str | None] = mapped_column(String, index=True)
     is_private: Mapped[bool] = mapped_column(Boolean, default=False) # Флаг для личных чатов
+    # Каноническая пара участников личного чата: (меньший ID, больший ID)
+    direct_user_low_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    direct_user_high_id: Mapped[int | None] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # Денормализованный указатель на последнее сообщение (обновляется в crud.create_message)
+    # use_alter: chats и messages ссылаются друг на друга
+    last_message_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("messages.id", ondelete="SET NULL", use_alter=True, name="fk_chats_last_message_id")
+    )
+    last_activity_at: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=True), index=True)
 
     # Связи
-    messages: Mapped[list["Message"]] = relationship("Message", back_populates="chat", order_by="Message.timestamp", cascade="all, delete-orphan")
+    messages: Mapped[list["Message"]] = relationship("Message", back_populates="chat", foreign_keys="Message.chat_id", order_by="Message.timestamp", cascade="all, delete-orphan")
     participants: Mapped[list["User"]] = relationship("User", secondary=user_chat_association, back_populates="chats")
+    # Только для чтения: пишется через UPDATE в crud.create_message
+    last_message: Mapped["Message | None"] = relationship("Message", foreign_keys=[last_message_id], viewonly=True)
+
+
+class ChatReadState(Base):
+    """Курсор прочтения участника чата и инкрементально поддерживаемый счетчик непрочитанных."""
+    __tablename__ = "chat_read_states"
+    __table_args__ = (
+        # UPDATE счетчиков всех участников при новом сообщении (crud.create_message)
+        Index("ix_chat_read_states_chat_id", "chat_id"),
+    )
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    chat_id: Mapped[int] = mapped_column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), primary_key=True)
+    last_read_message_id: Mapped[int | None] = mapped_column(Integer)
+    unread_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset-пагинация и синхронизация сообщений чата (см. crud.get_messages_for_chat)
+        Index("ix_messages_chat_id_timestamp_id", "chat_id", "timestamp", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -104,18 +146,30 @@ class Message(Base):
 
     # Связи
     author: Mapped["User"] = relationship("User", back_populates="messages")
-    chat: Mapped["Chat"] = relationship("Chat", back_populates="messages")
+    chat: Mapped["Chat"] = relationship("Chat", back_populates="messages", foreign_keys=[chat_id])
 
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        # Посты автора от новых к старым: чтение ленты "на лету" (по id, см. timeline.py)
+        # и страница профиля (по timestamp, см. crud.get_user_posts)
+        Index("ix_posts_author_id_id", "author_id", "id"),
+        Index("ix_posts_author_id_timestamp", "author_id", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     image_url: Mapped[str | None] = mapped_column(String)
+    # Уменьшенные копии картинки (заполняются фоново, см. image_variants.py)
+    image_thumb_url: Mapped[str | None] = mapped_column(String)
+    image_preview_url: Mapped[str | None] = mapped_column(String)
     timestamp: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     author_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Денормализованные счетчики (атомарно обновляются в crud при лайках и комментариях)
+    likes_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    comments_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # Связи
     author: Mapped["User"] = relationship("User", back_populates="posts")
@@ -125,6 +179,10 @@ class Post(Base):
 
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        # Комментарии поста по времени (crud.get_post_comments)
+        Index("ix_comments_post_id_timestamp", "post_id", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -135,4 +193,19 @@ class Comment(Base):
 
     # Связи
     author: Mapped["User"] = relationship("User", back_populates="comments")
-    post: Mapped["Post"] = relationship("Post", back_populates="comments")
\ No newline at end of file
+    post: Mapped["Post"] = relationship("Post", back_populates="comments")
+
+
+class TimelineEntry(Base):
+    """Запись домашней ленты подписчика: пост, разосланный при создании (fan-out-on-write)."""
+    __tablename__ = "timeline_entries"
+    __table_args__ = (
+        # Удаление поста из всех лент
+        Index("ix_timeline_entries_post_id", "post_id"),
+    )
+
+    # Первичный ключ (user_id, post_id) - страница ленты читается одним диапазоном индекса
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_id: Mapped[int] = mapped_column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    # Автор поста: чтобы убрать его посты из ленты при отписке
+    author_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,84 @@
+# app/passwords.py
+"""
+Хеширование и проверка паролей в отдельном ограниченном пуле потоков.
+
+bcrypt тратит 100-300 мс CPU на операцию; в event loop это останавливает
+весь воркер, а в общем threadpool - занимает потоки остальных запросов.
+Здесь работает PASSWORD_HASH_WORKERS потоков (bcrypt отпускает GIL), а
+очередь ограничена PASSWORD_HASH_MAX_PENDING операциями: лишние сразу
+получают PasswordPoolBusy (в API - 429), а не копятся.
+
+Стоимость задается BCRYPT_ROUNDS; хеши с меньшей стоимостью
+перехешируются при успешном входе (verify_and_update).
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))
+
+# Настройка для хеширования паролей
+# min_rounds: хеши дешевле текущей настройки считаются устаревшими (needs_update)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+
+class PasswordPoolBusy(Exception):
+    """Очередь хеширования переполнена - запрос нужно отклонить."""
+
+
+class PasswordHasherPool:
+    """Пул потоков для bcrypt с ограничением числа ожидающих операций."""
+
+    def __init__(
+        self,
+        context: CryptContext = pwd_context,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_pending: int = PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.context = context
+        self.max_pending = max_pending
+        self.pending = 0 # Выполняются + ждут в очереди
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise PasswordPoolBusy()
+            self.pending += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    # Асинхронные версии - для async-обработчиков (event loop не блокируется)
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(верен ли пароль, новый хеш или None, если перехеширование не нужно)."""
+        return await asyncio.wrap_future(self._submit(self.context.verify_and_update, password, hashed_password))
+
+    # Синхронные версии - для обработчиков, уже работающих в threadpool
+    def hash_sync(self, password: str) -> str:
+        return self._submit(self.context.hash, password).result()
+
+    def verify_sync(self, password: str, hashed_password: str) -> bool:
+        return self._submit(self.context.verify, password, hashed_password).result()
+
+
+password_pool = PasswordHasherPool()
@@ -0,0 +1,110 @@
+# app/principals.py
+"""
+Легкое представление аутентифицированного пользователя (principal).
+
+Для авторизации достаточно нескольких столбцов users - без подписок, подписчиков
+и постов. Разрешенный principal
+кешируется по токену (ограниченный LRU с коротким TTL); crud сбрасывает записи
+пользователя при изменении профиля или деактивации, а TTL ограничивает
+устаревание между воркерами.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000)) # Сколько токенов держим в кеше
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", 30)) # Секунды
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Столбцы пользователя, нужные авторизации, шаблонам и схеме UserInfo."""
+    id: int
+    username: str
+    email: str
+    nickname: Optional[str]
+    avatar_url: Optional[str]
+    avatar_thumb_url: Optional[str]
+    is_active: bool
+    is_admin: bool
+
+
+_PRINCIPAL_COLUMNS = (
+    models.User.id,
+    models.User.username,
+    models.User.email,
+    models.User.nickname,
+    models.User.avatar_url,
+    models.User.avatar_thumb_url,
+    models.User.is_active,
+    models.User.is_admin,
+)
+
+
+def load_principal(db: Session, username: str) -> Optional[Principal]:
+    """Один SELECT нужных столбцов, без загрузки связей."""
+    row = db.execute(
+        select(*_PRINCIPAL_COLUMNS).where(models.User.username == username)
+    ).first()
+    if row is None:
+        return None
+    return Principal(**row._mapping)
+
+
+class PrincipalCache:
+    """Потокобезопасный LRU: токен -> Principal."""
+
+    def __init__(self, max_tokens: int = PRINCIPAL_CACHE_SIZE, ttl_seconds: float = PRINCIPAL_CACHE_TTL):
+        self.max_tokens = max_tokens
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, principal = entry
+            if expires_at < time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token: str, principal: Principal, token_expires_at: Optional[float] = None) -> None:
+        # Запись не переживает сам токен
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._entries[token] = (expires_at, principal)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_tokens:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            stale = [token for token, (_, principal) in self._entries.items() if principal.id == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+def invalidate_user(user_id: int) -> None:
+    """Сбрасывает закешированные principal пользователя. Вызывается из crud при изменении профиля."""
+    principal_cache.invalidate_user(user_id)
@@ -0,0 +1,82 @@
+# app/query_plans.py
+"""
+Проверка планов основных запросов: использует ли БД индексы, созданные под них
+миграциями (migrations/versions/0002_query_indexes.py).
+
+Запросы повторяют фильтры и сортировку соответствующих функций crud/timeline.
+SQLite: EXPLAIN QUERY PLAN. PostgreSQL: EXPLAIN с enable_seqscan = off, иначе на
+маленькой таблице планировщик честно выберет полный просмотр.
+Запуск: python -m app.manage check-query-plans
+"""
+from dataclasses import dataclass
+from typing import List
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from . import models
+
+SAMPLE_ID = 1 # Значение параметров: на план влияет форма запроса, а не данные
+
+
+@dataclass(frozen=True)
+class PlanCheck:
+    name: str
+    expected_index: str
+    plan: str
+
+    @property
+    def ok(self) -> bool:
+        return self.expected_index in self.plan
+
+
+def _expected_plans():
+    """(название, ожидаемый индекс, запрос)."""
+    friendships = models.friendship_association
+    chat_members = models.user_chat_association
+    return [
+        ("crud.get_messages_for_chat", "ix_messages_chat_id_timestamp_id",
+         select(models.Message).where(models.Message.chat_id == SAMPLE_ID)
+         .order_by(models.Message.timestamp.desc(), models.Message.id.desc()).limit(20)),
+        ("crud.get_user_posts", "ix_posts_author_id_timestamp",
+         select(models.Post).where(models.Post.author_id == SAMPLE_ID)
+         .order_by(models.Post.timestamp.desc(), models.Post.id.desc()).limit(20)),
+        ("timeline.get_timeline (pulled)", "ix_posts_author_id_id",
+         select(models.Post.id).where(models.Post.author_id == SAMPLE_ID)
+         .order_by(models.Post.id.desc()).limit(20)),
+        ("crud.get_post_comments", "ix_comments_post_id_timestamp",
+         select(models.Comment).where(models.Comment.post_id == SAMPLE_ID)
+         .order_by(models.Comment.timestamp.asc(), models.Comment.id.asc()).limit(50)),
+        ("crud.get_followers", "ix_friendships_followed_id_follower_id",
+         select(friendships.c.follower_id).where(friendships.c.followed_id == SAMPLE_ID)
+         .order_by(friendships.c.follower_id.desc()).limit(50)),
+        ("membership (chat members)", "ix_user_chat_association_chat_id",
+         select(chat_members.c.user_id).where(chat_members.c.chat_id == SAMPLE_ID)),
+        ("crud.create_message (unread counters)", "ix_chat_read_states_chat_id",
+         select(models.ChatReadState.user_id).where(models.ChatReadState.chat_id == SAMPLE_ID)),
+        ("timeline.remove_post", "ix_timeline_entries_post_id",
+         delete(models.TimelineEntry).where(models.TimelineEntry.post_id == SAMPLE_ID)),
+    ]
+
+
+def _explain(db: Session, statement) -> str:
+    dialect = db.get_bind().dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if dialect.name == "sqlite":
+        rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        return "\n".join(row[3] for row in rows)
+    rows = db.execute(text(f"EXPLAIN {sql}")).all()
+    return "\n".join(row[0] for row in rows)
+
+
+def check_query_plans(db: Session) -> List[PlanCheck]:
+    """Планы всех основных запросов. Ничего не меняет: транзакция откатывается."""
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SET LOCAL enable_seqscan = off"))
+        return [
+            PlanCheck(name=name, expected_index=index_name, plan=_explain(db, statement))
+            for name, index_name, statement in _expected_plans()
+        ]
+    finally:
+        db.rollback()
@@ -0,0 +1,77 @@
+# app/realtime.py
+import asyncio
+from typing import Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+# Сколько событий может ждать отправки в одном сокете.
+# Медленный клиент, переполнивший очередь, отключается (он догрузит историю через REST)
+CONNECTION_QUEUE_SIZE = 100
+
+
+class ChatConnection:
+    """Одно WebSocket-подключение пользователя с собственной очередью отправки."""
+
+    def __init__(self, websocket: WebSocket, user_id: int, queue_size: int = CONNECTION_QUEUE_SIZE):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.chat_ids: Set[int] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    async def sender(self) -> None:
+        """Отправляет события из очереди в сокет, пока подключение живо."""
+        while True:
+            payload = await self.queue.get()
+            if payload is None: # Сигнал остановки
+                return
+            await self.websocket.send_json(payload)
+
+
+class ChatHub:
+    """
+    Внутрипроцессный хаб рассылки сообщений: chat_id -> подключенные сокеты.
+    Работает в рамках одного воркера; все методы вызываются из потока event loop.
+    """
+
+    def __init__(self):
+        self._chats: Dict[int, Set[ChatConnection]] = {}
+
+    def subscribe(self, connection: ChatConnection, chat_ids: Iterable[int]) -> None:
+        for chat_id in chat_ids:
+            self._chats.setdefault(chat_id, set()).add(connection)
+            connection.chat_ids.add(chat_id)
+
+    def unsubscribe(self, connection: ChatConnection) -> None:
+        for chat_id in connection.chat_ids:
+            subscribers = self._chats.get(chat_id)
+            if subscribers is None:
+                continue
+            subscribers.discard(connection)
+            if not subscribers:
+                del self._chats[chat_id]
+        connection.chat_ids.clear()
+
+    def publish(self, chat_id: int, payload: dict) -> int:
+        """Ставит событие в очереди всех подписчиков чата. Возвращает число получателей."""
+        delivered = 0
+        for connection in list(self._chats.get(chat_id, ())):
+            try:
+                connection.queue.put_nowait(payload)
+                delivered += 1
+            except asyncio.QueueFull:
+                # Не блокируем рассылку из-за одного медленного клиента
+                connection.overflowed = True
+                self.unsubscribe(connection)
+                asyncio.ensure_future(connection.websocket.close(code=1013))
+        return delivered
+
+    def subscriber_count(self, chat_id: Optional[int] = None) -> int:
+        if chat_id is not None:
+            return len(self._chats.get(chat_id, ()))
+        return len({c for subscribers in self._chats.values() for c in subscribers})
+
+
+# Единственный экземпляр хаба на процесс
+chat_hub = ChatHub()
+
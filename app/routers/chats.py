@@ -1,10 +1,15 @@
 # app/routers/chats.py
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Tuple
 
-from .. import crud, schemas, models, auth
-from ..database import get_db
+from .. import crud, etags, lean, schemas, models, auth, membership, search
+from ..database import get_db, SessionLocal
+from ..message_writer import message_writer
+from ..realtime import ChatConnection, chat_hub
 
 router = APIRouter(
     prefix="/chats",
@@ -12,20 +17,34 @@ router = APIRouter(
     dependencies=[Depends(auth.get_current_active_user)],
 )
 
+# Отдельный роутер для WebSocket: OAuth2PasswordBearer работает только с HTTP-запросами,
+# поэтому сокет аутентифицируется сам (токен в ?token=... или в куке access_token)
+ws_router = APIRouter(
+    prefix="/chats",
+    tags=["chats"],
+)
+
+def _ensure_chat_member(db: Session, chat_id: int, user_id: int, detail: str = "Not enough permissions") -> None:
+    """404, если чата нет, и 403, если пользователь в нем не состоит. Участники не загружаются."""
+    if membership.is_chat_member(db, chat_id=chat_id, user_id=user_id):
+        return
+    if not membership.chat_exists(db, chat_id=chat_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
 # --- Создание ГРУППОВОГО чата ---
 @router.post("/group", response_model=schemas.ChatInfo, status_code=status.HTTP_201_CREATED)
 def create_group_chat_endpoint(
     chat_data: schemas.ChatCreate, # Используем ChatCreate для группы
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     """Создает новый ГРУППОВОЙ чат."""
     if not chat_data.name:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Group chat name is required")
 
     created_chat = crud.create_group_chat(db=db, chat_data=chat_data, creator_id=current_user.id)
-    # Добавим последнее сообщение (пока None) и участников для ChatInfo
-    created_chat.last_message = None
+    # last_message у нового чата пустой, участники загружены в CRUD
     return created_chat # Pydantic конвертирует в ChatInfo
 
 # --- Получение или создание ЛИЧНОГО чата ---
@@ -33,7 +52,7 @@ def create_group_chat_endpoint(
 def get_or_create_direct_chat(
     target_username: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     """Находит существующий или создает новый ЛИЧНЫЙ чат с пользователем target_username."""
     target_user = crud.get_user_by_username(db, username=target_username)
@@ -45,8 +64,7 @@ def get_or_create_direct_chat(
     # Ищем или создаем приватный чат
     chat = crud.create_private_chat(db=db, user1=current_user, user2=target_user)
 
-    # Получаем последнее сообщение для ChatInfo
-    chat.last_message = crud.get_messages_for_chat(db, chat_id=chat.id, limit=1)[0] if chat.messages else None
+    # Последнее сообщение ChatInfo берет по chat.last_message_id
     # Загрузим участников для ChatInfo (если не загружены в create_private_chat)
     db.refresh(chat, attribute_names=['participants'])
 
@@ -59,81 +77,145 @@ def read_user_chats(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     """Получает список чатов (ChatInfo) пользователя."""
-    chats = crud.get_user_chats(db=db, user_id=current_user.id, skip=skip, limit=limit)
-    # CRUD уже добавляет last_message и participants
-    return chats # Pydantic конвертирует список models.Chat в List[schemas.ChatInfo]
+    # Последнее сообщение - в том же запросе, участники - вторым; без ORM и Pydantic (см. lean.py)
+    return lean.json_response(lean.get_user_chats(db, user_id=current_user.id, skip=skip, limit=limit))
+
+# --- Поиск по сообщениям во всех чатах пользователя ---
+# Объявлен до /{chat_id}, чтобы путь /search не перехватывался
+@router.get("/search", response_model=List[schemas.Message])
+def search_messages_in_user_chats(
+    q: str = Query(..., min_length=1, max_length=200),
+    chat_id: Optional[int] = None, # Ограничить поиск одним чатом
+    before_id: Optional[int] = None, # Курсор: результаты старше этого сообщения
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    """Полнотекстовый поиск по сообщениям; ищет только в чатах, где состоит пользователь."""
+    return search.search_messages(
+        db, user_id=current_user.id, query=q, chat_id=chat_id, before_id=before_id, limit=limit
+    )
 
 # --- Получение конкретного чата (инфо + последние сообщения) ---
 @router.get("/{chat_id}", response_model=schemas.Chat) # Возвращаем полную схему Chat
 def read_chat(
     chat_id: int,
     limit_messages: int = 50, # Параметр для кол-ва загружаемых сообщений
+    before_id: Optional[int] = None, # Курсор: сообщения старше указанного
+    after_id: Optional[int] = None, # Курсор: сообщения новее указанного
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    db_chat = crud.get_chat(db, chat_id=chat_id)
-    if db_chat is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
     # Проверяем участие пользователя
-    if current_user not in db_chat.participants:
-         # Нужно проверить ID, т.к. объекты могут быть разными из-за сессий
-         participant_ids = {p.id for p in db_chat.participants}
-         if current_user.id not in participant_ids:
-             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    _ensure_chat_member(db, chat_id, current_user.id)
+    # Участники нужны для ответа (схема Chat), поэтому загружаем чат целиком
+    db_chat = crud.get_chat(db, chat_id=chat_id)
 
     # Загружаем сообщения для этого чата
-    messages = crud.get_messages_for_chat(db, chat_id=chat_id, limit=limit_messages)
+    messages = crud.get_messages_for_chat(
+        db, chat_id=chat_id, limit=limit_messages, before_id=before_id, after_id=after_id
+    )
     db_chat.messages = messages # Добавляем в объект для сериализации в схему Chat
 
-    # Убедимся что участники загружены (на всякий случай)
-    db.refresh(db_chat, attribute_names=['participants'])
-
     return db_chat # Pydantic конвертирует в schemas.Chat
 
 # --- Отправка сообщения ---
 @router.post("/{chat_id}/messages", response_model=schemas.Message, status_code=status.HTTP_201_CREATED)
-def create_message_in_chat(
+async def create_message_in_chat(
     chat_id: int,
     message_data: schemas.MessageBase, # Используем Base, т.к. chat_id из пути
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    db_chat = crud.get_chat(db, chat_id=chat_id) # Проверка существования чата
-    if db_chat is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
-
-    # Проверка участия пользователя
-    participant_ids = {p.id for p in db_chat.participants}
-    if current_user.id not in participant_ids:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not a member of this chat")
+    # Обработчик асинхронный (рассылка и ожидание пачки идут в event loop),
+    # поэтому синхронные обращения к БД выполняем в threadpool
+    # Проверка существования чата и участия пользователя
+    await run_in_threadpool(
+        _ensure_chat_member, db, chat_id, current_user.id, "You are not a member of this chat"
+    )
 
     message_create = schemas.MessageCreate(**message_data.dict(), chat_id=chat_id)
-    new_message = crud.create_message(db=db, message=message_create, author_id=current_user.id)
-    # CRUD уже загружает автора
-    return new_message # Pydantic конвертирует в schemas.Message
+    if message_writer.running:
+        # Отложенная запись пачками (MESSAGE_BATCHING=1): ждем, пока flusher присвоит ID.
+        # Соединение этого запроса на время ожидания возвращаем в пул
+        author = schemas.UserInfo.from_orm(current_user)
+        db.close()
+        message_id, timestamp = await message_writer.submit(message_create, current_user.id)
+        new_message = schemas.Message(
+            id=message_id,
+            timestamp=timestamp,
+            author=author,
+            **message_create.dict()
+        )
+    else:
+        # CRUD уже загружает автора
+        db_message = await run_in_threadpool(crud.create_message, db, message_create, current_user.id)
+        new_message = schemas.Message.from_orm(db_message)
+    # Рассылаем сообщение подключенным по WebSocket участникам
+    chat_hub.publish(chat_id, {
+        "type": "message",
+        "message": jsonable_encoder(new_message),
+    })
+    return new_message
 
 # --- Получение сообщений (с пагинацией) ---
 @router.get("/{chat_id}/messages", response_model=List[schemas.Message])
 def read_messages_in_chat(
+    request: Request,
+    response: Response,
     chat_id: int,
     skip: int = 0,
     limit: int = 50,
+    before_id: Optional[int] = None, # Курсор: страница истории старше этого сообщения
+    after_id: Optional[int] = None, # Курсор: только сообщения новее этого (синхронизация)
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    db_chat = crud.get_chat(db, chat_id=chat_id)
-    if db_chat is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
     # Проверка участия
-    participant_ids = {p.id for p in db_chat.participants}
-    if current_user.id not in participant_ids:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    _ensure_chat_member(db, chat_id, current_user.id)
 
-    messages = crud.get_messages_for_chat(db=db, chat_id=chat_id, skip=skip, limit=limit)
-    return messages # Pydantic конвертирует
+    # Новых сообщений нет - 304 без загрузки страницы (см. etags.py)
+    etag = etags.compute_etag(schemas.Message, crud.get_messages_version(
+        db, chat_id=chat_id, skip=skip, limit=limit, before_id=before_id, after_id=after_id
+    ))
+    cached = etags.not_modified(request, response, etag)
+    if cached:
+        return cached
+    # Только нужные столбцы и orjson, без ORM-объектов и Pydantic (см. lean.py)
+    messages = lean.get_messages(
+        db, chat_id=chat_id, skip=skip, limit=limit, before_id=before_id, after_id=after_id
+    )
+    return lean.json_response(messages, response)
+
+# --- Поиск по сообщениям одного чата ---
+@router.get("/{chat_id}/search", response_model=List[schemas.Message])
+def search_messages_in_chat(
+    chat_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    before_id: Optional[int] = None, # Курсор: результаты старше этого сообщения
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    _ensure_chat_member(db, chat_id, current_user.id)
+    return search.search_messages(
+        db, user_id=current_user.id, query=q, chat_id=chat_id, before_id=before_id, limit=limit
+    )
+
+# --- Отметка о прочтении ---
+@router.post("/{chat_id}/read", response_model=schemas.ChatReadState)
+def mark_chat_as_read(
+    chat_id: int,
+    message_id: Optional[int] = None, # До какого сообщения прочитано (по умолчанию - до последнего)
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    _ensure_chat_member(db, chat_id, current_user.id)
+
+    return crud.mark_chat_read(db, chat_id=chat_id, user_id=current_user.id, message_id=message_id)
 
 # --- Добавление участника в ГРУППОВОЙ чат ---
 @router.post("/{chat_id}/participants/{username_to_add}", response_model=schemas.ChatInfo)
@@ -141,33 +223,78 @@ def add_participant_to_chat(
     chat_id: int,
     username_to_add: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
+    # Добавлять участников может любой участник чата (пока без ролей)
+    _ensure_chat_member(db, chat_id, current_user.id, detail="You cannot add participants to this chat")
+
     user_to_add = crud.get_user_by_username(db, username=username_to_add)
     if not user_to_add:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User to add not found")
+    if membership.is_chat_member(db, chat_id=chat_id, user_id=user_to_add.id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is already in the chat")
 
     # Используем crud.add_user_to_chat, который проверяет, что чат не приватный
     updated_chat = crud.add_user_to_chat(db, chat_id=chat_id, user_id=user_to_add.id)
 
     if updated_chat is None:
-        # Это может случиться, если чат не найден, пользователь уже в чате, или чат приватный
-        # Проверим причину точнее
-        db_chat = crud.get_chat(db, chat_id)
-        if not db_chat:
-             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found")
-        if db_chat.is_private:
-             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot add participants to a private chat")
-        # Проверим права текущего пользователя (например, только админ чата может добавлять?)
-        # Пока разрешаем всем участникам
-        participant_ids = {p.id for p in db_chat.participants}
-        if current_user.id not in participant_ids:
-             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You cannot add participants to this chat")
-        if user_to_add.id in participant_ids:
-             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User is already in the chat")
-        # Другая ошибка
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Could not add user to chat")
-
-    # Добавим последнее сообщение для ChatInfo
-    updated_chat.last_message = crud.get_messages_for_chat(db, chat_id=chat_id, limit=1)[0] if updated_chat.messages else None
-    return updated_chat # Pydantic конвертирует в ChatInfo
\ No newline at end of file
+        # Чат существует и пользователь найден - значит, чат приватный
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot add participants to a private chat")
+
+    # Последнее сообщение ChatInfo берет по updated_chat.last_message_id
+    return updated_chat # Pydantic конвертирует в ChatInfo
+
+
+# --- Push-доставка сообщений по WebSocket ---
+def _authenticate_socket(token: str) -> Tuple[Optional[int], List[int]]:
+    """Проверяет токен и возвращает (user_id, ID чатов пользователя). Выполняется в threadpool."""
+    db = SessionLocal()
+    try:
+        user = auth.resolve_principal(token, db)
+        if user is None or not user.is_active:
+            return None, []
+        return user.id, crud.get_user_chat_ids(db, user_id=user.id)
+    finally:
+        db.close()
+
+def _check_socket_membership(chat_id: int, user_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        return membership.is_chat_member(db, chat_id=chat_id, user_id=user_id)
+    finally:
+        db.close()
+
+@ws_router.websocket("/ws")
+async def chat_updates_socket(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Push-доставка новых сообщений вместо опроса.
+    Аутентификация выполняется один раз при подключении, после чего сокет
+    подписан на все чаты пользователя. Клиент может прислать
+    {"type": "subscribe", "chat_id": N}, чтобы подписаться на чат, созданный позже.
+    """
+    token = token or websocket.cookies.get("access_token")
+    user_id, chat_ids = await run_in_threadpool(_authenticate_socket, token) if token else (None, [])
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    connection = ChatConnection(websocket, user_id)
+    chat_hub.subscribe(connection, chat_ids)
+    sender = asyncio.create_task(connection.sender())
+    try:
+        while True:
+            try:
+                data = await websocket.receive_json()
+            except ValueError:
+                continue # Некорректный JSON от клиента игнорируем
+            if isinstance(data, dict) and data.get("type") == "subscribe":
+                chat_id = data.get("chat_id")
+                # Подписываем только на чаты, где пользователь действительно участник
+                if isinstance(chat_id, int) and await run_in_threadpool(_check_socket_membership, chat_id, user_id):
+                    chat_hub.subscribe(connection, [chat_id])
+    except (WebSocketDisconnect, RuntimeError):
+        pass # Клиент отключился или сокет закрыт хабом из-за переполнения очереди
+    finally:
+        chat_hub.unsubscribe(connection)
+        sender.cancel()
@@ -1,7 +1,7 @@
 # app/routers/friends.py (НОВЫЙ ФАЙЛ)
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from .. import crud, schemas, models, auth
 from ..database import get_db
@@ -17,7 +17,7 @@ router = APIRouter(
 def follow_user(
     username_to_follow: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     user_to_follow = crud.get_user_by_username(db, username=username_to_follow)
     if not user_to_follow:
@@ -36,7 +36,7 @@ def follow_user(
 def unfollow_user(
     username_to_unfollow: str,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     user_to_unfollow = crud.get_user_by_username(db, username=username_to_unfollow)
     if not user_to_unfollow:
@@ -48,20 +48,53 @@ def unfollow_user(
         pass # Идемпотентность, возвращаем 204
     return # Возвращаем 204 No Content
 
+# --- Списки подписок и подписчиков (постранично) ---
+# Курсор - ID последнего пользователя предыдущей страницы (before_id), порядок - от больших ID к меньшим.
+# Общее число - в followers_count / following_count профиля (/api/users/me, /api/users/{username})
+
+def _get_user_or_404(db: Session, username: str) -> models.User:
+    db_user = crud.get_user_by_username(db, username=username)
+    if db_user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return db_user
+
 # --- Получить список тех, на кого подписан текущий пользователь ---
 @router.get("/following", response_model=List[schemas.UserInfo])
 def get_my_following(
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    following_list = crud.get_following(db, user=current_user)
-    return following_list # Pydantic конвертирует список models.User в List[schemas.UserInfo]
+    return crud.get_following(db, user_id=current_user.id, before_id=before_id, limit=limit)
 
 # --- Получить список подписчиков текущего пользователя ---
 @router.get("/followers", response_model=List[schemas.UserInfo])
 def get_my_followers(
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+):
+    return crud.get_followers(db, user_id=current_user.id, before_id=before_id, limit=limit)
+
+# --- Подписки и подписчики любого пользователя ---
+@router.get("/{username}/following", response_model=List[schemas.UserInfo])
+def get_user_following(
+    username: str,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    db_user = _get_user_or_404(db, username)
+    return crud.get_following(db, user_id=db_user.id, before_id=before_id, limit=limit)
+
+@router.get("/{username}/followers", response_model=List[schemas.UserInfo])
+def get_user_followers(
+    username: str,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db)
 ):
-    followers_list = crud.get_followers(db, user=current_user)
-    return followers_list # Pydantic конвертирует
\ No newline at end of file
+    db_user = _get_user_or_404(db, username)
+    return crud.get_followers(db, user_id=db_user.id, before_id=before_id, limit=limit)
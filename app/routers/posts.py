@@ -1,13 +1,12 @@
 # app/routers/posts.py (НОВЫЙ ФАЙЛ)
-from datetime import datetime
-import shutil
-from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from .. import crud, schemas, models, auth
-from ..database import get_db
+from .. import crud, crud_async, etags, lean, schemas, models, auth, uploads
+from ..image_variants import image_variant_pool
+from ..database import get_db, get_async_db
 
 router = APIRouter(
     prefix="/posts",
@@ -15,10 +14,6 @@ router = APIRouter(
     # Некоторые эндпоинты могут быть публичными (чтение), другие требуют авторизации
 )
 
-# --- Папка для загрузки изображений постов ---
-UPLOAD_POST_DIR = Path("static/uploads/posts")
-UPLOAD_POST_DIR.mkdir(parents=True, exist_ok=True)
-
 # --- Создать пост ---
 # Используем Form для текста и File для изображения
 @router.post("/", response_model=schemas.Post, status_code=status.HTTP_201_CREATED,
@@ -26,60 +21,73 @@ UPLOAD_POST_DIR.mkdir(parents=True, exist_ok=True)
 async def create_new_post(
     content: str = Form(...),
     image: Optional[UploadFile] = File(None), # Изображение опционально
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    db: AsyncSession = Depends(get_async_db), # Асинхронная сессия: event loop не блокируется
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     image_url: Optional[str] = None
     if image:
-        # Проверка типа файла
-        allowed_mime_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-        if image.content_type not in allowed_mime_types:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image type for post")
-
-        # Генерация имени и сохранение
-        file_extension = image.filename.split(".")[-1] if "." in image.filename else "jpg"
-        filename = f"post_{current_user.id}_{int(datetime.utcnow().timestamp())}.{file_extension}"
-        file_path = UPLOAD_POST_DIR / filename
-        image_url = f"/static/uploads/posts/{filename}"
-
+        # Проверка типа и размера, сохранение по хешу содержимого (см. uploads.py)
         try:
-            with file_path.open("wb") as buffer:
-                shutil.copyfileobj(image.file, buffer)
-        except Exception as e:
+            image_url = await uploads.save_upload(image, uploads.POST_IMAGES)
+        except uploads.UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except OSError as e:
             print(f"Error saving post image: {e}")
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not save post image")
         finally:
-            if image.file:
-                 image.file.close()
+            await image.close()
 
     post_create = schemas.PostCreate(content=content, image_url=image_url)
-    new_post = crud.create_post(db=db, post=post_create, author_id=current_user.id)
-    new_post.likes_count = 0 # Инициализация для ответа
-    return new_post
+    new_post = await crud_async.create_post(db=db, post=post_create, author_id=current_user.id)
+    # Уменьшенные копии картинки строятся в фоне (после commit: запись копий найдет пост)
+    image_variant_pool.schedule(image_url)
+    return new_post # Счетчики нового поста - 0 по умолчанию в БД
 
 # --- Получить ленту постов (все посты) ---
-@router.get("/", response_model=List[schemas.Post])
+@router.get("/", response_model=List[schemas.PostSummary])
 def read_posts_feed(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 20,
-    db: Session = Depends(get_db)
-    # Можно добавить зависимость от current_user, если лента должна быть персонализированной
+    db: Session = Depends(get_db),
+    current_user: Optional[auth.Principal] = Depends(auth.get_current_user_optional) # Для флага liked_by_me
+):
+    user_id = current_user.id if current_user else None
+    # Лента не изменилась с прошлого опроса - 304 без загрузки постов (см. etags.py)
+    etag = etags.compute_etag(schemas.PostSummary, crud.get_posts_version(db, skip=skip, limit=limit, user_id=user_id))
+    cached = etags.not_modified(request, response, etag)
+    if cached:
+        return cached
+    # Счетчики хранятся в строке поста, флаг лайка - EXISTS в том же запросе;
+    # только нужные столбцы и orjson, без ORM-объектов и Pydantic (см. lean.py)
+    return lean.json_response(lean.get_posts(db, skip=skip, limit=limit, user_id=user_id), response)
+
+# --- Домашняя лента (посты тех, на кого подписан пользователь) ---
+# Объявлен до /{post_id}, иначе "timeline" попадет в post_id
+@router.get("/timeline", response_model=List[schemas.PostSummary])
+def read_home_timeline(
+    before_id: Optional[int] = Query(None, description="ID последнего поста предыдущей страницы"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    posts = crud.get_posts(db=db, skip=skip, limit=limit)
-    # CRUD уже добавляет likes_count
-    return posts
+    return lean.json_response(
+        lean.get_timeline(db, user_id=current_user.id, before_id=before_id, limit=limit)
+    )
 
 # --- Получить конкретный пост ---
 @router.get("/{post_id}", response_model=schemas.Post)
 def read_post_details(
     post_id: int,
-    db: Session = Depends(get_db)
-    # current_user: Optional[models.User] = Depends(auth.get_current_user) # Если нужно знать, лайкнул ли текущий юзер
+    db: Session = Depends(get_db),
+    current_user: Optional[auth.Principal] = Depends(auth.get_current_user_optional) # Для флага liked_by_me
 ):
-    db_post = crud.get_post(db, post_id=post_id) # CRUD загружает автора, лайки, комменты
+    db_post = crud.get_post(
+        db, post_id=post_id, current_user_id=current_user.id if current_user else None
+    ) # CRUD загружает автора, лайки, комменты
     if db_post is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
-    # CRUD уже добавляет likes_count
     return db_post
 
 # --- Удалить пост ---
@@ -87,15 +95,15 @@ def read_post_details(
 def delete_own_post(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
+    author_id = crud.get_post_author_id(db, post_id=post_id) # Только автор: сам пост не загружаем
+    if author_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
-    if db_post.author_id != current_user.id and not current_user.is_admin:
+    if author_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to delete this post")
 
-    crud.delete_post(db=db, post=db_post)
+    crud.delete_post(db=db, post_id=post_id)
     return
 
 # --- Лайкнуть пост ---
@@ -104,13 +112,12 @@ def delete_own_post(
 def like_a_post(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    db_post = crud.get_post(db, post_id=post_id) # Нужен только ID, но get_post удобен для проверки существования
-    if db_post is None:
+    if not crud.post_exists(db, post_id=post_id): # Только EXISTS, сам пост не загружаем
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
 
-    success = crud.like_post(db=db, user=current_user, post=db_post)
+    success = crud.like_post(db=db, user_id=current_user.id, post_id=post_id)
     # if not success: # Уже лайкнул - игнорируем
     #     pass
     return
@@ -121,15 +128,11 @@ def like_a_post(
 def unlike_a_post(
     post_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
-        # Важно: если поста нет, не давать ошибку 404, а просто вернуть 204 (идемпотентность)
-        return
-        # raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
-
-    success = crud.unlike_post(db=db, user=current_user, post=db_post)
+    # Важно: если поста нет, не давать ошибку 404, а просто вернуть 204 (идемпотентность).
+    # DELETE по несуществующему посту ничего не удалит, поэтому отдельная проверка не нужна
+    success = crud.unlike_post(db=db, user_id=current_user.id, post_id=post_id)
     # if not success: # Лайка не было - игнорируем
     #     pass
     return
@@ -141,11 +144,9 @@ def create_new_comment(
     post_id: int,
     comment_data: schemas.CommentCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
-    # Проверяем существование поста
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
+    if not crud.post_exists(db, post_id=post_id): # Только EXISTS, сам пост не загружаем
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
 
     new_comment = crud.create_comment(db=db, comment=comment_data, post_id=post_id, author_id=current_user.id)
@@ -154,16 +155,23 @@ def create_new_comment(
 # --- Получить комментарии поста ---
 @router.get("/{post_id}/comments", response_model=List[schemas.Comment])
 def read_post_comments(
+    request: Request,
+    response: Response,
     post_id: int,
     skip: int = 0,
     limit: int = 50,
     db: Session = Depends(get_db)
 ):
-    # Проверяем существование поста
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
+    # Проверяем существование поста (только EXISTS, сам пост не загружаем)
+    if not crud.post_exists(db, post_id=post_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
 
+    etag = etags.compute_etag(
+        schemas.Comment, crud.get_post_comments_version(db, post_id=post_id, skip=skip, limit=limit)
+    )
+    cached = etags.not_modified(request, response, etag)
+    if cached:
+        return cached
     comments = crud.get_post_comments(db=db, post_id=post_id, skip=skip, limit=limit)
     return comments
 
@@ -172,7 +180,7 @@ def read_post_comments(
 def delete_own_comment(
     comment_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
 ):
     db_comment = crud.get_comment(db, comment_id=comment_id)
     if db_comment is None:
@@ -10,6 +10,7 @@ class UserInfo(BaseModel):
     username: str
     nickname: Optional[str] = None
     avatar_url: Optional[str] = None
+    avatar_thumb_url: Optional[str] = None # Миниатюра для списков (None, пока не готова)
 
     class Config:
         from_attributes = True # Pydantic V2+
@@ -43,16 +44,27 @@ class PostCreate(PostBase):
     """Схема для создания поста (author_id берется из токена)."""
     pass
 
-class Post(PostBase):
-    """Схема для отображения поста."""
+class PostSummary(PostBase):
+    """Облегченная схема поста для лент: только счетчики, без списков лайкнувших и комментариев."""
     id: int
     author: UserInfo # Используем простую схему автора
     timestamp: datetime
+    likes_count: int = 0
+    comments_count: int = 0
+    # Уменьшенные копии image_url (None, пока не готовы - тогда показывается оригинал)
+    image_thumb_url: Optional[str] = None
+    image_preview_url: Optional[str] = None
+    # Лайкнул ли пост текущий пользователь (устанавливается в crud.set_liked_by_me)
+    liked_by_me: bool = False
+
+    class Config:
+        from_attributes = True # Pydantic V2+
+
+class Post(PostSummary):
+    """Схема для отображения поста."""
     # Включаем список лайкнувших (простая инфа) и комментарии
     liked_by_users: List[UserInfo] = Field(default_factory=list)
     comments: List[Comment] = Field(default_factory=list)
-    # Добавим поле для количества лайков (рассчитывается в CRUD или роутере)
-    likes_count: int = 0
 
     class Config:
         from_attributes = True # Pydantic V2+
@@ -82,10 +94,9 @@ class User(UserBase):
     is_active: bool
     is_admin: bool
     created_at: datetime
-    # Не включаем все посты/чаты/сообщения/лайки по умолчанию
-    # Добавим счетчики и списки друзей/подписчиков (рассчитываются в роутере)
-    following: List[UserInfo] = Field(default_factory=list) # На кого подписан
-    followers: List[UserInfo] = Field(default_factory=list) # Кто подписан
+    avatar_thumb_url: Optional[str] = None
+    # Не включаем посты/чаты/сообщения/лайки и списки подписок - только счетчики
+    # (рассчитываются в роутере; сами списки - постранично в /api/friends)
     posts_count: int = 0
     followers_count: int = 0
     following_count: int = 0
@@ -100,7 +111,7 @@ class UserPublicProfile(BaseModel):
     nickname: Optional[str] = None
     avatar_url: Optional[str] = None
     created_at: datetime
-    posts: List[Post] = Field(default_factory=list) # Посты пользователя для его страницы
+    posts: List[PostSummary] = Field(default_factory=list) # Посты пользователя для его страницы
     posts_count: int = 0
     followers_count: int = 0
     following_count: int = 0
@@ -146,14 +157,26 @@ class ChatInfo(BaseModel):
     id: int
     name: Optional[str] = None
     is_private: bool
-    # Последнее сообщение для превью (устанавливается в CRUD/роутере)
+    # Последнее сообщение для превью (денормализованный Chat.last_message_id)
     last_message: Optional[Message] = None
+    last_activity_at: Optional[datetime] = None
+    # Непрочитанные сообщения текущего пользователя (устанавливается в CRUD)
+    unread_count: int = 0
     # Участники для отображения в списке (простая инфа)
     participants: List[UserInfo] = Field(default_factory=list)
 
     class Config:
         from_attributes = True # Pydantic V2+
 
+class ChatReadState(BaseModel):
+    """Курсор прочтения чата (POST /api/chats/{chat_id}/read)."""
+    chat_id: int
+    last_read_message_id: Optional[int] = None
+    unread_count: int = 0
+
+    class Config:
+        from_attributes = True # Pydantic V2+
+
 class Chat(ChatBase):
     """Полная информация о чате (GET /api/chats/{chat_id})."""
     id: int
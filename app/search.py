@@ -0,0 +1,191 @@
+# app/search.py
+"""
+Полнотекстовый поиск по сообщениям.
+
+SQLite: виртуальная таблица FTS5 с внешним содержимым (messages_fts -> messages),
+пополняется из crud.create_message; удаление и изменение сообщений (в том числе
+каскадом вместе с чатом) снимают старый текст с индекса триггерами.
+PostgreSQL: GIN-индекс по выражению to_tsvector(...) над messages.content,
+поддерживается самой БД.
+Если ни то, ни другое недоступно (например, SQLite без FTS5), используется LIKE.
+"""
+import os
+import re
+from typing import List, Optional
+
+from sqlalchemy import Connection, column, func, literal_column, table, text
+from sqlalchemy.orm import Session, joinedload
+
+from . import models
+
+FTS_TABLE = "messages_fts"
+PG_INDEX_NAME = "ix_messages_content_tsv"
+# Конфигурация текстового поиска PostgreSQL ('simple' не зависит от языка)
+PG_TS_CONFIG = re.sub(r"[^a-z_]", "", os.getenv("SEARCH_TS_CONFIG", "simple").lower()) or "simple"
+
+BACKEND_FTS5 = "fts5"
+BACKEND_POSTGRES = "postgresql"
+BACKEND_LIKE = "like"
+
+_backend: Optional[str] = None # Определяется при первом обращении (_get_backend)
+
+# Легковесное описание виртуальной таблицы для JOIN (в метаданные моделей не входит)
+_fts_table = table(FTS_TABLE, column("rowid"))
+
+# Триггеры FTS5: без них в индексе остается текст удаленных сообщений, а новое
+# сообщение, получившее освободившийся rowid, находится по чужим словам
+_FTS_TRIGGERS = {
+    f"{FTS_TABLE}_ad": (
+        "AFTER DELETE ON messages BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+        "END"
+    ),
+    f"{FTS_TABLE}_au": (
+        "AFTER UPDATE OF content ON messages BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.id, old.content); "
+        f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.id, new.content); "
+        "END"
+    ),
+}
+
+
+def create_fts_triggers(conn: Connection) -> None:
+    for name, body in _FTS_TRIGGERS.items():
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+
+def drop_fts_triggers(conn: Connection) -> None:
+    for name in _FTS_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def create_search_index(conn: Connection) -> None:
+    """
+    Создает поисковый индекс в текущей транзакции и индексирует уже имеющиеся
+    сообщения (вызывается из миграции 0001a).
+    """
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "content, content='messages', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            ))
+        except Exception as e: # SQLite собран без FTS5 - поиск будет работать через LIKE
+            print(f"FTS5 is not available, falling back to LIKE search: {e}")
+            return
+        create_fts_triggers(conn)
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif dialect == "postgresql":
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} ON messages "
+            f"USING GIN (to_tsvector('{PG_TS_CONFIG}'::regconfig, content))"
+        ))
+
+
+def drop_search_index(conn: Connection) -> None:
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        drop_fts_triggers(conn) # Триггеры ссылаются на таблицу: без нее DELETE из messages падал бы
+        conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    elif dialect == "postgresql":
+        conn.execute(text(f"DROP INDEX IF EXISTS {PG_INDEX_NAME}"))
+
+
+def _detect_backend(conn: Connection) -> str:
+    """Бэкенд по тому, что создали миграции (без DDL во время работы)."""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        fts_exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        return BACKEND_FTS5 if fts_exists else BACKEND_LIKE
+    if dialect == "postgresql":
+        return BACKEND_POSTGRES
+    return BACKEND_LIKE
+
+
+def _get_backend(db: Session) -> str:
+    global _backend
+    if _backend is None:
+        _backend = _detect_backend(db.connection())
+    return _backend
+
+
+def index_message(db: Session, message: models.Message) -> None:
+    """Добавляет сообщение в индекс в текущей транзакции (нужно только для FTS5)."""
+    if _get_backend(db) == BACKEND_FTS5:
+        db.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (:id, :content)"),
+            {"id": message.id, "content": message.content}
+        )
+
+
+def rebuild_index(db: Session) -> int:
+    """Перестраивает индекс по всей истории сообщений. Возвращает число сообщений."""
+    if _get_backend(db) == BACKEND_FTS5:
+        create_fts_triggers(db.connection()) # Для индексов, созданных до появления триггеров
+        db.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    elif _backend == BACKEND_POSTGRES:
+        db.execute(text(f"REINDEX INDEX {PG_INDEX_NAME}"))
+    db.commit()
+    return db.query(models.Message).count()
+
+
+def _fts5_query(query: str) -> Optional[str]:
+    """
+    Превращает пользовательскую строку в безопасный запрос FTS5:
+    каждое слово в кавычках (без операторов FTS), последнее - как префикс.
+    """
+    terms = [term.replace('"', '""') for term in query.split()]
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search_messages(
+    db: Session,
+    user_id: int,
+    query: str,
+    chat_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 20,
+) -> List[models.Message]:
+    """
+    Ищет сообщения в чатах, где состоит пользователь (или в одном чате chat_id).
+    Результаты от новых к старым; before_id - курсор следующей страницы.
+    """
+    association = models.user_chat_association
+    db_query = db.query(models.Message).options(
+        joinedload(models.Message.author)
+    ).join(
+        association,
+        (association.c.chat_id == models.Message.chat_id) & (association.c.user_id == user_id)
+    )
+
+    backend = _get_backend(db)
+    if backend == BACKEND_FTS5:
+        match = _fts5_query(query)
+        if match is None:
+            return []
+        db_query = db_query.join(
+            _fts_table, _fts_table.c.rowid == models.Message.id
+        ).filter(literal_column(FTS_TABLE).op("MATCH")(match))
+    elif backend == BACKEND_POSTGRES:
+        # Выражение должно совпадать с выражением GIN-индекса
+        ts_config = literal_column(f"'{PG_TS_CONFIG}'::regconfig")
+        document = func.to_tsvector(ts_config, models.Message.content)
+        db_query = db_query.filter(document.op("@@")(func.plainto_tsquery(ts_config, query)))
+    else:
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        db_query = db_query.filter(models.Message.content.ilike(f"%{escaped}%", escape="\\"))
+
+    if chat_id is not None:
+        db_query = db_query.filter(models.Message.chat_id == chat_id)
+    if before_id is not None:
+        db_query = db_query.filter(models.Message.id < before_id)
+
+    return db_query.order_by(models.Message.id.desc()).limit(limit).all()
@@ -0,0 +1,166 @@
+# app/static_assets.py
+"""
+Раздача статики с долгим кешированием.
+
+Скрипты и стили (ASSET_DIRECTORIES) при запуске копируются в static/dist под
+именами с хешем содержимого (js/feed.js -> dist/js/feed.<хеш>.js) вместе с
+заранее сжатыми .gz и .br (если установлен brotli); сборки прежних версий
+удаляются. Шаблоны получают адреса через asset_url(request, 'js/feed.js'):
+при изменении файла меняется и URL, поэтому такие файлы отдаются с
+Cache-Control: immutable и браузер их не перепроверяет.
+
+Загрузки (uploads.py) тоже не меняются по имени - для них долгий max-age и
+ETag; остальная статика (картинки интерфейса) перепроверяется по ETag.
+Для разработки без перезапуска: STATIC_ASSETS_FINGERPRINT=0.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, Set
+
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError: # Необязательная зависимость: без нее только .gz
+    brotli = None
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+ASSET_DIRECTORIES = ("js", "css")
+ASSET_BUILD_DIR = "dist"
+ASSET_HASH_LENGTH = 12
+STATIC_ASSETS_FINGERPRINT = os.getenv("STATIC_ASSETS_FINGERPRINT", "1").lower() in ("1", "true", "yes")
+STATIC_IMMUTABLE_MAX_AGE = int(os.getenv("STATIC_IMMUTABLE_MAX_AGE", 365 * 24 * 3600))
+
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache" # Кешировать можно, но перед использованием - проверить ETag
+# Кодировка -> расширение заранее сжатого файла, в порядке предпочтения
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Каталоги static, файлы которых не меняются по имени
+IMMUTABLE_DIRECTORIES = (ASSET_BUILD_DIR, "uploads")
+
+# Логический путь (js/feed.js) -> путь собранного файла (dist/js/feed.<хеш>.js)
+_manifest: Dict[str, str] = {}
+
+
+def _write_atomic(target: Path, content: bytes) -> None:
+    fd, temp_path = tempfile.mkstemp(prefix=".asset-", dir=target.parent)
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+def _compressed_versions(content: bytes) -> Iterable[tuple]:
+    yield ".gz", gzip.compress(content, compresslevel=9, mtime=0) # mtime=0: одинаковый результат при каждой сборке
+    if brotli is not None:
+        yield ".br", brotli.compress(content, quality=11)
+
+def _source_files(static_dir: Path) -> Iterable[Path]:
+    for directory in ASSET_DIRECTORIES:
+        root = static_dir / directory
+        if root.is_dir():
+            yield from sorted(path for path in root.rglob("*") if path.is_file() and not path.name.startswith("."))
+
+
+def build_assets(static_dir: Path = STATIC_DIR) -> Dict[str, str]:
+    """Собирает static/dist (уже собранные файлы пропускаются). Возвращает манифест."""
+    manifest = {}
+    for source in _source_files(static_dir):
+        content = source.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()[:ASSET_HASH_LENGTH]
+        logical = source.relative_to(static_dir)
+        built = Path(ASSET_BUILD_DIR) / logical.parent / f"{source.stem}.{digest}{source.suffix}"
+        target = static_dir / built
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # Сначала сжатые версии: собранный файл появляется последним и означает "готово"
+            for suffix, compressed in _compressed_versions(content):
+                _write_atomic(target.with_name(target.name + suffix), compressed)
+            _write_atomic(target, content)
+        manifest[logical.as_posix()] = built.as_posix()
+    _prune_build_dir(static_dir, manifest.values())
+    return manifest
+
+def _prune_build_dir(static_dir: Path, built_paths: Iterable[str]) -> None:
+    """Удаляет из static/dist файлы, которых нет в манифесте (сборки прежних версий)."""
+    keep = set()
+    for built in built_paths:
+        keep.add(built)
+        keep.update(built + suffix for _, suffix in PRECOMPRESSED_ENCODINGS)
+    build_dir = static_dir / ASSET_BUILD_DIR
+    if not build_dir.is_dir():
+        return
+    for path in build_dir.rglob("*"):
+        # Временные файлы (.asset-*) может прямо сейчас дописывать другой процесс
+        if path.is_file() and not path.name.startswith(".") and path.relative_to(static_dir).as_posix() not in keep:
+            path.unlink(missing_ok=True)
+
+def init_assets(static_dir: Path = STATIC_DIR) -> None:
+    """Вызывается при запуске приложения. Если собрать не удалось - отдаем исходные файлы."""
+    _manifest.clear()
+    if not STATIC_ASSETS_FINGERPRINT:
+        return
+    try:
+        _manifest.update(build_assets(static_dir))
+    except OSError as e:
+        print(f"Warning: could not build static assets, serving unversioned files: {e}")
+
+def asset_url(request: Request, path: str) -> str:
+    """
+    URL файла статики для шаблонов: версия с хешем, если она собрана.
+    Адрес строится по монтированию "static" (с учетом root_path), как request.url_for.
+    """
+    path = path.lstrip("/")
+    return str(request.url_for("static", path="/" + _manifest.get(path, path)))
+
+
+def _accepted_encodings(request_headers: Headers) -> Set[str]:
+    accepted = set()
+    for item in request_headers.get("accept-encoding", "").split(","):
+        encoding, _, params = item.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles с заголовками кеширования и отдачей заранее сжатых файлов из dist."""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        path = self.get_path(scope).replace(os.sep, "/")
+        top_directory = path.split("/", 1)[0]
+        headers = {}
+        media_type = None # По умолчанию - по расширению файла
+        if top_directory == ASSET_BUILD_DIR:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = _accepted_encodings(request_headers)
+            for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+                compressed_path = f"{full_path}{suffix}"
+                if encoding in accepted and os.path.isfile(compressed_path):
+                    # Тип - исходного файла, а не архива
+                    media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+                    headers["Content-Encoding"] = encoding
+                    full_path, stat_result = compressed_path, os.stat(compressed_path)
+                    break
+        headers["Cache-Control"] = (
+            IMMUTABLE_CACHE_CONTROL if top_directory in IMMUTABLE_DIRECTORIES else REVALIDATE_CACHE_CONTROL
+        )
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result, media_type=media_type, headers=headers
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
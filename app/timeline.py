@@ -0,0 +1,183 @@
+# app/timeline.py
+"""
+Домашняя лента: посты тех, на кого подписан пользователь (и его собственные).
+
+Fan-out-on-write: при создании поста его ID записывается в timeline_entries
+каждого подписчика автора одним INSERT ... SELECT по friendships.
+Авторы с числом подписчиков больше TIMELINE_FANOUT_MAX_FOLLOWERS не рассылаются -
+их посты (как и собственные посты читателя) подмешиваются при чтении (fan-out-on-read).
+Если автор снова опускается до порога, его последние посты переносятся в ленты подписчиков.
+Ленты ограничены TIMELINE_MAX_ENTRIES последними записями: лишнее удаляется в той же
+транзакции, что и запись в ленту; python -m app.manage trim-timelines - страховка
+(например, после уменьшения лимита). Чтение ленты ничего не пишет.
+Курсор страницы - ID поста (ID растут вместе со временем публикации).
+"""
+import os
+from typing import List, Optional
+
+from sqlalchemy import Delete, delete, func, insert, literal, select
+from sqlalchemy.orm import Session, aliased, joinedload
+
+from . import models
+
+TIMELINE_MAX_ENTRIES = int(os.getenv("TIMELINE_MAX_ENTRIES", 800))
+TIMELINE_FANOUT_MAX_FOLLOWERS = int(os.getenv("TIMELINE_FANOUT_MAX_FOLLOWERS", 10000))
+
+
+def uses_fanout(followers_count: int) -> bool:
+    """Рассылаются ли посты автора по лентам подписчиков при записи."""
+    return followers_count <= TIMELINE_FANOUT_MAX_FOLLOWERS
+
+def _followers_count(db: Session, user_id: int) -> int:
+    return db.execute(
+        select(models.User.followers_count).where(models.User.id == user_id)
+    ).scalar_one_or_none() or 0
+
+
+def _overflow(user_ids) -> Delete:
+    """DELETE записей лент user_ids старше TIMELINE_MAX_ENTRIES последних."""
+    newer = aliased(models.TimelineEntry)
+    # Самая старая из оставляемых записей ленты; если ее нет (NULL), лента в пределах лимита
+    oldest_kept = select(newer.post_id).where(
+        newer.user_id == models.TimelineEntry.user_id
+    ).order_by(newer.post_id.desc()).offset(TIMELINE_MAX_ENTRIES - 1).limit(1).scalar_subquery()
+    return delete(models.TimelineEntry).where(
+        models.TimelineEntry.user_id.in_(user_ids),
+        models.TimelineEntry.post_id < oldest_kept
+    )
+
+def _followers(author_id: int):
+    friendships = models.friendship_association
+    return select(friendships.c.follower_id).where(friendships.c.followed_id == author_id)
+
+
+def fan_out_post(db: Session, post: models.Post) -> None:
+    """Записывает пост в ленты подписчиков автора и обрезает их (в текущей транзакции, без commit)."""
+    if not uses_fanout(_followers_count(db, post.author_id)):
+        return
+    friendships = models.friendship_association
+    db.execute(insert(models.TimelineEntry).from_select(
+        ["user_id", "post_id", "author_id"],
+        select(friendships.c.follower_id, literal(post.id), literal(post.author_id))
+        .where(friendships.c.followed_id == post.author_id)
+    ))
+    # Каждая лента выросла на одну запись: лишнее удаляется сразу, а не ждет trim-timelines
+    db.execute(_overflow(_followers(post.author_id)))
+
+def _push_latest_posts(db: Session, author_id: int, followers) -> None:
+    # Последние посты автора заново записываются в ленты followers (подзапрос ID подписчиков)
+    latest_posts = select(models.Post.id).where(
+        models.Post.author_id == author_id
+    ).order_by(models.Post.id.desc()).limit(TIMELINE_MAX_ENTRIES).scalar_subquery()
+    db.execute(delete(models.TimelineEntry).where(
+        models.TimelineEntry.user_id.in_(followers),
+        models.TimelineEntry.author_id == author_id
+    ))
+    friendships = models.friendship_association
+    db.execute(insert(models.TimelineEntry).from_select(
+        ["user_id", "post_id", "author_id"],
+        select(friendships.c.follower_id, models.Post.id, models.Post.author_id)
+        .join(models.Post, models.Post.author_id == friendships.c.followed_id)
+        .where(friendships.c.follower_id.in_(followers), models.Post.id.in_(latest_posts))
+    ))
+    db.execute(_overflow(followers))
+
+def add_author(db: Session, user_id: int, author_id: int) -> None:
+    """После подписки переносит в ленту последние посты автора (без commit)."""
+    if not uses_fanout(_followers_count(db, author_id)):
+        return # Такие посты и так подмешиваются при чтении
+    _push_latest_posts(db, author_id, select(literal(user_id)))
+
+def resume_fanout(db: Session, author_id: int) -> None:
+    """
+    После отписки: если автор только что опустился до порога рассылки, его посты
+    перестают подмешиваться при чтении - последние переносятся в ленты всех подписчиков (без commit).
+    """
+    if _followers_count(db, author_id) != TIMELINE_FANOUT_MAX_FOLLOWERS:
+        return
+    _push_latest_posts(db, author_id, _followers(author_id))
+
+def remove_author(db: Session, user_id: int, author_id: int) -> None:
+    """После отписки убирает посты автора из ленты (без commit)."""
+    db.execute(delete(models.TimelineEntry).where(
+        models.TimelineEntry.user_id == user_id,
+        models.TimelineEntry.author_id == author_id
+    ))
+
+def remove_post(db: Session, post_id: int) -> None:
+    """Убирает пост из всех лент (без commit)."""
+    db.execute(delete(models.TimelineEntry).where(models.TimelineEntry.post_id == post_id))
+
+
+def trim_all(db: Session) -> int:
+    """
+    Обрезает все ленты длиннее TIMELINE_MAX_ENTRIES одним DELETE. Записи в ленту уже
+    обрезают ее сами, так что обычно удалять нечего. Возвращает число удаленных записей.
+    """
+    long_timelines = select(models.TimelineEntry.user_id).group_by(
+        models.TimelineEntry.user_id
+    ).having(func.count() > TIMELINE_MAX_ENTRIES)
+    removed = db.execute(_overflow(long_timelines)).rowcount
+    db.commit()
+    return removed
+
+
+def get_timeline_ids(db: Session, user_id: int, before_id: Optional[int] = None, limit: int = 20) -> List[int]:
+    """
+    ID постов страницы домашней ленты от новых к старым.
+    before_id - ID последнего поста предыдущей страницы.
+    """
+    # Разосланные при записи посты: один диапазон первичного ключа (user_id, post_id)
+    pushed = select(models.TimelineEntry.post_id).where(models.TimelineEntry.user_id == user_id)
+    # Посты крупных авторов и собственные посты читаются напрямую
+    friendships = models.friendship_association
+    pulled_authors = select(friendships.c.followed_id).join(
+        models.User, models.User.id == friendships.c.followed_id
+    ).where(
+        friendships.c.follower_id == user_id,
+        models.User.followers_count > TIMELINE_FANOUT_MAX_FOLLOWERS
+    )
+    pulled = select(models.Post.id).where(
+        (models.Post.author_id == user_id) | models.Post.author_id.in_(pulled_authors)
+    )
+    if before_id is not None:
+        pushed = pushed.where(models.TimelineEntry.post_id < before_id)
+        pulled = pulled.where(models.Post.id < before_id)
+
+    pushed_ids = db.execute(pushed.order_by(models.TimelineEntry.post_id.desc()).limit(limit)).scalars().all()
+    pulled_ids = db.execute(pulled.order_by(models.Post.id.desc()).limit(limit)).scalars().all()
+    return sorted(set(pushed_ids) | set(pulled_ids), reverse=True)[:limit]
+
+
+def get_timeline(db: Session, user_id: int, before_id: Optional[int] = None, limit: int = 20) -> List[models.Post]:
+    """Страница домашней ленты от новых постов к старым (см. get_timeline_ids)."""
+    post_ids = get_timeline_ids(db, user_id, before_id=before_id, limit=limit)
+    if not post_ids:
+        return []
+
+    return db.query(models.Post).options(
+        joinedload(models.Post.author),
+    ).filter(models.Post.id.in_(post_ids)).order_by(models.Post.id.desc()).all()
+
+
+def rebuild(db: Session) -> int:
+    """
+    Пересчитывает счетчики подписчиков и заново заполняет все ленты
+    (для данных, созданных до появления лент). Возвращает число записей.
+    """
+    friendships = models.friendship_association
+    followers_count = select(func.count()).select_from(friendships).where(
+        friendships.c.followed_id == models.User.id
+    ).scalar_subquery()
+    db.execute(models.User.__table__.update().values(followers_count=followers_count))
+    db.execute(delete(models.TimelineEntry))
+    db.execute(insert(models.TimelineEntry).from_select(
+        ["user_id", "post_id", "author_id"],
+        select(friendships.c.follower_id, models.Post.id, models.Post.author_id)
+        .join(models.Post, models.Post.author_id == friendships.c.followed_id)
+        .join(models.User, models.User.id == friendships.c.followed_id)
+        .where(models.User.followers_count <= TIMELINE_FANOUT_MAX_FOLLOWERS)
+    ))
+    db.commit()
+    trim_all(db)
+    return db.query(models.TimelineEntry).count()
@@ -0,0 +1,163 @@
+# app/uploads.py
+"""
+Хранилище загруженных изображений (аватары, картинки постов).
+
+Файл адресуется содержимым: имя - SHA-256 байтов, поэтому одинаковые картинки
+хранятся один раз, а URL файла никогда не меняет содержимое. Копирование из
+временного файла запроса идет блоками в threadpool (event loop не блокируется),
+с ограничением размера для каждого вида загрузки; запись - во временный файл
+рядом с целевым и атомарный os.replace.
+
+Уменьшенные копии (image_variants.py) лежат рядом с оригиналом. Файлы, на
+которые больше не ссылается ни один столбец из REFERENCE_COLUMNS (замененные
+аватары, удаленные посты и их копии), удаляет collect_garbage
+(python -m app.manage gc-uploads).
+"""
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from fastapi import UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+
+UPLOAD_ROOT = Path(__file__).resolve().parent.parent / "static" / "uploads"
+UPLOAD_URL_PREFIX = "/static/uploads"
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_AVATAR_MAX_BYTES = int(os.getenv("UPLOAD_AVATAR_MAX_BYTES", 2 * 1024 * 1024))
+UPLOAD_POST_IMAGE_MAX_BYTES = int(os.getenv("UPLOAD_POST_IMAGE_MAX_BYTES", 10 * 1024 * 1024))
+# Не удалять файлы моложе N секунд: ссылка на только что загруженный файл могла еще не попасть в БД
+UPLOAD_GC_GRACE_SECONDS = int(os.getenv("UPLOAD_GC_GRACE_SECONDS", 3600))
+
+_TEMP_PREFIX = ".upload-"
+
+
+@dataclass(frozen=True)
+class UploadKind:
+    directory: str # Подпапка UPLOAD_ROOT (она же часть URL)
+    max_bytes: int
+    extensions: Dict[str, str] # MIME-тип -> расширение файла
+
+
+AVATARS = UploadKind("avatars", UPLOAD_AVATAR_MAX_BYTES, {
+    "image/jpeg": "jpg", "image/png": "png", "image/gif": "gif",
+})
+POST_IMAGES = UploadKind("posts", UPLOAD_POST_IMAGE_MAX_BYTES, {
+    "image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp",
+})
+KINDS = (AVATARS, POST_IMAGES)
+
+# Столбцы с URL загруженных файлов (оригиналы и уменьшенные копии)
+REFERENCE_COLUMNS = (
+    models.User.avatar_url,
+    models.User.avatar_thumb_url,
+    models.Post.image_url,
+    models.Post.image_thumb_url,
+    models.Post.image_preview_url,
+)
+
+
+class UploadRejected(Exception):
+    """Загрузка отклонена; status_code и detail - для HTTPException в роутере."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _too_large(kind: UploadKind) -> UploadRejected:
+    return UploadRejected(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"File is too large (max {kind.max_bytes} bytes)"
+    )
+
+
+def _store(source: BinaryIO, kind: UploadKind, extension: str) -> str:
+    """Копирует файл блоками с подсчетом хеша и размера. Возвращает путь относительно UPLOAD_ROOT."""
+    directory = UPLOAD_ROOT / kind.directory
+    directory.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(prefix=_TEMP_PREFIX, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > kind.max_bytes:
+                    raise _too_large(kind)
+                digest.update(chunk)
+                temp_file.write(chunk)
+        name = digest.hexdigest()
+        # Два уровня каталогов по префиксу хеша: папки не разрастаются до миллионов файлов
+        relative = Path(kind.directory) / name[:2] / f"{name}.{extension}"
+        target = UPLOAD_ROOT / relative
+        if target.exists():
+            os.unlink(temp_path) # Такой файл уже есть
+            os.utime(target) # Снова используется: сборка мусора не тронет его в течение grace-периода
+        else:
+            target.parent.mkdir(exist_ok=True)
+            os.chmod(temp_path, 0o644) # mkstemp создает файл только для владельца
+            os.replace(temp_path, target)
+        return relative.as_posix()
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+async def save_upload(file: UploadFile, kind: UploadKind) -> str:
+    """Сохраняет загруженный файл, возвращает его URL. UploadRejected - неверный тип или размер."""
+    extension = kind.extensions.get(file.content_type)
+    if extension is None:
+        raise UploadRejected(status.HTTP_400_BAD_REQUEST, "Invalid image type")
+    if file.size is not None and file.size > kind.max_bytes: # Размер уже известен - отказываем сразу
+        raise _too_large(kind)
+    await file.seek(0)
+    relative = await run_in_threadpool(_store, file.file, kind, extension)
+    return f"{UPLOAD_URL_PREFIX}/{relative}"
+
+
+def url_for_path(path: Path) -> str:
+    return f"{UPLOAD_URL_PREFIX}/{path.relative_to(UPLOAD_ROOT).as_posix()}"
+
+def path_for_url(url: str) -> Optional[Path]:
+    """Путь к файлу загрузки по его URL; None - URL не из хранилища."""
+    if not url.startswith(UPLOAD_URL_PREFIX + "/"):
+        return None
+    path = (UPLOAD_ROOT / url[len(UPLOAD_URL_PREFIX) + 1:]).resolve()
+    return path if path.is_relative_to(UPLOAD_ROOT) else None
+
+
+# --- Сборка мусора ---
+def _referenced_urls(db: Session) -> set:
+    urls = set()
+    for column in REFERENCE_COLUMNS:
+        urls.update(db.scalars(select(column).where(column.isnot(None))))
+    return urls
+
+def _stored_files() -> Iterator[Path]:
+    for kind in KINDS:
+        directory = UPLOAD_ROOT / kind.directory
+        if directory.is_dir():
+            yield from (path for path in directory.rglob("*") if path.is_file())
+
+def collect_garbage(db: Session, grace_seconds: int = UPLOAD_GC_GRACE_SECONDS) -> int:
+    """Удаляет файлы загрузок, на которые не ссылается БД. Возвращает число удаленных файлов."""
+    referenced = _referenced_urls(db)
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for path in _stored_files():
+        url = url_for_path(path)
+        # Недописанные временные файлы прерванных загрузок тоже удаляются (после grace-периода)
+        if url in referenced or path.stat().st_mtime > cutoff:
+            continue
+        path.unlink(missing_ok=True)
+        removed += 1
+    return removed
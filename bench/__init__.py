@@ -0,0 +1,5 @@
+# bench/__init__.py
+"""
+Бенчмарк приложения: заполнение БД синтетическими данными (seed.py) и замер
+горячих эндпоинтов внутри процесса (runner.py). Запуск: python -m bench --help
+"""
@@ -0,0 +1,131 @@
+# bench/__main__.py
+"""
+Запуск: python -m bench [--scale small|medium|large] [--out results.json] [--compare old.json]
+
+Без --database-url создается временная SQLite-БД: миграции, заполнение, замеры.
+С --database-url и --skip-seed замеряется уже заполненная БД.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, fields
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Бенчмарк горячих эндпоинтов")
+    parser.add_argument("--database-url", help="БД для замеров (по умолчанию - временная SQLite)")
+    parser.add_argument("--skip-seed", action="store_true", help="Не заполнять БД (она уже заполнена)")
+    parser.add_argument("--seed-only", action="store_true", help="Только миграции и заполнение")
+    parser.add_argument("--scale", choices=("small", "medium", "large"), default="small")
+    # Переопределение отдельных параметров масштаба
+    for name in ("users", "chats", "messages", "posts", "avg_following", "seed"):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name)
+    parser.add_argument("--scenarios", default="chat_list,message_page,feed,profile,like,send",
+                        help="Сценарии через запятую")
+    parser.add_argument("--requests", type=int, default=500, help="Запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20, help="Запросов прогрева на сценарий (не учитываются)")
+    parser.add_argument("--out", help="Файл для результатов в JSON")
+    parser.add_argument("--compare", help="Результаты прошлого запуска (JSON) для сравнения")
+    return parser.parse_args(argv)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _print_results(results: dict, previous: dict) -> None:
+    print(f"{'scenario':<14}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        line = (f"{name:<14}{result['throughput_rps']:>9}{latency['p50']:>10}{latency['p99']:>10}"
+                f"{str(result['queries']['mean']):>9}{result['errors']:>8}")
+        old = previous.get(name)
+        if old:
+            line += (f"   p50 {latency['p50'] - old['latency_ms']['p50']:+.2f}"
+                     f"  p99 {latency['p99'] - old['latency_ms']['p99']:+.2f}"
+                     f"  rps {result['throughput_rps'] - old['throughput_rps']:+.1f}")
+        print(line)
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    # До импорта app: адрес БД и настройки читаются при импорте модулей
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQL_DEBUG_HEADERS"] = "1"
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    sys.path.insert(0, str(ROOT))
+
+    from alembic import command
+    from alembic.config import Config
+
+    from app.database import SessionLocal
+    from app.main import app # Первым: модули app импортируются в том же порядке, что и в сервере
+    from . import runner, seed
+
+    config = seed.SeedConfig.preset(args.scale)
+    for field in fields(config):
+        if getattr(args, field.name, None) is not None:
+            setattr(config, field.name, getattr(args, field.name))
+
+    report = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "database": database_url.split("://", 1)[0],
+        "seed_config": asdict(config),
+    }
+
+    if not args.skip_seed:
+        alembic_config = Config(str(ROOT / "alembic.ini"))
+        alembic_config.set_main_option("script_location", str(ROOT / "migrations"))
+        command.upgrade(alembic_config, "head")
+        db = SessionLocal()
+        try:
+            report["seed"] = seed.seed(db, config)
+        finally:
+            db.close()
+        print(f"Seeded {database_url}: {report['seed']}")
+    if args.seed_only:
+        return
+
+    db = SessionLocal()
+    try:
+        ctx = runner.load_context(db, seed=config.seed)
+    finally:
+        db.close()
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(runner.SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    report["run_config"] = {"requests": args.requests, "concurrency": args.concurrency, "warmup": args.warmup}
+    report["results"] = asyncio.run(
+        runner.run(app, ctx, scenarios, args.requests, args.concurrency, args.warmup)
+    )
+
+    previous = {}
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text()).get("results", {})
+    _print_results(report["results"], previous)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
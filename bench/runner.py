@@ -0,0 +1,179 @@
+# bench/runner.py
+"""
+Нагрузка на настоящее FastAPI-приложение внутри процесса (httpx + ASGITransport).
+
+Каждый сценарий - один горячий эндпоинт. Запросы идут от случайных пользователей
+выборки с concurrency параллельными воркерами; число SQL-запросов берется из
+заголовка X-DB-Query-Count (instrumentation.py, включается SQL_DEBUG_HEADERS).
+"""
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app import auth, models
+
+SAMPLE_USERS = 200 # Сколько пользователей выполняют запросы
+SAMPLE_POSTS = 1000
+
+
+@dataclass
+class BenchUser:
+    id: int
+    username: str
+    headers: Dict[str, str]
+    chat_ids: List[int]
+
+
+@dataclass
+class BenchContext:
+    users: List[BenchUser]
+    post_ids: List[int]
+    rng: random.Random
+
+    def user(self) -> BenchUser:
+        return self.rng.choice(self.users)
+
+
+def load_context(db: Session, seed: int = 42) -> BenchContext:
+    """Выборка пользователей, состоящих хотя бы в одном чате, и постов для лайков."""
+    association = models.user_chat_association
+    user_ids = db.scalars(
+        select(association.c.user_id).distinct().order_by(func.random()).limit(SAMPLE_USERS)
+    ).all()
+    if not user_ids:
+        raise RuntimeError("No chat members in the database: seed it first")
+    chats_by_user: Dict[int, List[int]] = {}
+    for user_id, chat_id in db.execute(
+        select(association.c.user_id, association.c.chat_id).where(association.c.user_id.in_(user_ids))
+    ):
+        chats_by_user.setdefault(user_id, []).append(chat_id)
+    usernames = dict(db.execute(select(models.User.id, models.User.username).where(models.User.id.in_(user_ids))).all())
+    users = [
+        BenchUser(
+            id=user_id,
+            username=usernames[user_id],
+            # Токены выпускаются напрямую: вход через bcrypt измеряется отдельно (passwords.py)
+            headers={"Authorization": "Bearer " + auth.create_access_token(data={"sub": usernames[user_id]})},
+            chat_ids=chats_by_user[user_id],
+        )
+        for user_id in user_ids
+    ]
+    post_ids = db.scalars(select(models.Post.id).order_by(func.random()).limit(SAMPLE_POSTS)).all()
+    return BenchContext(users=users, post_ids=list(post_ids), rng=random.Random(seed))
+
+
+# --- Сценарии: (метод, URL, тело JSON, заголовки) ---
+RequestSpec = Tuple[str, str, Optional[dict], Dict[str, str]]
+
+def chat_list(ctx: BenchContext) -> RequestSpec:
+    user = ctx.user()
+    return "GET", "/api/chats/", None, user.headers
+
+def message_page(ctx: BenchContext) -> RequestSpec:
+    user = ctx.user()
+    return "GET", f"/api/chats/{ctx.rng.choice(user.chat_ids)}/messages?limit=50", None, user.headers
+
+def feed(ctx: BenchContext) -> RequestSpec:
+    user = ctx.user()
+    return "GET", "/api/posts/timeline?limit=20", None, user.headers
+
+def profile(ctx: BenchContext) -> RequestSpec:
+    viewer, profile_user = ctx.user(), ctx.user()
+    return "GET", f"/api/users/{profile_user.username}", None, viewer.headers
+
+def like(ctx: BenchContext) -> RequestSpec:
+    user = ctx.user()
+    return "POST", f"/api/posts/{ctx.rng.choice(ctx.post_ids)}/like", None, user.headers
+
+def send(ctx: BenchContext) -> RequestSpec:
+    user = ctx.user()
+    chat_id = ctx.rng.choice(user.chat_ids)
+    return "POST", f"/api/chats/{chat_id}/messages", {"content": "bench message"}, user.headers
+
+
+SCENARIOS: Dict[str, Callable[[BenchContext], RequestSpec]] = {
+    "chat_list": chat_list,
+    "message_page": message_page,
+    "feed": feed,
+    "profile": profile,
+    "like": like,
+    "send": send,
+}
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Процентиль методом ближайшего ранга."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(percent / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    ctx: BenchContext,
+    make_request: Callable[[BenchContext], RequestSpec],
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+) -> dict:
+    for _ in range(warmup):
+        method, url, body, headers = make_request(ctx)
+        await client.request(method, url, json=body, headers=headers)
+
+    latencies: List[float] = []
+    query_counts: List[int] = []
+    statuses: Counter = Counter()
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining: # Общий итератор: воркеры разбирают запросы по одному
+            method, url, body, headers = make_request(ctx)
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+            if "x-db-query-count" in response.headers:
+                query_counts.append(int(response.headers["x-db-query-count"]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - started
+
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / wall_time, 1),
+        "latency_ms": {
+            "mean": round(sum(latencies_ms) / len(latencies_ms), 2),
+            "p50": round(_percentile(latencies_ms, 50), 2),
+            "p90": round(_percentile(latencies_ms, 90), 2),
+            "p95": round(_percentile(latencies_ms, 95), 2),
+            "p99": round(_percentile(latencies_ms, 99), 2),
+            "max": round(latencies_ms[-1], 2),
+        },
+        "queries": {
+            "mean": round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+            "max": max(query_counts, default=None),
+        },
+    }
+
+
+async def run(app, ctx: BenchContext, scenarios: List[str], requests: int, concurrency: int, warmup: int) -> Dict[str, dict]:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app): # Фоновые задачи приложения (пакетная запись сообщений)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in scenarios:
+                results[name] = await run_scenario(client, ctx, SCENARIOS[name], requests, concurrency, warmup)
+    return results
@@ -0,0 +1,202 @@
+# bench/seed.py
+"""
+Синтетические данные для бенчмарка: массовые INSERT (executemany по таблицам, без ORM).
+
+Распределения с тяжелым хвостом, как у живой соцсети:
+- число подписок пользователя и популярность авторов - степенной закон;
+- активность чатов (сколько в них сообщений) - по Ципфу;
+- лайки постов - распределение Парето.
+Денормализованные поля (last_message_id, курсоры прочтения, счетчики лайков)
+заполняются сразу; ленты и поисковый индекс строятся штатными timeline.rebuild
+и search.rebuild_index.
+"""
+import datetime
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List
+
+from sqlalchemy import Table, bindparam, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import models, search, timeline
+from app.passwords import pwd_context
+
+BENCH_PASSWORD = "benchpass" # Общий пароль всех сгенерированных пользователей
+INSERT_CHUNK = 10000
+
+WORDS = (
+    "привет как дела сегодня завтра встреча проект код релиз баг тест ревью кофе обед "
+    "hello world deploy server database cache query index latency release weekend"
+).split()
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    chats: int = 100
+    messages: int = 20000
+    posts: int = 2000
+    avg_following: int = 20 # Среднее число подписок
+    max_following: int = 1000
+    group_chat_share: float = 0.3 # Доля групповых чатов (остальные - личные)
+    max_group_size: int = 50
+    avg_likes: float = 5.0 # Среднее число лайков поста
+    popularity_exponent: float = 1.1 # Показатель степенного закона популярности
+    days: int = 30 # Период, на который растянуты сообщения и посты
+    seed: int = 42
+
+    @classmethod
+    def preset(cls, scale: str) -> "SeedConfig":
+        presets = {
+            "small": cls(),
+            "medium": cls(users=10000, chats=1000, messages=200000, posts=20000),
+            "large": cls(users=100000, chats=10000, messages=1000000, posts=100000),
+        }
+        return presets[scale]
+
+
+def _chunks(rows: Iterable[dict], size: int = INSERT_CHUNK) -> Iterator[List[dict]]:
+    iterator = iter(rows)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _bulk_insert(db: Session, table: Table, rows: Iterable[dict]) -> int:
+    inserted = 0
+    for chunk in _chunks(rows):
+        db.execute(insert(table), chunk)
+        inserted += len(chunk)
+    return inserted
+
+def _zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    """Накопленные веса рангов 1..n (для random.choices)."""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+def _heavy_tail(rng: random.Random, mean: float, upper: int, alpha: float = 2.0) -> int:
+    """Целое из распределения Парето со средним около mean, не больше upper."""
+    scale = mean * (alpha - 1) / alpha
+    return min(upper, int(scale * rng.paretovariate(alpha)))
+
+def _timestamps(rng: random.Random, count: int, days: int) -> List[datetime.datetime]:
+    """Возрастающие метки времени за последние days дней (ID растут вместе со временем)."""
+    end = datetime.datetime.now(datetime.timezone.utc)
+    start = end - datetime.timedelta(days=days)
+    span = (end - start).total_seconds()
+    return [start + datetime.timedelta(seconds=offset) for offset in sorted(rng.random() * span for _ in range(count))]
+
+def _text(rng: random.Random, min_words: int, max_words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(min_words, max_words)))
+
+
+def seed(db: Session, config: SeedConfig) -> Dict[str, float]:
+    """Заполняет пустую БД. Возвращает число строк по таблицам и время заполнения."""
+    if db.scalar(select(func.count(models.User.id))):
+        raise RuntimeError("Database is not empty: seed expects a freshly migrated database")
+    rng = random.Random(config.seed)
+    started = time.perf_counter()
+    counts: Dict[str, float] = {}
+    user_ids = range(1, config.users + 1)
+
+    # Пользователи: один bcrypt-хеш на всех (хеширование миллиона паролей бенчмарк не измеряет)
+    hashed_password = pwd_context.hash(BENCH_PASSWORD)
+    counts["users"] = _bulk_insert(db, models.User.__table__, (
+        {"id": user_id, "username": f"user{user_id}", "email": f"user{user_id}@bench.local",
+         "hashed_password": hashed_password, "nickname": f"User {user_id}", "is_admin": False, "is_active": True}
+        for user_id in user_ids
+    ))
+
+    # Подписки: популярность по степенному закону, ранги перемешаны между ID
+    popular_order = list(user_ids)
+    rng.shuffle(popular_order)
+    popularity = _zipf_cum_weights(config.users, config.popularity_exponent)
+
+    def follows():
+        for follower_id in user_ids:
+            want = _heavy_tail(rng, config.avg_following, min(config.max_following, config.users - 1))
+            followed = set(rng.choices(popular_order, cum_weights=popularity, k=want))
+            followed.discard(follower_id)
+            for followed_id in followed:
+                yield {"follower_id": follower_id, "followed_id": followed_id}
+    counts["friendships"] = _bulk_insert(db, models.friendship_association, follows())
+
+    # Чаты и участники
+    chat_members: Dict[int, List[int]] = {}
+    chat_rows, direct_pairs = [], set()
+    for chat_id in range(1, config.chats + 1):
+        if rng.random() < config.group_chat_share:
+            members = rng.sample(user_ids, min(config.users, rng.randint(3, config.max_group_size)))
+            chat_rows.append({"id": chat_id, "name": f"Group {chat_id}", "is_private": False})
+        else:
+            low, high = sorted(rng.sample(user_ids, 2))
+            while (low, high) in direct_pairs:
+                low, high = sorted(rng.sample(user_ids, 2))
+            direct_pairs.add((low, high))
+            members = [low, high]
+            chat_rows.append({
+                "id": chat_id, "name": None, "is_private": True,
+                "direct_user_low_id": low, "direct_user_high_id": high,
+            })
+        chat_members[chat_id] = members
+    for row in chat_rows:
+        row.setdefault("direct_user_low_id", None)
+        row.setdefault("direct_user_high_id", None)
+    counts["chats"] = _bulk_insert(db, models.Chat.__table__, chat_rows)
+    counts["chat_members"] = _bulk_insert(db, models.user_chat_association, (
+        {"user_id": user_id, "chat_id": chat_id} for chat_id, members in chat_members.items() for user_id in members
+    ))
+
+    # Сообщения: активность чатов по Ципфу
+    chat_order = list(chat_members)
+    rng.shuffle(chat_order)
+    chat_weights = _zipf_cum_weights(len(chat_order), 1.0)
+    last_message: Dict[int, tuple] = {}
+
+    def messages():
+        timestamps = _timestamps(rng, config.messages, config.days)
+        for message_id, timestamp in enumerate(timestamps, start=1):
+            chat_id = rng.choices(chat_order, cum_weights=chat_weights)[0]
+            last_message[chat_id] = (message_id, timestamp)
+            yield {
+                "id": message_id, "content": _text(rng, 2, 12), "timestamp": timestamp, "file_url": None,
+                "author_id": rng.choice(chat_members[chat_id]), "chat_id": chat_id,
+            }
+    counts["messages"] = _bulk_insert(db, models.Message.__table__, messages())
+
+    chats = models.Chat.__table__
+    for chunk in _chunks(
+        {"chat_pk": chat_id, "message_pk": message_id, "activity_at": timestamp}
+        for chat_id, (message_id, timestamp) in last_message.items()
+    ):
+        db.execute(chats.update().where(chats.c.id == bindparam("chat_pk")).values(
+            last_message_id=bindparam("message_pk"), last_activity_at=bindparam("activity_at")
+        ), chunk)
+    # Курсоры прочтения: все прочитано
+    counts["read_states"] = _bulk_insert(db, models.ChatReadState.__table__, (
+        {"user_id": user_id, "chat_id": chat_id,
+         "last_read_message_id": last_message.get(chat_id, (None,))[0], "unread_count": 0}
+        for chat_id, members in chat_members.items() for user_id in members
+    ))
+
+    # Посты (авторы равномерно: охват задают подписчики) и лайки с тяжелым хвостом
+    likes_per_post = [_heavy_tail(rng, config.avg_likes, config.users) for _ in range(config.posts)]
+    counts["posts"] = _bulk_insert(db, models.Post.__table__, (
+        {"id": post_id, "content": _text(rng, 5, 40), "image_url": None, "timestamp": timestamp,
+         "author_id": rng.choice(user_ids),
+         "likes_count": likes_per_post[post_id - 1], "comments_count": 0}
+        for post_id, timestamp in enumerate(_timestamps(rng, config.posts, config.days), start=1)
+    ))
+    counts["likes"] = _bulk_insert(db, models.post_likes_association, (
+        {"user_id": user_id, "post_id": post_id}
+        for post_id, likes in enumerate(likes_per_post, start=1)
+        for user_id in rng.sample(user_ids, likes)
+    ))
+    db.commit()
+
+    counts["timeline_entries"] = timeline.rebuild(db) # Счетчики подписчиков и ленты
+    search.rebuild_index(db)
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
@@ -0,0 +1,144 @@
+# bench/serialization.py
+"""
+Сравнение двух путей чтения горячих списков на страницах по 100 элементов:
+ORM-объекты + Pydantic (from_attributes) + json, как было в роутерах, и
+app/lean.py (выборка столбцов в DTO + orjson).
+
+Для каждого пути - процессорное время на элемент (запрос + сборка + JSON) и
+пиковая память одного ответа (tracemalloc).
+Запуск: python -m bench.serialization [--scale small] [--repeat 50]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGE_SIZE = 100
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.serialization", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--database-url", help="Уже заполненная БД (по умолчанию - временная SQLite с заполнением)")
+    parser.add_argument("--scale", choices=("small", "medium", "large"), default="small")
+    parser.add_argument("--repeat", type=int, default=50, help="Повторов на путь")
+    return parser.parse_args(argv)
+
+
+def _measure(session_factory, render: Callable, repeat: int) -> dict:
+    """render(db) -> (число элементов, байты ответа). Каждый повтор - в новой сессии (без кеша identity map)."""
+    render(session_factory()) # Прогрев: компиляция запросов, схемы Pydantic
+    cpu = 0.0
+    for _ in range(repeat):
+        db = session_factory()
+        started = time.process_time()
+        items, body = render(db)
+        cpu += time.process_time() - started
+        db.close()
+    db = session_factory()
+    tracemalloc.start()
+    render(db)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.close()
+    return {
+        "items": items,
+        "bytes": len(body),
+        "cpu_us_per_item": round(cpu / repeat / max(items, 1) * 1e6, 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def main(argv=None) -> None:
+    args = _parse_args(argv)
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = database_url # До импорта app
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    sys.path.insert(0, str(ROOT))
+
+    from alembic import command
+    from alembic.config import Config
+    from pydantic import TypeAdapter
+    from sqlalchemy import func, select
+    import orjson
+
+    from app.main import app # Первым: тот же порядок импорта, что и в сервере
+    from app import crud, lean, models, schemas
+    from app.database import SessionLocal
+    from . import seed
+
+    if not args.database_url:
+        alembic_config = Config(str(ROOT / "alembic.ini"))
+        alembic_config.set_main_option("script_location", str(ROOT / "migrations"))
+        command.upgrade(alembic_config, "head")
+        db = SessionLocal()
+        try:
+            seed.seed(db, seed.SeedConfig.preset(args.scale))
+        finally:
+            db.close()
+
+    db = SessionLocal()
+    members = models.user_chat_association
+    busiest_chat = db.execute(
+        select(models.Message.chat_id).group_by(models.Message.chat_id).order_by(func.count().desc()).limit(1)
+    ).scalar_one()
+    busiest_member = db.execute(
+        select(members.c.user_id).group_by(members.c.user_id).order_by(func.count().desc()).limit(1)
+    ).scalar_one()
+    busiest_author = db.execute(
+        select(models.Post.author_id).group_by(models.Post.author_id).order_by(func.count().desc()).limit(1)
+    ).scalar_one()
+    db.close()
+
+    def orm_case(load, schema):
+        adapter = TypeAdapter(List[schema])
+
+        def render(db):
+            # Как FastAPI с response_model: проверка from_attributes, dump в JSON-совместимые типы, json.dumps
+            objects = load(db)
+            content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+            return len(objects), json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+        return render
+
+    def lean_case(load):
+        def render(db):
+            items = load(db)
+            return len(items), orjson.dumps(items, option=orjson.OPT_UTC_Z)
+        return render
+
+    cases = {
+        "messages": (
+            orm_case(lambda db: crud.get_messages_for_chat(db, busiest_chat, limit=PAGE_SIZE), schemas.Message),
+            lean_case(lambda db: lean.get_messages(db, busiest_chat, limit=PAGE_SIZE)),
+        ),
+        "feed": (
+            orm_case(lambda db: crud.set_liked_by_me(db, crud.get_posts(db, limit=PAGE_SIZE), busiest_member),
+                     schemas.PostSummary),
+            lean_case(lambda db: lean.get_posts(db, limit=PAGE_SIZE, user_id=busiest_member)),
+        ),
+        "profile_posts": (
+            orm_case(lambda db: crud.set_liked_by_me(db, crud.get_user_posts(db, busiest_author, limit=PAGE_SIZE),
+                                                     busiest_member), schemas.PostSummary),
+            lean_case(lambda db: lean.get_user_posts(db, busiest_author, limit=PAGE_SIZE, user_id=busiest_member)),
+        ),
+        "chat_list": (
+            orm_case(lambda db: crud.get_user_chats(db, busiest_member, limit=PAGE_SIZE), schemas.ChatInfo),
+            lean_case(lambda db: lean.get_user_chats(db, busiest_member, limit=PAGE_SIZE)),
+        ),
+    }
+
+    print(f"{'case':<15}{'items':>6}{'orm us/item':>13}{'lean us/item':>14}{'orm peak KiB':>14}{'lean peak KiB':>15}")
+    for name, (orm_render, lean_render) in cases.items():
+        orm = _measure(SessionLocal, orm_render, args.repeat)
+        fast = _measure(SessionLocal, lean_render, args.repeat)
+        print(f"{name:<15}{fast['items']:>6}{orm['cpu_us_per_item']:>13}{fast['cpu_us_per_item']:>14}"
+              f"{orm['peak_kib']:>14}{fast['peak_kib']:>15}")
+
+
+if __name__ == "__main__":
+    main()
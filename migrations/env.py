@@ -0,0 +1,60 @@
+# migrations/env.py
+"""
+Окружение Alembic: адрес БД и метаданные моделей берутся из приложения.
+
+Применить миграции: alembic upgrade head
+Новая миграция:     alembic revision --autogenerate -m "описание"
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from app import models # noqa: F401 - регистрирует таблицы в Base.metadata
+from app.database import SQLALCHEMY_DATABASE_URL, Base, engine
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    # Виртуальная таблица FTS5 и ее служебные таблицы управляются вручную (см. search.py)
+    if type_ == "table" and name.startswith("messages_fts"):
+        return False
+    return True
+
+
+def run_migrations_offline() -> None:
+    """Генерирует SQL без подключения к БД (alembic upgrade head --sql)."""
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=SQLALCHEMY_DATABASE_URL.startswith("sqlite"),
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # Тот же движок, что у приложения (с PRAGMA для SQLite, см. database.py)
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite не умеет большинство ALTER TABLE - Alembic пересоздает таблицу
+            render_as_batch=connection.dialect.name == "sqlite",
+            include_object=include_object,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,106 @@
+"""Денормализованные столбцы, курсоры прочтения, домашние ленты и поиск по сообщениям
+
+Все, что появилось в моделях после исходной схемы (0001):
+- users.followers_count, posts.likes_count / comments_count - счетчики;
+- chats.last_message_id / last_activity_at - последнее сообщение чата;
+- chats.direct_user_low_id / direct_user_high_id - ключ пары личного чата;
+- таблицы chat_read_states и timeline_entries;
+- поисковый индекс сообщений (FTS5 в SQLite, GIN-индекс в PostgreSQL).
+
+Поисковый индекс заполняется здесь же. Остальные данные у БД, переведенной с
+create_all, заполняют команды python -m app.manage (см. README); на пустой БД
+они не нужны. Таблицы chat_read_states / timeline_entries могли уже создать
+промежуточные версии через create_all - такие не пересоздаются.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18 10:02:37.418265
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app import search
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001a'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('likes_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+
+    # В SQLite batch-режим пересоздает таблицу с новыми ограничениями, в остальных БД - ALTER TABLE
+    with op.batch_alter_table('chats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('direct_user_low_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('direct_user_high_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('last_message_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('last_activity_at', sa.DateTime(timezone=True), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_chats_direct_user_low_id', 'users', ['direct_user_low_id'], ['id'], ondelete='CASCADE'
+        )
+        batch_op.create_foreign_key(
+            'fk_chats_direct_user_high_id', 'users', ['direct_user_high_id'], ['id'], ondelete='CASCADE'
+        )
+        batch_op.create_foreign_key(
+            'fk_chats_last_message_id', 'messages', ['last_message_id'], ['id'], ondelete='SET NULL'
+        )
+        batch_op.create_unique_constraint('uq_chats_direct_pair', ['direct_user_low_id', 'direct_user_high_id'])
+        batch_op.create_index('ix_chats_last_activity_at', ['last_activity_at'], unique=False)
+
+    if 'chat_read_states' not in existing_tables:
+        op.create_table('chat_read_states',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('last_read_message_id', sa.Integer(), nullable=True),
+        sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['chat_id'], ['chats.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'chat_id')
+        )
+
+    if 'timeline_entries' not in existing_tables:
+        op.create_table('timeline_entries',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['author_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'post_id')
+        )
+
+    # Полнотекстовый поиск по сообщениям: создается и заполняется уже существующими сообщениями
+    search.create_search_index(op.get_bind())
+
+
+def downgrade() -> None:
+    search.drop_search_index(op.get_bind())
+    op.drop_table('timeline_entries')
+    op.drop_table('chat_read_states')
+    with op.batch_alter_table('chats', schema=None) as batch_op:
+        batch_op.drop_index('ix_chats_last_activity_at')
+        batch_op.drop_constraint('uq_chats_direct_pair', type_='unique')
+        batch_op.drop_constraint('fk_chats_last_message_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_chats_direct_user_high_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_chats_direct_user_low_id', type_='foreignkey')
+        batch_op.drop_column('last_activity_at')
+        batch_op.drop_column('last_message_id')
+        batch_op.drop_column('direct_user_high_id')
+        batch_op.drop_column('direct_user_low_id')
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('comments_count')
+        batch_op.drop_column('likes_count')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('followers_count')
@@ -0,0 +1,43 @@
+"""Составные индексы под основные запросы
+
+Каждый индекс обслуживает конкретный запрос (см. комментарии в models.py);
+python -m app.manage check-query-plans проверяет, что планировщик их использует.
+IF NOT EXISTS: часть индексов уже могла появиться в БД, созданной через create_all.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-17 13:40:02.114529
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя индекса, таблица, столбцы)
+QUERY_INDEXES = [
+    ('ix_messages_chat_id_timestamp_id', 'messages', ['chat_id', 'timestamp', 'id']),
+    ('ix_posts_author_id_timestamp', 'posts', ['author_id', 'timestamp']),
+    ('ix_posts_author_id_id', 'posts', ['author_id', 'id']),
+    ('ix_comments_post_id_timestamp', 'comments', ['post_id', 'timestamp']),
+    ('ix_friendships_followed_id', 'friendships', ['followed_id']),
+    ('ix_user_chat_association_chat_id', 'user_chat_association', ['chat_id']),
+    ('ix_chat_read_states_chat_id', 'chat_read_states', ['chat_id']),
+    ('ix_timeline_entries_post_id', 'timeline_entries', ['post_id']),
+]
+
+
+def upgrade() -> None:
+    for name, table_name, columns in QUERY_INDEXES:
+        op.create_index(name, table_name, columns, unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table_name, _ in reversed(QUERY_INDEXES):
+        op.drop_index(name, table_name=table_name, if_exists=True)
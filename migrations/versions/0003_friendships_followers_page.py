@@ -0,0 +1,30 @@
+"""Индекс friendships (followed_id, follower_id) для страниц подписчиков
+
+Индекс только по followed_id заставлял сортировать всех подписчиков ради одной
+страницы (crud.get_followers); составной индекс отдает страницу диапазоном
+и по-прежнему обслуживает рассылку ленты (timeline.fan_out_post).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 14:05:41.530217
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_friendships_followed_id_follower_id', 'friendships', ['followed_id', 'follower_id'], unique=False)
+    op.drop_index('ix_friendships_followed_id', table_name='friendships')
+
+
+def downgrade() -> None:
+    op.create_index('ix_friendships_followed_id', 'friendships', ['followed_id'], unique=False)
+    op.drop_index('ix_friendships_followed_id_follower_id', table_name='friendships')
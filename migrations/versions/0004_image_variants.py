@@ -0,0 +1,36 @@
+"""Столбцы для уменьшенных копий изображений (аватары, картинки постов)
+
+Заполняются фоново после загрузки (app/image_variants.py), для уже
+загруженных файлов - командой python -m app.manage build-image-variants.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 16:12:08.904113
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avatar_thumb_url', sa.String(), nullable=True))
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_thumb_url', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('image_preview_url', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('image_preview_url')
+        batch_op.drop_column('image_thumb_url')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('avatar_thumb_url')
@@ -0,0 +1,31 @@
+"""Триггеры FTS5: удаление и изменение сообщений снимают старый текст с индекса
+
+Индекс, созданный до появления триггеров, мог накопить записи удаленных
+сообщений, поэтому он заодно перестраивается. В PostgreSQL (GIN-индекс
+поддерживается самой БД) и в SQLite без FTS5 ничего не меняется.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 11:24:50.672391
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app import search
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    search.create_search_index(op.get_bind()) # Таблица уже есть: создает триггеры и перестраивает индекс
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        search.drop_fts_triggers(op.get_bind())
@@ -25,8 +25,21 @@ document.addEventListener('DOMContentLoaded', () => {
     let chatUpdateInterval = null;
     const UPDATE_INTERVAL_MS = 1000; // Интервал обновления - 1 секунда
     let latestMessageTimestamp = null; // ISO Временная метка последнего *полученного* сообщения
+    let latestMessageId = null; // ID последнего полученного сообщения - курсор after_id для синхронизации
     let isFetchingMessages = false; // Флаг для предотвращения параллельных запросов
 
+    // WebSocket для push-доставки (опрос остается запасным вариантом, пока сокет не подключен)
+    let chatSocket = null;
+    let socketReconnectTimer = null;
+    let socketClosedByPage = false; // true после ухода со страницы - не переподключаемся
+    let socketReconnectDelayMs = 1000; // Растет до SOCKET_MAX_RECONNECT_DELAY_MS при ошибках
+    const SOCKET_MAX_RECONNECT_DELAY_MS = 30000;
+
+    // Отметка о прочтении: не чаще одного запроса в MARK_READ_DELAY_MS
+    let markReadTimer = null;
+    let lastMarkedReadId = null;
+    const MARK_READ_DELAY_MS = 1000;
+
     // --- Утилита для экранирования HTML ---
     function escapeHTML(str) {
         if (str === null || str === undefined) return '';
@@ -66,7 +79,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
              updateChatHeader(chatData);
              renderMessages(chatData.messages || [], true);
+             scheduleMarkRead();
              startChatUpdates();
+             connectChatSocket();
              console.log("Initial chat data loaded, updates started.");
 
         } catch (error) {
@@ -143,7 +158,7 @@ document.addEventListener('DOMContentLoaded', () => {
         messageDiv.classList.add('message', isSent ? 'sent' : 'received'); // Применяем классы .sent или .received
 
         const authorName = escapeHTML(msg.author.nickname || msg.author.username);
-        const avatarUrl = msg.author.avatar_url || '/static/img/default_avatar.png'; // Используем дефолтный аватар, если нет своего
+        const avatarUrl = msg.author.avatar_thumb_url || msg.author.avatar_url || '/static/img/default_avatar.png'; // Используем дефолтный аватар, если нет своего
 
         let formattedTimestamp = 'invalid date';
         try {
@@ -185,6 +200,9 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!latestMessageTimestamp || new Date(msg.timestamp) > new Date(latestMessageTimestamp)) {
              latestMessageTimestamp = msg.timestamp;
         }
+        if (!latestMessageId || msg.id > latestMessageId) {
+             latestMessageId = msg.id;
+        }
 
         // Прокручиваем вниз, если пользователь был внизу
         if (shouldScroll) {
@@ -317,21 +335,18 @@ document.addEventListener('DOMContentLoaded', () => {
         }
         isFetchingMessages = true;
         try {
-             // Запрашиваем только новые сообщения, используя latestMessageTimestamp
-             // const endpoint = latestMessageTimestamp
-             //     ? `/api/chats/${chatId}/messages?since=${latestMessageTimestamp}`
-             //     : `/api/chats/${chatId}/messages?limit=20`; // Или limit для первого запроса после паузы
-             // Пока используем limit=20 для простоты, т.к. since может быть сложнее реализовать на бэке
-            const recentMessages = await apiRequest(`/api/chats/${chatId}/messages?limit=20`); // Запрашиваем последние 20
-
-            if (recentMessages && Array.isArray(recentMessages)) {
-                 const newMessages = recentMessages.filter(msg =>
-                     !latestMessageTimestamp || new Date(msg.timestamp) > new Date(latestMessageTimestamp)
-                 );
+             // Запрашиваем только сообщения новее последнего полученного (курсор after_id)
+            const endpoint = latestMessageId
+                ? `/api/chats/${chatId}/messages?after_id=${latestMessageId}&limit=50`
+                : `/api/chats/${chatId}/messages?limit=20`;
+            const newMessages = await apiRequest(endpoint);
+
+            if (newMessages && Array.isArray(newMessages)) {
                  if (newMessages.length > 0) {
                       console.log(`Fetched ${newMessages.length} new messages.`);
-                      // Сортируем новые сообщения по времени
-                      newMessages.sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
+                      scheduleMarkRead();
+                      // Сортируем новые сообщения по порядку появления
+                      newMessages.sort((a, b) => a.id - b.id);
                       let lastAddedTimestamp = null;
                       newMessages.forEach(msg => {
                           appendMessage(msg); // Добавляем каждое новое сообщение
@@ -354,6 +369,73 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // --- Отметка о прочтении ---
+    function scheduleMarkRead() {
+        if (markReadTimer || document.hidden) return;
+        markReadTimer = setTimeout(async () => {
+            markReadTimer = null;
+            if (!latestMessageId || latestMessageId === lastMarkedReadId) return;
+            const readUpTo = latestMessageId;
+            const result = await apiRequest(`/api/chats/${chatId}/read?message_id=${readUpTo}`, 'POST');
+            if (result) {
+                lastMarkedReadId = readUpTo;
+            }
+        }, MARK_READ_DELAY_MS);
+    }
+
+    // --- Push-доставка через WebSocket ---
+    function connectChatSocket() {
+        if (!window.WebSocket) return; // Старый браузер - остаемся на опросе
+        const token = getCookie('access_token');
+        if (!token) return;
+
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        chatSocket = new WebSocket(`${protocol}//${window.location.host}/api/chats/ws?token=${encodeURIComponent(token)}`);
+
+        chatSocket.addEventListener('open', () => {
+            console.log("Chat socket connected, polling stopped.");
+            socketReconnectDelayMs = 1000;
+            stopChatUpdates();
+            // Подписываемся на текущий чат (на случай, если он создан после подключения)
+            chatSocket.send(JSON.stringify({ type: 'subscribe', chat_id: Number(chatId) }));
+            fetchAndUpdateMessages(); // Догружаем то, что могли пропустить до подключения
+        });
+
+        chatSocket.addEventListener('message', (event) => {
+            let data = null;
+            try {
+                data = JSON.parse(event.data);
+            } catch (e) {
+                console.error("Invalid socket payload:", e);
+                return;
+            }
+            if (data.type === 'message' && data.message && String(data.message.chat_id) === String(chatId)) {
+                appendMessage(data.message);
+                scheduleMarkRead();
+            }
+        });
+
+        chatSocket.addEventListener('close', () => {
+            chatSocket = null;
+            if (socketClosedByPage) return;
+            // Возвращаемся к опросу и пробуем переподключиться с экспоненциальной задержкой
+            if (!chatUpdateInterval) {
+                startChatUpdates();
+            }
+            clearTimeout(socketReconnectTimer);
+            socketReconnectTimer = setTimeout(connectChatSocket, socketReconnectDelayMs);
+            socketReconnectDelayMs = Math.min(socketReconnectDelayMs * 2, SOCKET_MAX_RECONNECT_DELAY_MS);
+        });
+    }
+
+    function disconnectChatSocket() {
+        socketClosedByPage = true;
+        clearTimeout(socketReconnectTimer);
+        if (chatSocket) {
+            chatSocket.close();
+        }
+    }
+
     // --- Запуск и остановка автообновления ---
     function startChatUpdates() {
         stopChatUpdates(); // Останавливаем предыдущий интервал, если он был
@@ -384,6 +466,7 @@ document.addEventListener('DOMContentLoaded', () => {
             // Можно запустить снова: startChatUpdates();
             // Или просто выполнить один запрос:
             fetchAndUpdateMessages();
+            scheduleMarkRead();
         }
     }
 
@@ -393,7 +476,10 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Остановка обновлений при уходе со страницы ---
     // 'unload' или 'beforeunload' могут быть ненадежными
     // 'pagehide' более надежен для мобильных устройств
-    window.addEventListener('pagehide', stopChatUpdates);
+    window.addEventListener('pagehide', () => {
+        stopChatUpdates();
+        disconnectChatSocket();
+    });
     // window.addEventListener('beforeunload', stopChatUpdates); // Как запасной вариант
 
 });
\ No newline at end of file
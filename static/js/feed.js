@@ -39,14 +39,15 @@ document.addEventListener('DOMContentLoaded', () => {
         if (!postCardTemplate || !currentUser) return ''; // Нужен шаблон и пользователь для флага can_delete
 
         // Проверяем, лайкнул ли текущий пользователь пост
-        const isLikedByCurrentUser = post.liked_by_users?.some(user => user.id === currentUser.id);
+        // Лента отдает готовый флаг liked_by_me (без списка лайкнувших)
+        const isLikedByCurrentUser = post.liked_by_me ?? post.liked_by_users?.some(user => user.id === currentUser.id);
         // Проверяем, может ли текущий пользователь удалить пост
         const canDelete = post.author.id === currentUser.id || currentUser.is_admin;
 
         // Используем шаблон (простая замена плейсхолдеров, можно использовать библиотеку шаблонизации)
         let cardHtml = postCardTemplate
             .replace(/\$\{post\.id\}/g, post.id)
-            .replace(/\$\{post\.author\.avatar_url \|\| .*?\}/g, escapeHTML(post.author.avatar_url || '/static/img/default_avatar.png'))
+            .replace(/\$\{post\.author\.avatar_url \|\| .*?\}/g, escapeHTML(post.author.avatar_thumb_url || post.author.avatar_url || '/static/img/default_avatar.png'))
             .replace(/\$\{post\.author\.nickname \|\| post\.author\.username\}/g, escapeHTML(post.author.nickname || post.author.username))
             .replace(/\$\{post\.author\.username\}/g, escapeHTML(post.author.username))
             .replace(/\$\{ new Date\(post\.timestamp\).*?\}/g, new Date(post.timestamp).toLocaleString('ru-RU', { day: 'numeric', month: 'short', hour: '2-digit', minute: '2-digit' }))
@@ -54,7 +55,7 @@ document.addEventListener('DOMContentLoaded', () => {
             // .replace(/\$\{post\.image_url\}/g, post.image_url ? `<img src="${escapeHTML(post.image_url)}" alt="Post image" class="post-image mb-3">` : '')
             .replace(/\$\{ post\.is_liked_by_current_user \? 'has-text-danger' : 'has-text-grey' \}/g, isLikedByCurrentUser ? 'has-text-danger' : 'has-text-grey')
             .replace(/\$\{post\.likes_count\}/g, post.likes_count || 0)
-            .replace(/\$\{post\.comments\?\.length \|\| 0\}/g, post.comments?.length || 0)
+            .replace(/\$\{post\.comments\?\.length \|\| 0\}/g, post.comments_count ?? post.comments?.length ?? 0)
             .replace(/\$\{ post\.can_delete \? `.*?` : ''\}/gs, canDelete ? `
                     <div class="level-item">
                          <button class="button is-danger is-small is-outlined delete-post-button" title="Удалить пост">
@@ -27,7 +27,7 @@ document.addEventListener('DOMContentLoaded', () => {
         itemDiv.dataset.userId = user.id;
         itemDiv.dataset.username = user.username;
 
-        const avatarUrl = user.avatar_url || '/static/img/default_avatar.png';
+        const avatarUrl = user.avatar_thumb_url || user.avatar_url || '/static/img/default_avatar.png';
         const displayName = escapeHTML(user.nickname || user.username);
         const username = escapeHTML(user.username);
 
@@ -63,7 +63,47 @@ document.addEventListener('DOMContentLoaded', () => {
         return itemDiv;
     }
 
-    // --- Загрузка списков ---
+    // --- Загрузка списков (постранично) ---
+    const PAGE_SIZE = 50;
+    const lists = {
+        following: {
+            element: followingList,
+            emptyText: 'Вы ни на кого не подписаны.',
+            errorText: 'Не удалось загрузить подписки.',
+            beforeId: null, // ID последнего показанного пользователя (курсор следующей страницы)
+        },
+        followers: {
+            element: followersList,
+            emptyText: 'У вас пока нет подписчиков.',
+            errorText: 'Не удалось загрузить подписчиков.',
+            beforeId: null,
+        },
+    };
+
+    async function loadPage(listType) {
+        const list = lists[listType];
+        let url = `/api/friends/${listType}?limit=${PAGE_SIZE}`;
+        if (list.beforeId !== null) url += `&before_id=${list.beforeId}`;
+        const users = await apiRequest(url);
+
+        list.element.querySelector('.load-more')?.remove();
+        if (list.beforeId === null) list.element.innerHTML = '';
+        if (!users || !Array.isArray(users)) {
+            list.element.insertAdjacentHTML('beforeend', `<p class="list-item has-text-danger">${list.errorText}</p>`);
+            return;
+        }
+        if (users.length === 0 && list.beforeId === null) {
+            list.element.innerHTML = `<p class="list-item has-text-grey-light">${list.emptyText}</p>`;
+            return;
+        }
+        users.forEach(user => list.element.appendChild(renderUserListItem(user, listType)));
+        if (users.length === PAGE_SIZE) { // Возможно, есть еще страница
+            list.beforeId = users[users.length - 1].id;
+            list.element.insertAdjacentHTML('beforeend',
+                '<div class="list-item load-more has-text-centered"><button class="button is-small is-light">Показать еще</button></div>');
+        }
+    }
+
     async function loadLists() {
         await ensureCurrentUser();
         if (!currentUser) return;
@@ -71,41 +111,25 @@ document.addEventListener('DOMContentLoaded', () => {
         followingList.innerHTML = '<div class="has-text-centered p-4"><span class="icon"><i class="fas fa-spinner fa-spin"></i></span> Загрузка...</div>';
         followersList.innerHTML = '<div class="has-text-centered p-4"><span class="icon"><i class="fas fa-spinner fa-spin"></i></span> Загрузка...</div>';
 
-        // Загружаем оба списка параллельно
-        const [following, followers] = await Promise.all([
-            apiRequest('/api/friends/following'),
-            apiRequest('/api/friends/followers')
+        // Счетчики - из профиля (списки приходят по страницам), первые страницы - параллельно
+        const [me] = await Promise.all([
+            apiRequest('/api/users/me'),
+            loadPage('following'),
+            loadPage('followers')
         ]);
-
-        // Обновляем список подписок
-        if (following && Array.isArray(following)) {
-            followingList.innerHTML = '';
-            followingCountSpan.textContent = following.length;
-            if (following.length === 0) {
-                 followingList.innerHTML = '<p class="list-item has-text-grey-light">Вы ни на кого не подписаны.</p>';
-            } else {
-                following.forEach(user => followingList.appendChild(renderUserListItem(user, 'following')));
-            }
-        } else {
-            followingList.innerHTML = '<p class="list-item has-text-danger">Не удалось загрузить подписки.</p>';
-            followingCountSpan.textContent = '?';
-        }
-
-        // Обновляем список подписчиков
-        if (followers && Array.isArray(followers)) {
-            followersList.innerHTML = '';
-            followersCountSpan.textContent = followers.length;
-            if (followers.length === 0) {
-                 followersList.innerHTML = '<p class="list-item has-text-grey-light">У вас пока нет подписчиков.</p>';
-            } else {
-                followers.forEach(user => followersList.appendChild(renderUserListItem(user, 'followers')));
-            }
-        } else {
-             followersList.innerHTML = '<p class="list-item has-text-danger">Не удалось загрузить подписчиков.</p>';
-             followersCountSpan.textContent = '?';
-        }
+        followingCountSpan.textContent = me ? me.following_count : '?';
+        followersCountSpan.textContent = me ? me.followers_count : '?';
     }
 
+    Object.entries(lists).forEach(([listType, list]) => {
+        list.element.addEventListener('click', async (event) => {
+            const button = event.target.closest('.load-more button');
+            if (!button) return;
+            button.classList.add('is-loading');
+            await loadPage(listType);
+        });
+    });
+
     // --- Переключение вкладок ---
      tabs.forEach(tab => {
         tab.addEventListener('click', () => {
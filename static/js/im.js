@@ -31,7 +31,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         const otherParticipant = chat.participants.find(p => p.id !== currentUser?.id);
                         if (otherParticipant) {
                             chatName = otherParticipant.nickname || otherParticipant.username;
-                            avatarUrl = otherParticipant.avatar_url || '/static/img/default_avatar.png';
+                            avatarUrl = otherParticipant.avatar_thumb_url || otherParticipant.avatar_url || '/static/img/default_avatar.png';
                         } else {
                              chatName = "Приватный чат"; // На случай, если что-то пошло не так
                              avatarUrl = '/static/img/default_avatar.png';
@@ -53,6 +53,7 @@ document.addEventListener('DOMContentLoaded', () => {
                                     ${chat.last_message ? `${escapeHTML(chat.last_message.author.nickname || chat.last_message.author.username)}: ${escapeHTML(chat.last_message.content.substring(0, 30))}${chat.last_message.content.length > 30 ? '...' : ''}` : 'Нет сообщений'}
                                 </div>
                             </div>
+                            ${chat.unread_count > 0 ? `<span class="tag is-danger is-rounded unread-badge">${chat.unread_count}</span>` : ''}
                         </div>
                     `;
                     listItem.appendChild(link);
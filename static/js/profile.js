@@ -73,10 +73,9 @@ document.addEventListener('DOMContentLoaded', () => {
              if (postCardTemplate && currentUser) {
                  profileData.posts.forEach(post => {
                       const postElement = document.createElement('div');
-                      // Убедимся, что likes_count и comments есть
+                      // Убедимся, что счетчики есть (профиль отдает посты без списков лайков и комментариев)
                       post.likes_count = post.likes_count ?? 0;
-                      post.comments = post.comments ?? [];
-                      post.liked_by_users = post.liked_by_users ?? [];
+                      post.comments_count = post.comments_count ?? 0;
                       postElement.innerHTML = renderPostCard(post); // Функция из feed.js
                       profilePostsContainer.appendChild(postElement.firstElementChild);
                  });
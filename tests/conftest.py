@@ -0,0 +1,66 @@
+# tests/conftest.py
+"""
+Общая настройка тестов: отдельная временная SQLite-БД со схемой из миграций.
+DATABASE_URL задается до импорта app (app.database читает его при импорте).
+
+Запуск: python -m pytest
+"""
+import itertools
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tests-"), "test.db")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+sys.path.insert(0, str(ROOT))
+
+_user_numbers = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def migrated_database() -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    alembic_config = Config(str(ROOT / "alembic.ini"))
+    alembic_config.set_main_option("script_location", str(ROOT / "migrations"))
+    command.upgrade(alembic_config, "head")
+
+
+@pytest.fixture
+def db(migrated_database):
+    from app.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client(migrated_database):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def make_user(client):
+    """Регистрирует пользователя через API и возвращает (username, заголовки авторизации)."""
+    def make(name: str = "user") -> tuple:
+        username = f"{name}{next(_user_numbers)}" # Тесты делят одну БД: имена не повторяются
+        response = client.post(
+            "/api/users/", json={"username": username, "email": f"{username}@example.com", "password": "pw"}
+        )
+        assert response.status_code == 201, response.text
+        response = client.post("/api/users/token", data={"username": username, "password": "pw"})
+        assert response.status_code == 200, response.text
+        return username, {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return make
@@ -0,0 +1,49 @@
+# tests/test_auth.py
+import pytest
+from sqlalchemy import event
+
+from app import database
+from app.principals import principal_cache
+
+
+@pytest.fixture
+def sync_checkouts():
+    """Сколько соединений взято из пула синхронного движка (async-обработчики не должны их брать)."""
+    checkouts = []
+    listener = lambda *args: checkouts.append(1)
+    event.listen(database.engine, "checkout", listener)
+    yield checkouts
+    event.remove(database.engine, "checkout", listener)
+
+
+def test_async_routes_resolve_principal_without_sync_session(client, make_user, sync_checkouts):
+    _, headers = make_user()
+    principal_cache.clear() # Промах кеша: principal читается из БД
+    sync_checkouts.clear()
+
+    assert client.get("/api/users/me", headers=headers).status_code == 200
+    principal_cache.clear()
+    assert client.put("/api/users/me", headers=headers, json={"nickname": "async"}).status_code == 200
+    principal_cache.clear()
+    assert client.post("/api/posts/", headers=headers, data={"content": "async post"}).status_code == 201
+
+    assert sync_checkouts == []
+
+
+def test_login_rehashes_password_without_sync_session(client, make_user, db, sync_checkouts):
+    from app import models
+    from app.passwords import pwd_context
+
+    username, _ = make_user()
+    user = db.query(models.User).filter(models.User.username == username).one()
+    user.hashed_password = pwd_context.hash("pw", rounds=4) # Дешевле BCRYPT_ROUNDS: устаревший хеш
+    db.commit()
+    sync_checkouts.clear()
+
+    response = client.post("/api/users/token", data={"username": username, "password": "pw"})
+    assert response.status_code == 200
+    assert sync_checkouts == []
+
+    db.expire_all()
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert pwd_context.verify("pw", user.hashed_password)
@@ -0,0 +1,95 @@
+# tests/test_chats.py
+import pytest
+
+from app import crud, models
+
+
+@pytest.fixture
+def direct_chat(client, make_user):
+    """Личный чат двух новых пользователей: (chat_id, заголовки отправителя, заголовки получателя)."""
+    _, sender = make_user("sender")
+    recipient_name, recipient = make_user("recipient")
+    response = client.post(f"/api/chats/direct/{recipient_name}", headers=sender)
+    assert response.status_code == 200, response.text
+    return response.json()["id"], sender, recipient
+
+def _send(client, chat_id: int, headers: dict, count: int) -> list:
+    ids = []
+    for i in range(count):
+        response = client.post(f"/api/chats/{chat_id}/messages", headers=headers, json={"content": f"m{i}"})
+        assert response.status_code == 201, response.text
+        ids.append(response.json()["id"])
+    return ids
+
+def _ids(response) -> list:
+    assert response.status_code == 200, response.text
+    return [message["id"] for message in response.json()]
+
+def _unread(client, chat_id: int, headers: dict) -> int:
+    chats = client.get("/api/chats/", headers=headers).json()
+    return next(chat["unread_count"] for chat in chats if chat["id"] == chat_id)
+
+
+def test_keyset_message_paging(client, direct_chat):
+    chat_id, sender, _ = direct_chat
+    sent = _send(client, chat_id, sender, 7)
+    url = f"/api/chats/{chat_id}/messages"
+
+    # before_id: страницы истории от новых к старым без пропусков и повторов
+    pages, before_id = [], None
+    while True:
+        params = {"limit": 3} if before_id is None else {"limit": 3, "before_id": before_id}
+        page = _ids(client.get(url, headers=sender, params=params))
+        if not page:
+            break
+        pages.append(page)
+        before_id = page[-1]
+    assert pages == [sent[6:3:-1], sent[3:0:-1], sent[0:1]]
+
+    # after_id: ближайшие к курсору новые сообщения, в общем порядке "от новых к старым"
+    assert _ids(client.get(url, headers=sender, params={"after_id": sent[1], "limit": 2})) == [sent[3], sent[2]]
+    assert _ids(client.get(url, headers=sender, params={"after_id": sent[-1]})) == []
+
+
+def test_unread_counters_and_mark_read(client, direct_chat):
+    chat_id, sender, recipient = direct_chat
+    sent = _send(client, chat_id, sender, 3)
+    assert _unread(client, chat_id, recipient) == 3
+    assert _unread(client, chat_id, sender) == 0 # Свои сообщения непрочитанными не считаются
+
+    response = client.post(f"/api/chats/{chat_id}/read", headers=recipient, params={"message_id": sent[1]})
+    assert response.status_code == 200
+    assert response.json() == {"chat_id": chat_id, "last_read_message_id": sent[1], "unread_count": 1}
+    assert _unread(client, chat_id, recipient) == 1
+
+    # Курсор не откатывается назад
+    response = client.post(f"/api/chats/{chat_id}/read", headers=recipient, params={"message_id": sent[0]})
+    assert response.json()["last_read_message_id"] == sent[1]
+
+    response = client.post(f"/api/chats/{chat_id}/read", headers=recipient)
+    assert response.json() == {"chat_id": chat_id, "last_read_message_id": sent[2], "unread_count": 0}
+    _send(client, chat_id, sender, 1)
+    assert _unread(client, chat_id, recipient) == 1
+
+
+def test_direct_chat_race_returns_existing_chat(db, monkeypatch):
+    users = [models.User(username=f"race{i}", email=f"race{i}@example.com", hashed_password="-") for i in range(2)]
+    db.add_all(users)
+    db.commit()
+    first = crud.create_private_chat(db, users[0], users[1])
+
+    # Параллельный запрос: чат пары создан между проверкой и вставкой
+    lookup = crud.get_private_chat_between_users
+    calls = []
+    def lookup_after_race(db, user1_id, user2_id):
+        calls.append(1)
+        return None if len(calls) == 1 else lookup(db, user1_id, user2_id)
+    monkeypatch.setattr(crud, "get_private_chat_between_users", lookup_after_race)
+
+    second = crud.create_private_chat(db, users[1], users[0])
+    assert second.id == first.id
+    assert len(calls) == 2
+    low_id, high_id = sorted(user.id for user in users)
+    assert db.query(models.Chat).filter(
+        models.Chat.direct_user_low_id == low_id, models.Chat.direct_user_high_id == high_id
+    ).count() == 1
@@ -0,0 +1,53 @@
+# tests/test_etags.py
+import pytest
+
+
+@pytest.fixture
+def content(client, make_user):
+    """Пост с комментарием и личный чат с сообщением: (автор, читатель, post_id, chat_id)."""
+    author_name, author = make_user("etag-author")
+    _, reader = make_user("etag-reader")
+    post_id = client.post("/api/posts/", headers=author, data={"content": "hello"}).json()["id"]
+    client.post(f"/api/posts/{post_id}/comments", headers=reader, json={"content": "c1"})
+    chat_id = client.post(f"/api/chats/direct/{author_name}", headers=reader).json()["id"]
+    client.post(f"/api/chats/{chat_id}/messages", headers=author, json={"content": "m1"})
+    return author_name, author, reader, post_id, chat_id
+
+def _assert_invalidated(client, url: str, headers: dict, write) -> None:
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    cached = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304 and cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    write()
+    changed = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_writes_invalidate_etags(client, content):
+    author_name, author, reader, post_id, chat_id = content
+    _assert_invalidated(client, "/api/posts/", reader, lambda: client.post(f"/api/posts/{post_id}/like", headers=reader))
+    _assert_invalidated(
+        client, "/api/posts/", reader, lambda: client.put("/api/users/me", headers=author, json={"nickname": "renamed"})
+    )
+    _assert_invalidated(
+        client, f"/api/users/{author_name}", reader, lambda: client.post(f"/api/friends/follow/{author_name}", headers=reader)
+    )
+    _assert_invalidated(
+        client, f"/api/posts/{post_id}/comments", reader,
+        lambda: client.post(f"/api/posts/{post_id}/comments", headers=author, json={"content": "c2"})
+    )
+    _assert_invalidated(
+        client, f"/api/chats/{chat_id}/messages", reader,
+        lambda: client.post(f"/api/chats/{chat_id}/messages", headers=reader, json={"content": "m2"})
+    )
+
+
+def test_etag_depends_on_viewer(client, content):
+    _, author, reader, post_id, _ = content
+    client.post(f"/api/posts/{post_id}/like", headers=reader)
+    # liked_by_me у читателей разный - разные ответы и ETag
+    assert client.get("/api/posts/", headers=author).headers["etag"] != client.get("/api/posts/", headers=reader).headers["etag"]
@@ -0,0 +1,30 @@
+# tests/test_image_variants.py
+from PIL import Image
+
+from app import image_variants, models, uploads
+
+
+def test_shutdown_records_queued_variants(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_ROOT", tmp_path)
+    users = []
+    for i in range(4):
+        path = tmp_path / uploads.AVATARS.directory / f"{i:02d}" / f"avatar{i}.png"
+        path.parent.mkdir(parents=True)
+        Image.new("RGB", (300, 200), (i * 60, 0, 0)).save(path)
+        users.append(models.User(
+            username=f"variants{i}", email=f"variants{i}@example.com", hashed_password="-",
+            avatar_url=uploads.url_for_path(path),
+        ))
+    db.add_all(users)
+    db.commit()
+
+    # Один процесс на четыре задачи: к моменту shutdown часть из них еще в очереди
+    pool = image_variants.ImageVariantPool(workers=1)
+    assert all(pool.schedule(user.avatar_url) for user in users)
+    pool.shutdown()
+
+    assert pool.pending == 0
+    db.expire_all()
+    for user in users:
+        assert user.avatar_thumb_url is not None
+        assert uploads.path_for_url(user.avatar_thumb_url).is_file()
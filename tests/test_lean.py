@@ -0,0 +1,53 @@
+# tests/test_lean.py
+"""Ответы lean.py (orjson без Pydantic) совпадают по значениям с сериализацией ORM-объектов схемами."""
+import json
+from typing import List
+
+import orjson
+from pydantic import TypeAdapter
+
+from app import crud, lean, models, schemas, timeline
+
+
+def _pydantic(schema, objects):
+    adapter = TypeAdapter(schema)
+    return json.loads(adapter.dump_json(adapter.validate_python(objects, from_attributes=True)))
+
+def _lean(content):
+    return json.loads(orjson.dumps(content, option=orjson.OPT_UTC_Z))
+
+
+def test_lean_responses_match_pydantic(client, make_user, db):
+    author_name, author = make_user("lean-author")
+    reader_name, reader = make_user("lean-reader")
+    client.post(f"/api/friends/follow/{author_name}", headers=reader)
+    post_ids = [client.post("/api/posts/", headers=author, data={"content": f"post {i}"}).json()["id"] for i in range(3)]
+    client.post(f"/api/posts/{post_ids[0]}/like", headers=reader)
+    client.post(f"/api/posts/{post_ids[1]}/comments", headers=reader, json={"content": "c"})
+    client.put("/api/users/me", headers=author, json={"nickname": "Lean Author"})
+    chat_id = client.post(f"/api/chats/direct/{author_name}", headers=reader).json()["id"]
+    message_ids = [
+        client.post(f"/api/chats/{chat_id}/messages", headers=headers, json={"content": f"m{i}"}).json()["id"]
+        for i, headers in enumerate((author, reader, author))
+    ]
+    reader_id = db.query(models.User.id).filter(models.User.username == reader_name).scalar()
+    db.expire_all()
+
+    posts = crud.set_liked_by_me(db, crud.get_posts(db, limit=100), reader_id)
+    expected = _pydantic(List[schemas.PostSummary], posts)
+    assert any(post["liked_by_me"] for post in expected)
+    assert _lean(lean.get_posts(db, limit=100, user_id=reader_id)) == expected
+
+    posts = crud.set_liked_by_me(db, timeline.get_timeline(db, reader_id, limit=50), reader_id)
+    expected = _pydantic(List[schemas.PostSummary], posts)
+    assert [post["id"] for post in expected] == post_ids[::-1]
+    assert _lean(lean.get_timeline(db, reader_id, limit=50)) == expected
+
+    expected = _pydantic(List[schemas.ChatInfo], crud.get_user_chats(db, reader_id))
+    assert expected[0]["last_message"]["id"] == message_ids[-1]
+    assert _lean(lean.get_user_chats(db, reader_id)) == expected
+
+    for page in ({}, {"before_id": message_ids[-1]}, {"after_id": message_ids[0]}):
+        expected = _pydantic(List[schemas.Message], crud.get_messages_for_chat(db, chat_id, **page))
+        assert expected
+        assert _lean(lean.get_messages(db, chat_id, **page)) == expected
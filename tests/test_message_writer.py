@@ -0,0 +1,67 @@
+# tests/test_message_writer.py
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from app import crud, message_writer, models, schemas
+
+
+@pytest.fixture
+def chat(db, request):
+    name = request.node.name # Тесты делят одну БД
+    user = models.User(username=name, email=f"{name}@example.com", hashed_password="-")
+    db_chat = models.Chat(name=name, participants=[user])
+    db.add(db_chat)
+    db.commit()
+    return db_chat
+
+
+def _send(contents: list, chat_id: int, author_id: int) -> list:
+    async def run():
+        writer = message_writer.MessageBatchWriter(max_delay_ms=50)
+        await writer.start()
+        try:
+            return await asyncio.gather(
+                *(writer.submit(schemas.MessageCreate(content=content, chat_id=chat_id), author_id)
+                  for content in contents),
+                return_exceptions=True,
+            )
+        finally:
+            await writer.stop()
+    return asyncio.run(run())
+
+def _stored(db, chat_id: int) -> list:
+    return db.execute(
+        select(models.Message.content).where(models.Message.chat_id == chat_id).order_by(models.Message.id)
+    ).scalars().all()
+
+
+def test_failure_before_commit_retries_messages_one_by_one(db, chat, monkeypatch):
+    create_messages = crud.create_messages
+
+    def failing_create_messages(session, items):
+        if any(message.content == "bad" for message, _ in items):
+            raise ValueError("bad message")
+        return create_messages(session, items)
+
+    monkeypatch.setattr(crud, "create_messages", failing_create_messages)
+    results = _send(["one", "bad", "two"], chat.id, chat.participants[0].id)
+
+    assert isinstance(results[1], ValueError)
+    assert not isinstance(results[0], Exception) and not isinstance(results[2], Exception)
+    assert _stored(db, chat.id) == ["one", "two"]
+
+
+def test_failure_after_commit_is_not_retried(db, chat, monkeypatch):
+    create_messages = crud.create_messages
+
+    def create_messages_then_fail(session, items):
+        create_messages(session, items)
+        raise RuntimeError("failed after commit")
+
+    monkeypatch.setattr(crud, "create_messages", create_messages_then_fail)
+    results = _send(["one", "two", "three"], chat.id, chat.participants[0].id)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert sorted(_stored(db, chat.id)) == ["one", "three", "two"] # Без дубликатов
@@ -0,0 +1,32 @@
+# tests/test_posts.py
+from sqlalchemy import func, select
+
+from app import models
+
+
+def _count(db, column, post_id: int) -> int:
+    return db.execute(select(func.count()).where(column == post_id)).scalar_one()
+
+
+def test_delete_post_removes_likes_comments_and_timeline_entries(client, make_user, db):
+    author_name, author = make_user("post-author")
+    _, follower = make_user("post-follower")
+    assert client.post(f"/api/friends/follow/{author_name}", headers=follower).status_code == 204
+    post_id = client.post("/api/posts/", headers=author, data={"content": "to delete"}).json()["id"]
+    assert client.post(f"/api/posts/{post_id}/like", headers=follower).status_code == 204
+    assert client.post(f"/api/posts/{post_id}/comments", headers=follower, json={"content": "hi"}).status_code == 201
+
+    assert client.delete(f"/api/posts/{post_id}", headers=follower).status_code == 403
+    assert client.delete(f"/api/posts/{post_id}", headers=author).status_code == 204
+    assert client.delete(f"/api/posts/{post_id}", headers=author).status_code == 404
+
+    assert _count(db, models.Post.id, post_id) == 0
+    assert _count(db, models.Comment.post_id, post_id) == 0
+    assert _count(db, models.post_likes_association.c.post_id, post_id) == 0
+    assert _count(db, models.TimelineEntry.post_id, post_id) == 0
+
+
+def test_comment_on_missing_post(client, make_user):
+    _, headers = make_user()
+    response = client.post("/api/posts/999999/comments", headers=headers, json={"content": "hi"})
+    assert response.status_code == 404
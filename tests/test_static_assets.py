@@ -0,0 +1,31 @@
+# tests/test_static_assets.py
+import re
+
+from fastapi.testclient import TestClient
+
+from app import static_assets
+
+
+def test_build_assets_prunes_stale_builds(tmp_path):
+    source = tmp_path / "js" / "app.js"
+    source.parent.mkdir()
+    source.write_text("console.log(1);")
+    old_build = tmp_path / static_assets.build_assets(tmp_path)["js/app.js"]
+
+    source.write_text("console.log(2);")
+    new_build = tmp_path / static_assets.build_assets(tmp_path)["js/app.js"]
+
+    assert new_build != old_build and new_build.is_file()
+    assert new_build.with_name(new_build.name + ".gz").is_file()
+    assert sorted(path.name for path in old_build.parent.iterdir() if not path.name.startswith(new_build.name)) == []
+
+
+def test_asset_urls_respect_root_path(migrated_database):
+    from app.main import app
+
+    client = TestClient(app, root_path="/social")
+    urls = re.findall(r'(?:src|href)="([^"]*/static/[^"]+)"', client.get("/auth").text)
+    assert urls
+    for url in urls:
+        assert url.startswith("http://testserver/social/static/"), url
+    assert client.get(urls[-1]).status_code == 200
@@ -0,0 +1,64 @@
+# tests/test_timeline.py
+from sqlalchemy import func, select
+
+from app import crud, models, timeline
+
+
+def _entries(db, user_id: int) -> int:
+    return db.execute(
+        select(func.count()).select_from(models.TimelineEntry).where(models.TimelineEntry.user_id == user_id)
+    ).scalar_one()
+
+def _users(db, *names: str) -> list:
+    users = [models.User(username=name, email=f"{name}@example.com", hashed_password="-") for name in names]
+    db.add_all(users)
+    db.commit()
+    return users
+
+def _publish(db, author: models.User, count: int) -> list:
+    posts = [models.Post(content=f"post {i}", author_id=author.id) for i in range(count)]
+    db.add_all(posts)
+    db.flush()
+    for post in posts:
+        timeline.fan_out_post(db, post)
+    db.commit()
+    return posts
+
+
+def test_fan_out_bounds_timelines_on_write(db, monkeypatch):
+    monkeypatch.setattr(timeline, "TIMELINE_MAX_ENTRIES", 3)
+    author, reader = _users(db, "timeline-author", "timeline-reader")
+    assert crud.add_follow(db, reader, author)
+    posts = _publish(db, author, 5)
+
+    # Лишнее удалено в той же транзакции, чтение ленты ничего не пишет
+    assert _entries(db, reader.id) == 3
+    assert timeline.get_timeline_ids(db, reader.id) == [post.id for post in reversed(posts[2:])]
+    assert _entries(db, reader.id) == 3
+
+    # Страховка после уменьшения лимита (тесты делят БД: обрезаются и чужие ленты)
+    monkeypatch.setattr(timeline, "TIMELINE_MAX_ENTRIES", 2)
+    assert timeline.trim_all(db) >= 1
+    assert _entries(db, reader.id) == 2
+    assert timeline.get_timeline_ids(db, reader.id) == [post.id for post in reversed(posts[3:])]
+    assert timeline.trim_all(db) == 0
+
+
+def test_posts_stay_in_timeline_when_author_drops_below_fanout_threshold(db, monkeypatch):
+    monkeypatch.setattr(timeline, "TIMELINE_FANOUT_MAX_FOLLOWERS", 1)
+    author, reader, other = _users(db, "threshold-author", "threshold-reader", "threshold-other")
+    early = _publish(db, author, 1)
+    assert crud.add_follow(db, reader, author)
+    assert crud.add_follow(db, other, author)
+
+    # Два подписчика - больше порога: посты не рассылаются, а подмешиваются при чтении
+    pulled = _publish(db, author, 2)
+    assert _entries(db, reader.id) == 1
+    expected = [post.id for post in reversed(early + pulled)]
+    assert timeline.get_timeline_ids(db, reader.id) == expected
+
+    # Автор снова на пороге: посты, опубликованные выше порога, не пропадают из ленты
+    assert crud.remove_follow(db, other, author)
+    assert _entries(db, reader.id) == 3
+    assert timeline.get_timeline_ids(db, reader.id) == expected
+    assert _entries(db, other.id) == 0
@@ -0,0 +1,24 @@
+# tests/test_users.py
+import asyncio
+
+from app import crud, crud_async, models
+from app.database import AsyncSessionLocal
+
+
+def test_user_counts_match_in_sync_and_async_layers(client, make_user, db):
+    author_name, author = make_user("counts-author")
+    reader_name, reader = make_user("counts-reader")
+    assert client.post(f"/api/friends/follow/{author_name}", headers=reader).status_code == 204
+    for i in range(2):
+        assert client.post("/api/posts/", headers=author, data={"content": f"post {i}"}).status_code == 201
+    author_id = db.query(models.User.id).filter(models.User.username == author_name).scalar()
+    reader_id = db.query(models.User.id).filter(models.User.username == reader_name).scalar()
+
+    async def async_counts(user_id):
+        async with AsyncSessionLocal() as session:
+            return await crud_async.get_user_counts(session, user_id=user_id)
+
+    assert crud.get_user_counts(db, author_id) == {"followers_count": 1, "following_count": 0, "posts_count": 2}
+    assert crud.get_user_counts(db, reader_id) == {"followers_count": 0, "following_count": 1, "posts_count": 0}
+    for user_id in (author_id, reader_id, 999999):
+        assert asyncio.run(async_counts(user_id)) == crud.get_user_counts(db, user_id)